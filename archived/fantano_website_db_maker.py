@@ -1,30 +1,185 @@
+import hashlib
+import json
 import os
+import re
+import threading
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from openai import OpenAI
 from dotenv import load_dotenv
 
-def extract_fantano_rating(html: str, max_length: int = 1000) -> str:
+from utils.rate_limiter import RateLimiter
+from utils.rating_utils import NOT_GOOD_RATING, extract_rating
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTRUCTIONS_FILE_PATH = os.path.join(SCRIPT_DIR, "instructions", "fantano_website_db_maker.txt")
+DEFAULT_CACHE_FILE_PATH = os.path.join(SCRIPT_DIR, "cache", "fantano_website_ratings.json")
+MODEL_NAME = "gpt-4o-mini"
+
+# the score a category from the instructions file stands for, e.g. "Decent to Strong 6 (Pick Decent 6)" -> 6
+_PICK_PATTERN = re.compile(r"\(\s*Pick\b[^)]*?(10|\d)\s*\)", re.IGNORECASE)
+_CATEGORY_SCORE_PATTERN = re.compile(r"(?<![\d.])(10|\d)(?!\d)")
+
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _load_instructions() -> str:
+    with open(INSTRUCTIONS_FILE_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def _get_client(base_url: str | None = None) -> OpenAI:
+    with _client_lock:
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+        if api_key is None and base_url is not None:
+            # a local stub server standing in for the API doesn't check the key
+            api_key = "local-stub"
+        return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def _truncate(html: str, max_length: int) -> str:
+    return html[-max_length:] if len(html) > max_length else html
+
+
+def _review_hash(html: str) -> str:
+    return hashlib.sha256(f"{MODEL_NAME}\n{html}".encode("utf-8")).hexdigest()
+
+
+def category_score(category: str) -> int | None:
+    """
+        The score (-1..10, as in utils.rating_utils) of a category from the instructions file, e.g. "Not Good" -> -1,
+        "Strong 6 to Light 7 (Pick Light 7)" -> 7, "A 10" -> 10. None for "N/A" or anything that isn't a category.
+    """
+    category = category.strip().strip('"')
+    if category.lower() == "not good":
+        return NOT_GOOD_RATING
+    pick = _PICK_PATTERN.search(category)
+    if pick is not None:
+        return int(pick.group(1))
+    scores = _CATEGORY_SCORE_PATTERN.findall(category)
+    return int(scores[0]) if len(scores) == 1 else None
 
-    if len(html) > max_length:
-        warnings.warn(f"HTML is too long, truncating to final {max_length} characters. Results may suffer as a result.")
-        html = html[-max_length:]
 
-    load_dotenv()
+def extract_fantano_rating_with_regex(html: str) -> int | None:
+    """
+        Local fast path using utils.rating_utils. Returns the stated score when the review states exactly one
+        rating, and None otherwise.
+    """
+    rating = extract_rating(html, tail_length=None)
+    return rating.score if rating.confident else None
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    instructions_file_path = os.path.join(script_dir, "instructions", "fantano_website_db_maker.txt")
 
-    with open(instructions_file_path, "r", encoding="utf-8") as f:
-        instructions = f.read()
+def extract_fantano_rating(html: str, max_length: int = 1000, base_url: str | None = None) -> str:
+    """
+        Asks the model which rating category the review states. The client and instructions are created
+        once and reused across calls.
+    """
+    if len(html) > max_length:
+        warnings.warn(f"HTML is too long, truncating to final {max_length} characters. Results may suffer as a result.")
+        html = html[-max_length:]
 
-    response = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=instructions,
+    response = _get_client(base_url).responses.create(
+        model=MODEL_NAME,
+        instructions=_load_instructions(),
         input=html,
         max_output_tokens=250,
         temperature=0.01,
     )
 
-    return response.output_text
\ No newline at end of file
+    return response.output_text
+
+
+def _load_cache(cache_file_path: str | None) -> dict[str, str]:
+    if cache_file_path is None or not os.path.exists(cache_file_path):
+        return {}
+    with open(cache_file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_cache(cache: dict[str, str], cache_file_path: str | None):
+    if cache_file_path is None:
+        return
+    os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+    temporary_file_path = f"{cache_file_path}.tmp"
+    with open(temporary_file_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(temporary_file_path, cache_file_path)
+
+
+def extract_fantano_ratings(
+    htmls: list[str],
+    max_length: int = 1000,
+    max_workers: int = 8,
+    requests_per_second: float = 5.0,
+    cache_file_path: str | None = DEFAULT_CACHE_FILE_PATH,
+    use_regex: bool = True,
+    base_url: str | None = None,
+) -> list[int | None]:
+    """
+        Extracts the scores of many reviews at once.
+
+        The local regex extractor is tried first, then each remaining review is looked up in the cache by the hash of
+        its (truncated) content, and only the reviews left after that are sent to the model, concurrently and rate
+        limited. The cache holds the model's answers (categories from the instructions file) only, and every new
+        answer is written back to it, so re-running over the same reviews makes no requests. Both paths' ratings
+        are returned as scores.
+
+        Args:
+            htmls: the review texts.
+            max_length: only the final max_length characters of each review are used, which is where the rating is.
+            max_workers: the number of concurrent requests.
+            requests_per_second: the maximum rate at which requests are started.
+            cache_file_path: JSON file of review hash -> model answer, None disables caching.
+            use_regex: whether to try the regex extractor before the model.
+            base_url: an alternative API endpoint, e.g. a local stub server.
+
+        Returns:
+            The scores on the -1..10 scale of utils.rating_utils, None where no rating was found ("N/A"), in the
+            same order as htmls.
+    """
+    truncated_htmls = [_truncate(html, max_length) for html in htmls]
+    num_truncated = sum(len(html) > max_length for html in htmls)
+    if num_truncated:
+        warnings.warn(f"{num_truncated} reviews were truncated to their final {max_length} characters. Results may suffer as a result.")
+
+    cache = _load_cache(cache_file_path)
+    scores: list[int | None] = [None] * len(htmls)
+    pending: dict[str, list[int]] = {}
+    for i, html in enumerate(truncated_htmls):
+        regex_score = extract_fantano_rating_with_regex(html) if use_regex else None
+        if regex_score is not None:
+            scores[i] = regex_score
+            continue
+        key = _review_hash(html)
+        if key in cache:
+            scores[i] = category_score(cache[key])
+            continue
+        # identical reviews are only sent once
+        pending.setdefault(key, []).append(i)
+
+    rate_limiter = RateLimiter(requests_per_second)
+
+    def request_rating(key: str) -> tuple[str, str]:
+        rate_limiter.wait()
+        html = truncated_htmls[pending[key][0]]
+        return key, extract_fantano_rating(html, max_length=max_length, base_url=base_url)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for key, rating in executor.map(request_rating, pending):
+                # the model sometimes wraps its answer in quotes
+                rating = rating.strip().strip('"')
+                cache[key] = rating
+                for i in pending[key]:
+                    scores[i] = category_score(rating)
+    finally:
+        # keep whatever was extracted even if a request fails midway
+        _save_cache(cache, cache_file_path)
+
+    return scores
@@ -0,0 +1,36 @@
+"""
+CPU throughput of the cover model's backbone + head (models/cover_cnn.py). Skipped when torch isn't installed.
+"""
+
+from benchmarks.harness import benchmark
+
+BATCH_SIZE = 32
+IMAGE_SIZE = 160
+
+
+def _bench_cover_model(scale: int, variant: str):
+    # torch is optional, an ImportError here skips the benchmark
+    import torch
+
+    from models.cover_cnn import FantAInoCoverModel
+
+    model = FantAInoCoverModel(backbone="mobilenet_v3_small", image_size=IMAGE_SIZE, pretrained=False)
+    model.head = model._new_head(12).eval()
+    module = model.quantized_estimator() if variant == "int8" else model.estimator
+    images = torch.randn(BATCH_SIZE * scale, 3, IMAGE_SIZE, IMAGE_SIZE).to(memory_format=torch.channels_last)
+
+    def run():
+        with torch.inference_mode():
+            for batch in images.split(BATCH_SIZE):
+                module(batch)
+    return run
+
+
+@benchmark("cover_cnn.mobilenet_v3_small.float32", scales=(1, 10))
+def bench_cover_model_float32(scale: int):
+    return _bench_cover_model(scale, "float32")
+
+
+@benchmark("cover_cnn.mobilenet_v3_small.int8", scales=(1, 10))
+def bench_cover_model_int8(scale: int):
+    return _bench_cover_model(scale, "int8")
@@ -0,0 +1,134 @@
+"""
+Benchmarks for utils/data_utils.py: genre encoding, name cleaning and loading the processed table, and for the
+name normalization of utils/text_normalization.py against the chained replace calls clean_name used to make.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from benchmarks.synthetic_data import PRODUCTION_NUM_REVIEWS, make_melondy_df, make_processed_df
+from utils.data_utils import clean_name, process_melondy_genre, sanitize_filename
+from utils.memory_utils import read_melondy_compact
+from utils.text_normalization import match_key, search_name
+
+
+@benchmark("data_utils.process_melondy_genre")
+def bench_process_melondy_genre(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+
+    def run():
+        # process_melondy_genre prints its threshold and drops the genre column in place
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_melondy_genre(melondy_df.copy(), top_K_pct=1.0)
+    return run
+
+
+@benchmark("data_utils.clean_name")
+def bench_clean_name(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    names = list(melondy_df["artist"]) + list(melondy_df["album"])
+
+    def run():
+        for name in names:
+            clean_name(name)
+    return run
+
+
+def _legacy_clean_name(name: str) -> str:
+    # clean_name before utils/text_normalization.py, the baseline of the text_normalization benchmarks
+    name = name.replace("’", "'")
+    name = name.replace('•', '')
+    name = name.replace('“', '"')
+    name = name.replace('”', '"')
+    name = name.replace("'", "")
+    return name
+
+
+@benchmark("data_utils.clean_name.legacy")
+def bench_legacy_clean_name(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    names = list(melondy_df["artist"]) + list(melondy_df["album"])
+
+    def run():
+        for name in names:
+            _legacy_clean_name(name)
+    return run
+
+
+@benchmark("text_normalization.search_name.uncached")
+def bench_search_name_uncached(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    names = list(melondy_df["artist"]) + list(melondy_df["album"])
+
+    def run():
+        for name in names:
+            search_name.__wrapped__(name)
+    return run
+
+
+@benchmark("text_normalization.match_key")
+def bench_match_key(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    names = list(melondy_df["artist"]) + list(melondy_df["album"])
+
+    def run():
+        # a fresh cache, as in a new process: every distinct name is normalized once, repeats are cache hits
+        match_key.cache_clear()
+        for name in names:
+            match_key(name)
+    return run
+
+
+@benchmark("data_utils.sanitize_filename")
+def bench_sanitize_filename(scale: int):
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    filenames = [f"{artist}___{album}.jpg" for artist, album in zip(melondy_df["artist"], melondy_df["album"])]
+
+    def run():
+        for filename in filenames:
+            sanitize_filename(filename)
+    return run
+
+
+def _bench_load(scale: int, file_format: str):
+    processed_df = make_processed_df(PRODUCTION_NUM_REVIEWS * scale)
+    directory = tempfile.mkdtemp(prefix="fantaino_bench_")
+    path = os.path.join(directory, f"melondy_and_spotify.{file_format.split('_')[0]}")
+    match file_format:
+        case "csv":
+            processed_df.to_csv(path, index=False)
+            return lambda: pd.read_csv(path).dropna()
+        case "parquet":
+            processed_df.to_parquet(path, index=False)
+            return lambda: pd.read_parquet(path).dropna()
+        case "feather":
+            processed_df.to_feather(path)
+            return lambda: pd.read_feather(path).dropna()
+        case "csv_compact":
+            processed_df.to_csv(path, index=False)
+            return lambda: read_melondy_compact(path)
+
+
+@benchmark("load.csv")
+def bench_load_csv(scale: int):
+    return _bench_load(scale, "csv")
+
+
+@benchmark("load.parquet")
+def bench_load_parquet(scale: int):
+    return _bench_load(scale, "parquet")
+
+
+@benchmark("load.feather")
+def bench_load_feather(scale: int):
+    return _bench_load(scale, "feather")
+
+
+@benchmark("load.csv_compact")
+def bench_load_csv_compact(scale: int):
+    return _bench_load(scale, "csv_compact")
@@ -0,0 +1,66 @@
+"""
+Startup benchmarks: how long a fresh interpreter takes to import the modules that prediction CLIs and tests
+import. Each run is a new process without Spotify credentials, so a module that needs them, or that builds
+a client at import time, fails here instead of silently getting slower.
+
+import_time_report breaks one import down with python -X importtime, slowest cumulative imports first.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_imports utils.spotify_utils models.streaming_regressor
+"""
+
+import os
+import subprocess
+import sys
+
+from benchmarks.harness import benchmark
+
+IMPORT_BENCHMARK_MODULES = [
+    "models.fantaino_base",
+    "models.ordinal_logistic_regression",
+    "models.streaming_regressor",
+    "utils.artifacts",
+    "utils.data_utils",
+    "utils.incremental_utils",
+    "utils.spotify_utils",
+]
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_import(module_name: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    env = {name: value for name, value in os.environ.items() if not name.startswith("SPOTIPY_")}
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", f"import {module_name}"]
+    return subprocess.run(command, cwd=_PACKAGE_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def import_time_report(module_name: str, top: int = 15) -> list[tuple[str, float, float]]:
+    """
+        The top slowest imports of a fresh `import module_name`, as (module, self ms, cumulative ms), by
+        cumulative time. The first entry is module_name itself, i.e. the total.
+    """
+    timings = []
+    for line in _run_import(module_name, importtime=True).stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(timings, key=lambda timing: -timing[2])[:top]
+
+
+def _make_import_benchmark(module_name: str):
+    @benchmark(f"import.{module_name}", scales=(1,))
+    def bench_import(scale: int):
+        return lambda: _run_import(module_name)
+    return bench_import
+
+
+for _module_name in IMPORT_BENCHMARK_MODULES:
+    _make_import_benchmark(_module_name)
+
+
+if __name__ == "__main__":
+    for module_name in sys.argv[1:] or IMPORT_BENCHMARK_MODULES:
+        print(f"{module_name}:")
+        for name, self_ms, cumulative_ms in import_time_report(module_name):
+            print(f"    {name:<50} {self_ms:>9.1f} ms self {cumulative_ms:>9.1f} ms cumulative")
@@ -0,0 +1,127 @@
+"""
+Benchmarks for fitting and predicting with the KNN and random forest models the way models/ scripts do, and for
+the stacked ensemble's prediction with and without its output cache, and the similarity index's top-k queries.
+"""
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.harness import benchmark
+from benchmarks.synthetic_data import PRODUCTION_NUM_REVIEWS, make_processed_df
+
+KNN_FEATURES = [
+    "total_tracks",
+    "release_year",
+    "release_month",
+    "album_duration_in_s",
+    "explicit_proportion",
+    "num_features",
+]
+
+DROPPED_FEATURES = [
+    "artist",
+    "album",
+    "image_url",
+    "featured_artists",
+    "track_names",
+]
+
+
+def _knn_data(scale: int):
+    processed_df = make_processed_df(PRODUCTION_NUM_REVIEWS * scale)
+    return processed_df[KNN_FEATURES], processed_df["rating"]
+
+
+def _rf_data(scale: int):
+    processed_df = make_processed_df(PRODUCTION_NUM_REVIEWS * scale)
+    return processed_df.drop(columns=["rating"] + DROPPED_FEATURES), processed_df["rating"]
+
+
+def _knn_pipe():
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("knn", KNeighborsClassifier(n_neighbors=20)),
+    ])
+
+
+def _rf_pipe():
+    return Pipeline([
+        ("rf", RandomForestRegressor(n_estimators=100, n_jobs=-1, random_state=0)),
+    ])
+
+
+@benchmark("models.knn.fit")
+def bench_knn_fit(scale: int):
+    X, y = _knn_data(scale)
+    return lambda: _knn_pipe().fit(X, y)
+
+
+@benchmark("models.knn.predict")
+def bench_knn_predict(scale: int):
+    X, y = _knn_data(scale)
+    pipe = _knn_pipe().fit(X, y)
+    return lambda: pipe.predict(X)
+
+
+@benchmark("models.rf.fit", scales=(1, 10))
+def bench_rf_fit(scale: int):
+    X, y = _rf_data(scale)
+    return lambda: _rf_pipe().fit(X, y)
+
+
+@benchmark("models.rf.predict", scales=(1, 10))
+def bench_rf_predict(scale: int):
+    X, y = _rf_data(scale)
+    pipe = _rf_pipe().fit(X, y)
+    return lambda: pipe.predict(X)
+
+
+def _trained_ensemble(scale: int):
+    from models.ordinal_logistic_regression import FantAInoOrdinalRegressor
+    from models.stacked_ensemble import FantAInoStackedEnsemble
+    from models.streaming_regressor import FantAInoStreamingRegressor
+
+    processed_df = make_processed_df(PRODUCTION_NUM_REVIEWS * scale)
+    X, y = processed_df.drop(columns=["rating"]), processed_df["rating"]
+    ensemble = FantAInoStackedEnsemble({
+        "ordinal_logistic_regression": FantAInoOrdinalRegressor(random_state=0),
+        "streaming_squared_error": FantAInoStreamingRegressor(loss="squared_error", random_state=0),
+    }, n_jobs=-1)
+    return ensemble.train(X, y), X
+
+
+@benchmark("models.stacked_ensemble.predict", scales=(1,))
+def bench_stacked_ensemble_predict(scale: int):
+    ensemble, X = _trained_ensemble(scale)
+
+    def run():
+        ensemble.clear_cache()
+        ensemble.predict(X)
+    return run
+
+
+@benchmark("models.stacked_ensemble.predict_cached", scales=(1,))
+def bench_stacked_ensemble_predict_cached(scale: int):
+    ensemble, X = _trained_ensemble(scale)
+    ensemble.predict(X)
+    return lambda: ensemble.predict(X)
+
+
+@benchmark("similarity_index.similar_to", scales=(1, 10, 100))
+def bench_similarity_index_query(scale: int):
+    import tempfile
+
+    from utils.similarity_index import AlbumSimilarityIndex
+
+    processed_df = make_processed_df(PRODUCTION_NUM_REVIEWS * scale)
+    # removed once the benchmark drops run
+    tmp_dir = tempfile.TemporaryDirectory()
+    index = AlbumSimilarityIndex.build(tmp_dir.name, processed_df)
+    artist_name, album_name = processed_df["artist"].iloc[0], processed_df["album"].iloc[0]
+
+    def run(tmp_dir=tmp_dir):
+        for _ in range(100):
+            index.similar_to(artist_name, album_name, k=10)
+    return run
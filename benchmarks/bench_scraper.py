@@ -0,0 +1,160 @@
+"""
+Benchmarks for the crawlers' HTML extraction on fixture pages, the crawls against a local fixture server, and the
+rating extraction over their output.
+"""
+
+import os
+import tempfile
+
+from itertools import cycle, islice
+
+import jsonlines
+
+from benchmarks.harness import benchmark
+from benchmarks.synthetic_data import (
+    PRODUCTION_NUM_REVIEWS,
+    make_aoty_index_page_html,
+    make_review_page_html,
+)
+from benchmarks.fixture_server import FixtureServer
+from scraper.aoty_scraper import crawl_paginated, parse_album_blocks
+from scraper.crawler_config import Config
+from scraper.distributed_crawl import crawl_distributed
+from scraper.page_parser import extract_page
+from utils.rating_utils import iter_review_ratings
+
+NUM_FIXTURE_PAGES = 50
+RATING_LINES = ["7/10", "DECENT_TO_STRONG_6", "NOT GOOD", "Light 8", "STRONG_7_TO_LIGHT_8", "no rating here"]
+# one AOTY index page per 60 reviews
+PRODUCTION_NUM_INDEX_PAGES = PRODUCTION_NUM_REVIEWS // 60
+
+FANTANO_CONFIG = Config(
+    url="https://theneedledrop.com/",
+    match="*/album-reviews/*",
+    selector=".post_c_in",
+    max_pages_to_crawl=100_000,
+    output_file_name="unused.jsonl",
+)
+AOTY_CONFIG = Config(
+    url="https://www.albumoftheyear.org/publication/57-the-needle-drop/reviews/1/",
+    match="*/57-the-needle-drop/reviews/*",
+    selector=".albumBlock",
+    max_pages_to_crawl=100_000,
+    output_file_name="unused.jsonl",
+)
+
+
+@benchmark("scraper.extract_page.review", scales=(1, 10))
+def bench_extract_review_pages(scale: int):
+    fixture_pages = [make_review_page_html(seed=seed) for seed in range(NUM_FIXTURE_PAGES)]
+    pages = list(islice(cycle(fixture_pages), PRODUCTION_NUM_REVIEWS * scale))
+
+    def run():
+        for page in pages:
+            extract_page(page, FANTANO_CONFIG)
+    return run
+
+
+@benchmark("scraper.extract_page.aoty_index")
+def bench_extract_aoty_index_pages(scale: int):
+    num_pages = PRODUCTION_NUM_INDEX_PAGES * scale
+    fixture_pages = [make_aoty_index_page_html(page_number, last_page=num_pages) for page_number in range(1, NUM_FIXTURE_PAGES + 1)]
+    pages = list(islice(cycle(fixture_pages), num_pages))
+
+    def run():
+        for page in pages:
+            extract_page(page, AOTY_CONFIG)
+    return run
+
+
+@benchmark("scraper.parse_album_blocks.aoty_index")
+def bench_parse_album_blocks(scale: int):
+    num_pages = PRODUCTION_NUM_INDEX_PAGES * scale
+    fixture_pages = [make_aoty_index_page_html(page_number, last_page=num_pages) for page_number in range(1, NUM_FIXTURE_PAGES + 1)]
+    pages = list(islice(cycle(fixture_pages), num_pages))
+
+    def run():
+        for page in pages:
+            parse_album_blocks(page)
+    return run
+
+
+# stands in for the round trip to albumoftheyear.org
+FIXTURE_LATENCY_IN_S = 0.05
+
+
+@benchmark("scraper.crawl_paginated.aoty_index", scales=(1, 10))
+def bench_crawl_paginated(scale: int):
+    num_pages = PRODUCTION_NUM_INDEX_PAGES * scale
+    fixture_pages = [make_aoty_index_page_html(page_number, last_page=num_pages) for page_number in range(1, NUM_FIXTURE_PAGES + 1)]
+
+    def page_fn(path: str) -> str | None:
+        page_number = int(path.rstrip("/").rsplit("/", 1)[-1])
+        return fixture_pages[(page_number - 1) % NUM_FIXTURE_PAGES] if 1 <= page_number <= num_pages else None
+
+    def run():
+        with FixtureServer(page_fn, latency_in_s=FIXTURE_LATENCY_IN_S) as server:
+            config = AOTY_CONFIG.model_copy(update={"url": f"{server.url}/publication/57-the-needle-drop/reviews/1/"})
+            # the fixture server doesn't need the live site's rate limit
+            pages = crawl_paginated(config, max_workers=16, requests_per_second=None)
+        assert len(pages) == num_pages
+    return run
+
+
+NUM_SITE_REVIEW_PAGES = 200
+
+
+def _make_review_site(num_pages: int):
+    """
+        A page function for a theneedledrop.com-like site: the root links to a few reviews, and every review links
+        to 4 others, so the crawl has to discover the pages as it goes.
+    """
+    fixture_pages = [make_review_page_html(seed=seed).split("<aside>")[0] for seed in range(NUM_FIXTURE_PAGES)]
+
+    def page_fn(path: str) -> str | None:
+        if path == "/":
+            return "<html><body>" + "".join(f'<a href="/album-reviews/{k}/">review</a>' for k in range(5)) + "</body></html>"
+        page_number = int(path.rstrip("/").rsplit("/", 1)[-1])
+        if not 0 <= page_number < num_pages:
+            return None
+        links = "".join(f'<a href="/album-reviews/{(page_number * 7 + k) % num_pages}/">review</a>' for k in range(1, 5))
+        return fixture_pages[page_number % NUM_FIXTURE_PAGES] + f"<aside>{links}</aside></body></html>"
+    return page_fn
+
+
+def _make_distributed_crawl_benchmark(num_workers: int):
+    @benchmark(f"scraper.crawl_distributed.workers_{num_workers}", scales=(1,))
+    def bench_crawl_distributed(scale: int):
+        page_fn = _make_review_site(NUM_SITE_REVIEW_PAGES * scale)
+
+        def run():
+            with FixtureServer(page_fn, latency_in_s=FIXTURE_LATENCY_IN_S) as server, tempfile.TemporaryDirectory() as tmp_dir:
+                config = FANTANO_CONFIG.model_copy(update={
+                    "url": f"{server.url}/", "num_workers": num_workers,
+                    "output_file_name": os.path.join(tmp_dir, "archive"),
+                })
+                num_pages = crawl_distributed(config)
+            assert num_pages == NUM_SITE_REVIEW_PAGES * scale
+        return run
+    return bench_crawl_distributed
+
+
+for _num_workers in (1, 2, 4):
+    _make_distributed_crawl_benchmark(_num_workers)
+
+
+@benchmark("rating_utils.iter_review_ratings")
+def bench_iter_review_ratings(scale: int):
+    fixture_pages = [
+        extract_page(make_review_page_html(rating_line=rating_line, seed=seed), FANTANO_CONFIG)[0]
+        for seed, rating_line in enumerate(islice(cycle(RATING_LINES), NUM_FIXTURE_PAGES))
+    ]
+    scraped_file_name = os.path.join(tempfile.mkdtemp(prefix="fantaino_bench_"), "reviews.jsonl")
+    with jsonlines.open(scraped_file_name, "w") as writer:
+        for i, text in enumerate(islice(cycle(fixture_pages), PRODUCTION_NUM_REVIEWS * scale)):
+            writer.write({"url": f"https://theneedledrop.com/album-reviews/{i}", "html": text})
+
+    def run():
+        for _ in iter_review_ratings(scraped_file_name):
+            pass
+    return run
@@ -0,0 +1,68 @@
+"""
+Benchmarks for utils/spotify_utils.py. The Spotify client is replaced with an in-memory mock so only
+our own search/matching and featurization code is measured.
+"""
+
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.synthetic_data import PRODUCTION_NUM_REVIEWS, make_melondy_df, make_spotify_album_response
+from utils import spotify_utils
+
+
+class MockSpotify:
+    """
+        Answers search and album_tracks from pregenerated responses, the way spotipy.Spotify would.
+    """
+
+    def __init__(self, responses: dict[tuple[str, str], dict]):
+        self.albums_by_name = {}
+        self.tracks_by_id = {}
+        self.artists_by_name = {}
+        for (artist_name, album_name), response in responses.items():
+            self.albums_by_name.setdefault(album_name.lower(), []).append(response["album"])
+            self.tracks_by_id[response["album"]["id"]] = {"items": response["tracks"]}
+            self.artists_by_name[artist_name.lower()] = {"name": artist_name, "popularity": response["artist_popularity"]}
+
+    def search(self, q: str, type: str, market=None) -> dict:
+        fields = dict(part.split(":", 1) for part in q.replace(" album:", "\n album:").split("\n") if ":" in part)
+        fields = {key.strip(): value.strip().lower() for key, value in fields.items()}
+        if type == "artist":
+            artist = self.artists_by_name.get(fields.get("artist", ""))
+            return {"artists": {"items": [artist] if artist else []}}
+        return {"albums": {"items": self.albums_by_name.get(fields.get("album", ""), [])}}
+
+    def album_tracks(self, album_id: str) -> dict:
+        return self.tracks_by_id[album_id]
+
+
+def _make_albums(scale: int) -> list[tuple[str, str]]:
+    melondy_df = make_melondy_df(PRODUCTION_NUM_REVIEWS * scale)
+    # & joined artists trigger the API rate limit sleep, which is not what we're measuring
+    artists = melondy_df["artist"].str.replace("&", "", regex=False).map(spotify_utils.clean_name)
+    albums = melondy_df["album"].map(spotify_utils.clean_name)
+    return list(zip(artists, albums))
+
+
+@benchmark("spotify_utils.get_spotify_album")
+def bench_get_spotify_album(scale: int):
+    rng = np.random.default_rng(0)
+    albums = _make_albums(scale)
+    mock = MockSpotify({album: make_spotify_album_response(*album, rng) for album in albums})
+
+    def run():
+        spotify_utils._spotify = mock
+        for artist_name, album_name in albums:
+            spotify_utils.get_spotify_album(artist_name, album_name)
+    return run
+
+
+@benchmark("spotify_utils.process_spotify_album_data")
+def bench_process_spotify_album_data(scale: int):
+    rng = np.random.default_rng(0)
+    responses = [make_spotify_album_response(artist, album, rng) for artist, album in _make_albums(scale)]
+
+    def run():
+        for response in responses:
+            spotify_utils.process_spotify_album_data(response)
+    return run
@@ -0,0 +1,88 @@
+"""
+A local HTTP server for exercising the crawlers without hitting the real sites. Pages come from a function of
+the request path, and every response can be delayed to stand in for network latency.
+"""
+
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+class FixtureServer:
+    """
+        Serves page_fn(path) on 127.0.0.1, 404 when it returns None. Use as a context manager:
+
+            with FixtureServer(lambda path: "<html></html>", latency_in_s=0.02) as server:
+                requests.get(f"{server.url}/any/path")
+
+        Args:
+            page_fn: request path -> the HTML to serve, or None.
+            latency_in_s: how long every response is held back.
+            post_fn: (request path, request body) -> the response to a POST, or None. POSTs get a 405 without it.
+            content_type: the Content-Type of every response, e.g. application/json for an API stub.
+    """
+
+    def __init__(
+        self,
+        page_fn: Callable[[str], str | None],
+        latency_in_s: float = 0.0,
+        post_fn: Callable[[str, bytes], str | None] | None = None,
+        content_type: str = "text/html; charset=utf-8",
+    ):
+        self.page_fn = page_fn
+        self.latency_in_s = latency_in_s
+        self.post_fn = post_fn
+        self.content_type = content_type
+        self.num_requests = 0
+        self._lock = threading.Lock()
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, page: str | None, error_status: int = 404):
+                body = (page or "not found").encode("utf-8")
+                self.send_response(200 if page is not None else error_status)
+                self.send_header("Content-Type", fixture_server.content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _count_request(self):
+                with fixture_server._lock:
+                    fixture_server.num_requests += 1
+                if fixture_server.latency_in_s:
+                    time.sleep(fixture_server.latency_in_s)
+
+            def do_GET(self):
+                self._count_request()
+                self._respond(fixture_server.page_fn(self.path))
+
+            def do_POST(self):
+                request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._count_request()
+                if fixture_server.post_fn is None:
+                    self._respond(None, error_status=405)
+                    return
+                self._respond(fixture_server.post_fn(self.path, request_body))
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
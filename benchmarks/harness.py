@@ -0,0 +1,56 @@
+"""
+A minimal benchmark registry and timer. Each benchmark is a setup function that receives the dataset
+scale (1 = production size) and returns the zero-argument callable to time, so data generation never
+counts towards the measurement.
+"""
+
+import gc
+import statistics
+import time
+from typing import Callable
+
+BENCHMARKS: dict[str, tuple[Callable[[int], Callable[[], object]], tuple[int, ...]]] = {}
+DEFAULT_SCALES = (1, 10, 100)
+
+
+def benchmark(name: str, scales: tuple[int, ...] = DEFAULT_SCALES):
+    """
+        Registers a benchmark setup function under name, to be run at each of the given scales.
+    """
+    def decorator(setup_fn: Callable[[int], Callable[[], object]]):
+        BENCHMARKS[name] = (setup_fn, scales)
+        return setup_fn
+    return decorator
+
+
+def time_callable(fn: Callable[[], object], repeats: int = 5, min_repeats_time_in_s: float = 30.0) -> list[float]:
+    """
+        Times fn repeats times, with garbage collection disabled during each run.
+        Stops repeating early once min_repeats_time_in_s has been spent, so the 100x scales stay tractable.
+    """
+    timings = []
+    total_time = 0.0
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        timings.append(elapsed)
+        total_time += elapsed
+        if total_time >= min_repeats_time_in_s:
+            break
+    return timings
+
+
+def summarize(timings: list[float]) -> dict[str, float]:
+    return {
+        "repeats": len(timings),
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
@@ -0,0 +1,135 @@
+"""
+Runs the benchmark suite and writes the timings to JSON.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --filter "models.*" --scales 1 10
+    python -m benchmarks.run_benchmarks --compare results/benchmarks/baseline.json
+"""
+
+import argparse
+import datetime
+import fnmatch
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks.harness import BENCHMARKS, summarize, time_callable
+
+BENCHMARK_MODULES = [
+    "benchmarks.bench_data_utils",
+    "benchmarks.bench_spotify_utils",
+    "benchmarks.bench_scraper",
+    "benchmarks.bench_models",
+    "benchmarks.bench_cover_cnn",
+    "benchmarks.bench_imports",
+]
+DEFAULT_OUTPUT_DIR = os.path.join("results", "benchmarks")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_metadata() -> dict:
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(name_pattern: str = "*", scales: list[int] | None = None, repeats: int = 5) -> list[dict]:
+    """
+        Runs every registered benchmark matching name_pattern, at its own scales unless scales is given.
+    """
+    results = []
+    for name, (setup_fn, default_scales) in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, name_pattern):
+            continue
+        for scale in scales or default_scales:
+            result = {"benchmark": name, "scale": scale}
+            try:
+                fn = setup_fn(scale)
+                result.update(summarize(time_callable(fn, repeats=repeats)), status="ok")
+            except ImportError as e:
+                # optional dependencies (e.g. pyarrow for the columnar formats) just skip their benchmarks
+                result.update(status="skipped", reason=str(e).splitlines()[0])
+            print(f"{name} [x{scale}]: " + (f"{result['median_s']:.4f}s" if result["status"] == "ok" else result["reason"]))
+            results.append(result)
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float = 1.10) -> list[dict]:
+    """
+        Matches benchmarks by (name, scale) and reports the ratio of current to baseline median time.
+        Anything slower than threshold times the baseline is flagged as a regression.
+    """
+    baseline_medians = {
+        (result["benchmark"], result["scale"]): result["median_s"]
+        for result in baseline["results"] if result["status"] == "ok"
+    }
+    comparisons = []
+    for result in current["results"]:
+        key = (result["benchmark"], result["scale"])
+        if result["status"] != "ok" or key not in baseline_medians:
+            continue
+        ratio = result["median_s"] / baseline_medians[key]
+        comparisons.append({
+            "benchmark": result["benchmark"],
+            "scale": result["scale"],
+            "baseline_median_s": baseline_medians[key],
+            "median_s": result["median_s"],
+            "ratio": ratio,
+            "regression": ratio > threshold,
+        })
+    return comparisons
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="*", help="fnmatch pattern over benchmark names")
+    parser.add_argument("--scales", type=int, nargs="+", help="multiples of the production dataset size to run at")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="JSON file to write, defaults to results/benchmarks/benchmarks_<timestamp>.json")
+    parser.add_argument("--compare", help="a previous JSON output to compare against")
+    parser.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    for module in BENCHMARK_MODULES:
+        importlib.import_module(module)
+
+    report = {"metadata": environment_metadata(), "results": run(args.filter, args.scales, args.repeats)}
+
+    output_file_name = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"benchmarks_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output_file_name) or ".", exist_ok=True)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(baseline, report, args.threshold)
+        for comparison in report["comparison"]:
+            flag = "  REGRESSION" if comparison["regression"] else ""
+            print(f"{comparison['benchmark']} [x{comparison['scale']}]: {comparison['ratio']:.2f}x baseline{flag}")
+        exit_code = int(any(comparison["regression"] for comparison in report["comparison"]))
+
+    with open(output_file_name, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {output_file_name}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Synthetic data shaped like the real FantAIno datasets, so benchmarks can run without the
+scraped data and at multiples of the production size.
+"""
+
+import numpy as np
+import pandas as pd
+
+# roughly the number of album reviews in melondy_and_spotify.csv
+PRODUCTION_NUM_REVIEWS = 3_100
+# roughly the number of distinct melondy genres
+PRODUCTION_NUM_GENRES = 600
+# the AOTY publication page lists 60 albums per index page
+ALBUMS_PER_INDEX_PAGE = 60
+
+RATINGS = np.arange(-1, 11)
+# Fantano's rating distribution is centered around 6-7
+RATING_WEIGHTS = np.array([2, 1, 1, 2, 4, 6, 10, 16, 20, 18, 12, 2], dtype=float)
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "so", "ta", "vi", "xo", "ze", "ba", "dre", "ghi", "jun", "pha", "qui"]
+SPECIAL_CHARACTERS = ["’", "•", "“", "”", "'", "&", ":", "?", "/"]
+
+
+def _random_names(rng: np.random.Generator, n: int, min_words: int = 1, max_words: int = 4, special_rate: float = 0.05) -> list[str]:
+    names = []
+    for _ in range(n):
+        words = []
+        for _ in range(rng.integers(min_words, max_words + 1)):
+            word = "".join(rng.choice(SYLLABLES, size=rng.integers(1, 4)))
+            if rng.random() < special_rate:
+                word += rng.choice(SPECIAL_CHARACTERS)
+            words.append(word.capitalize())
+        names.append(" ".join(words))
+    return names
+
+
+def make_genre_vocabulary(num_genres: int = PRODUCTION_NUM_GENRES) -> list[str]:
+    return [f"genre {i}" for i in range(num_genres)]
+
+
+def make_melondy_df(num_reviews: int = PRODUCTION_NUM_REVIEWS, seed: int = 0) -> pd.DataFrame:
+    """
+        The raw melondy extraction: artist, album, image_url, rating and a Python-literal genre list per album.
+        Genre popularity follows a Zipf-like distribution like the real data does.
+    """
+    rng = np.random.default_rng(seed)
+    genres = np.array(make_genre_vocabulary())
+    genre_weights = 1 / np.arange(1, genres.shape[0] + 1)
+    genre_weights /= genre_weights.sum()
+    genre_lists = [
+        str(rng.choice(genres, size=rng.integers(1, 6), replace=False, p=genre_weights).tolist())
+        for _ in range(num_reviews)
+    ]
+    return pd.DataFrame({
+        "artist": _random_names(rng, num_reviews, max_words=3),
+        "album": _random_names(rng, num_reviews),
+        "genre": genre_lists,
+        "image_url": [f"https://cdn.example.com/thumbnails/{i:024x}.jpg" for i in range(num_reviews)],
+        "rating": rng.choice(RATINGS, size=num_reviews, p=RATING_WEIGHTS / RATING_WEIGHTS.sum()),
+    })
+
+
+def make_processed_df(num_reviews: int = PRODUCTION_NUM_REVIEWS, num_genre_columns: int = 40, seed: int = 0) -> pd.DataFrame:
+    """
+        The processed table the models train on (melondy_and_spotify.csv), with is_<genre> dummies.
+    """
+    rng = np.random.default_rng(seed)
+    melondy_df = make_melondy_df(num_reviews, seed=seed).drop(columns=["genre"])
+    total_tracks = rng.integers(4, 25, size=num_reviews)
+    num_features = rng.integers(0, 12, size=num_reviews)
+    processed_df = melondy_df.assign(
+        total_tracks=total_tracks.astype(float),
+        num_available_markets=rng.integers(0, 186, size=num_reviews).astype(float),
+        release_year=rng.integers(2010, 2026, size=num_reviews).astype(float),
+        release_month=rng.integers(1, 13, size=num_reviews).astype(float),
+        release_day=rng.integers(1, 29, size=num_reviews).astype(float),
+        album_duration_in_s=rng.normal(2700, 600, size=num_reviews).clip(600),
+        explicit_proportion=rng.random(num_reviews),
+        featured_artists=[str(_random_names(rng, n, max_words=2, special_rate=0)) for n in num_features],
+        num_features=num_features.astype(float),
+        track_names=[str(_random_names(rng, n, special_rate=0)) for n in total_tracks],
+        artist_popularity=rng.integers(0, 100, size=num_reviews).astype(float),
+    )
+    genre_flags = rng.random((num_reviews, num_genre_columns)) < np.linspace(0.3, 0.01, num_genre_columns)
+    genre_df = pd.DataFrame(genre_flags, columns=[f"is_{genre}" for genre in make_genre_vocabulary(num_genre_columns)])
+    return pd.concat([processed_df, genre_df], axis=1)
+
+
+def make_spotify_album_response(artist_name: str, album_name: str, rng: np.random.Generator) -> dict:
+    """
+        A response shaped like get_spotify_album's output: the album, its tracks and the artist popularity.
+    """
+    num_tracks = int(rng.integers(4, 25))
+    tracks = [
+        {
+            "name": f"{album_name} track {i}",
+            "duration_ms": int(rng.integers(60_000, 420_000)),
+            "explicit": bool(rng.random() < 0.3),
+            "artists": [{"name": artist_name}] + [{"name": f"feature {j}"} for j in range(int(rng.integers(0, 3)))],
+        }
+        for i in range(num_tracks)
+    ]
+    album = {
+        "id": f"{rng.integers(1 << 62):022d}",
+        "name": album_name,
+        "total_tracks": num_tracks,
+        "available_markets": ["US"] * int(rng.integers(0, 186)),
+        "release_date": "2021-08-13",
+        "release_date_precision": "day",
+        "artists": [{"name": artist_name}],
+    }
+    return {"album": album, "tracks": tracks, "artist_popularity": int(rng.integers(0, 100))}
+
+
+def make_review_page_html(num_paragraphs: int = 12, rating_line: str = "7/10", seed: int = 0) -> str:
+    """
+        A theneedledrop.com album review page: a .post_c_in body ending in a rating, plus navigation links.
+    """
+    rng = np.random.default_rng(seed)
+    paragraphs = "".join(f"<p>{' '.join(_random_names(rng, 40, special_rate=0))}</p>" for _ in range(num_paragraphs))
+    links = "".join(f'<a href="/album-reviews/{rng.integers(1_000_000)}/">review</a>' for _ in range(30))
+    nav = "".join(f'<a href="/about/{i}">about</a>' for i in range(20))
+    return (
+        f"<html><head><title>review</title></head><body><nav>{nav}</nav>"
+        f'<div class="post_c_in">{paragraphs}<p>{rating_line}</p></div>'
+        f"<aside>{links}</aside></body></html>"
+    )
+
+
+def make_aoty_index_page_html(page_number: int = 1, last_page: int = 54, seed: int = 0) -> str:
+    """
+        An AOTY needle drop publication index page with .albumBlock entries and pagination links.
+    """
+    rng = np.random.default_rng(seed + page_number)
+    blocks = "".join(
+        '<div class="albumBlock">'
+        f'<div class="image"><img class="lazyload" data-src="https://cdn.albumoftheyear.org/album/{page_number}-{i}.jpg"></div>'
+        f'<a href="/album/{page_number}{i}.php"><div class="artistTitle">{artist}</div>'
+        f'<div class="albumTitle">{album}</div></a>'
+        f'<div class="ratingRowContainer"><div class="ratingBlock"><div class="rating">{rating}</div></div></div>'
+        "</div>"
+        for i, (artist, album, rating) in enumerate(zip(
+            _random_names(rng, ALBUMS_PER_INDEX_PAGE, max_words=3),
+            _random_names(rng, ALBUMS_PER_INDEX_PAGE),
+            rng.integers(0, 11, size=ALBUMS_PER_INDEX_PAGE) * 10,
+        ))
+    )
+    pages = "".join(
+        f'<a href="/publication/57-the-needle-drop/reviews/{n}/">{n}</a>'
+        for n in sorted({1, max(page_number - 1, 1), page_number, min(page_number + 1, last_page), last_page})
+    )
+    return f'<html><body><div id="centerContent">{blocks}</div><div class="pageSelectRow">{pages}</div></body></html>'
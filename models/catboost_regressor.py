@@ -0,0 +1,123 @@
+"""
+CatBoost model for Fantano's ratings. The artist and the album's genre list are handed to
+CatBoost as native categorical features instead of being dropped or one-hot encoded.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ast import literal_eval
+from catboost import CatBoostRegressor, Pool
+
+from models.fantaino_base import FantAInoFitter, accuracy
+from utils.data_utils import collapse_genre_dummies, get_genre_columns
+
+CATEGORICAL_FEATURES = [
+    "artist",
+    "genres",
+]
+
+DROPPED_FEATURES = [
+    "album",
+    "image_url",
+    "featured_artists",
+    "track_names",
+]
+
+
+class FantAInoCatBoost(FantAInoFitter):
+    """
+        CatBoost regressor over the -1..10 rating scale. Predictions are rounded and clipped to the scale,
+        the same way the random forest scripts do it.
+
+        Args:
+            iterations: the maximum number of boosting rounds.
+            learning_rate: the boosting learning rate.
+            depth: the depth of each symmetric tree.
+            early_stopping_rounds: stop once the validation loss hasn't improved for this many rounds.
+            validation_size: fraction of the training data held out for early stopping.
+            thread_count: number of threads CatBoost may use, -1 uses every core.
+            random_state: seed for both the validation split and CatBoost.
+    """
+
+    def __init__(
+        self,
+        iterations: int = 2000,
+        learning_rate: float = 0.05,
+        depth: int = 6,
+        early_stopping_rounds: int = 100,
+        validation_size: float = 0.15,
+        thread_count: int = -1,
+        random_state: int | None = None,
+        **catboost_params,
+    ):
+        self.early_stopping_rounds = early_stopping_rounds
+        self.validation_size = validation_size
+        self.random_state = random_state
+        self._estimator = CatBoostRegressor(
+            iterations=iterations,
+            learning_rate=learning_rate,
+            depth=depth,
+            loss_function="RMSE",
+            thread_count=thread_count,
+            random_seed=random_state,
+            allow_writing_files=False,
+            verbose=False,
+            **catboost_params,
+        )
+
+    @property
+    def estimator(self):
+        return self._estimator
+
+    def preprocess(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        """
+            Builds the "genres" categorical column from either the raw melondy genre list or the
+            is_<genre> dummies, and makes sure categorical columns are strings as CatBoost requires.
+        """
+        dataset = dataset.copy()
+        if "genre" in dataset.columns:
+            dataset["genres"] = dataset["genre"].apply(lambda x: "|".join(sorted(literal_eval(x))))
+            dataset = dataset.drop(columns=["genre"])
+        else:
+            dataset["genres"] = collapse_genre_dummies(dataset)
+        for column in CATEGORICAL_FEATURES:
+            dataset[column] = dataset[column].fillna("").astype(str)
+        genre_columns = get_genre_columns(dataset)
+        dataset[genre_columns] = dataset[genre_columns].astype(int)
+        return self.extract_features(dataset, DROPPED_FEATURES + ["rating"], omit_mode=True)
+
+    def extract_features(self, dataset: pd.DataFrame, feature_set: list[str], omit_mode: bool = True) -> pd.DataFrame:
+        if omit_mode:
+            return dataset.drop(columns=[feature for feature in feature_set if feature in dataset.columns])
+        return dataset[feature_set]
+
+    def train(self, input_data: pd.DataFrame, response_data: pd.Series):
+        """
+            Fits CatBoost with early stopping on a validation split carved out of the training data.
+            The model is rolled back to the best validation iteration.
+        """
+        from sklearn.model_selection import train_test_split
+
+        features = self.preprocess(input_data)
+        X_train, X_val, y_train, y_val = train_test_split(
+            features,
+            response_data,
+            test_size=self.validation_size,
+            random_state=self.random_state,
+        )
+        self._estimator.fit(
+            Pool(X_train, y_train, cat_features=CATEGORICAL_FEATURES),
+            eval_set=Pool(X_val, y_val, cat_features=CATEGORICAL_FEATURES),
+            early_stopping_rounds=self.early_stopping_rounds,
+            use_best_model=True,
+        )
+        return self
+
+    def predict(self, input_data: pd.DataFrame) -> np.ndarray:
+        features = self.preprocess(input_data)
+        raw_preds = self._estimator.predict(Pool(features, cat_features=CATEGORICAL_FEATURES))
+        return np.clip(np.rint(raw_preds), a_min=-1, a_max=10).astype(int)
+
+    def evaluate(self, input_data: pd.DataFrame, response_data: pd.Series, loss_fn=accuracy) -> float:
+        return loss_fn(response_data, self.predict(input_data))
@@ -0,0 +1,415 @@
+"""
+CPU-first cover art model: a frozen ImageNet backbone turns every cover into an embedding once, and a small
+head is trained on the cached embeddings. That replaces the scratch/cnn.ipynb setup (VGG16 at 224px, trained
+end to end through Lightning with accelerator="gpu"), which is impractical without a GPU.
+
+    Backbones: mobilenet_v3_small (default, ~2.5M parameters), resnet18, or vgg16 as in the notebook.
+    Training reads the covers from the utils.cover_store.CoverStore, which embeds each distinct cover once and
+    caches its embedding per backbone and image size, so albums sharing a cover and later runs reuse it.
+    Inference runs in batches under torch.inference_mode with channels_last tensors, on n_threads intra-op
+    threads, with num_workers DataLoader processes decoding and resizing the JPEGs.
+    The trained backbone + head can be dynamically quantized to int8 (Linear layers) and exported as a frozen
+    TorchScript module for the prediction boxes.
+
+Usage (from the repository root):
+    python -m models.cover_cnn train --backbone mobilenet_v3_small --image-size 160
+    python -m models.cover_cnn benchmark --backbones mobilenet_v3_small resnet18 vgg16 --threads 1 4 --int8 --torchscript
+"""
+
+import argparse
+import contextlib
+import copy
+import numpy as np
+import os
+import pandas as pd
+import time
+import torch
+
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import models
+from torchvision.transforms import v2
+
+from models.fantaino_base import FantAInoFitter, accuracy
+from utils.profiling import span
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def _mobilenet_v3_small(pretrained: bool) -> tuple[torch.nn.Module, int]:
+    backbone = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT if pretrained else None)
+    backbone.classifier = torch.nn.Identity()
+    return backbone, 576
+
+
+def _resnet18(pretrained: bool) -> tuple[torch.nn.Module, int]:
+    backbone = models.resnet18(weights=models.ResNet18_Weights.DEFAULT if pretrained else None)
+    backbone.fc = torch.nn.Identity()
+    return backbone, 512
+
+
+def _vgg16(pretrained: bool) -> tuple[torch.nn.Module, int]:
+    backbone = models.vgg16(weights=models.VGG16_Weights.DEFAULT if pretrained else None)
+    # keep the 4096-wide penultimate layer instead of the 1000 ImageNet logits
+    backbone.classifier = backbone.classifier[:-1]
+    return backbone, 4096
+
+
+# backbone name -> builder(pretrained) returning the headless backbone and its embedding size
+BACKBONES = {
+    "mobilenet_v3_small": _mobilenet_v3_small,
+    "resnet18": _resnet18,
+    "vgg16": _vgg16,
+}
+
+
+@contextlib.contextmanager
+def torch_threads(n_threads: int | None):
+    """
+        Runs the block with n_threads intra-op threads, None leaves torch's default.
+    """
+    if n_threads is None:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(n_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def make_transform(image_size: int) -> v2.Compose:
+    return v2.Compose([
+        v2.ToImage(),
+        v2.Resize(image_size, antialias=True),
+        v2.CenterCrop(image_size),
+        v2.ToDtype(torch.float32, scale=True),
+        v2.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+    ])
+
+
+class CoverDataset(Dataset):
+    """
+        Album covers by file path, decoded and transformed in the DataLoader workers.
+    """
+
+    def __init__(self, image_paths: list[str], transform: v2.Compose):
+        self.image_paths = list(image_paths)
+        self.transform = transform
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        with Image.open(self.image_paths[index]) as image:
+            return self.transform(image.convert("RGB"))
+
+
+class FantAInoCoverModel(FantAInoFitter):
+    """
+        Frozen backbone + small MLP head over Fantano's ratings, trained on CPU.
+
+        Args:
+            backbone: one of BACKBONES.
+            image_size: covers are resized and center cropped to image_size x image_size.
+            hidden_size: width of the head's hidden layer.
+            learning_rate: Adam step size of the head.
+            max_epochs: the maximum number of passes over the training embeddings.
+            n_epochs_no_change: stop once the validation loss hasn't improved for this many epochs.
+            validation_size: fraction of the training covers held out for early stopping.
+            batch_size: covers per batch, for embedding and for training the head.
+            num_workers: DataLoader processes decoding the images, 0 decodes in the main process.
+            n_threads: torch intra-op threads, None leaves torch's default.
+            random_state: seed for the validation split and the head's initialization.
+            pretrained: whether to download the ImageNet weights, only worth turning off for speed benchmarks.
+    """
+
+    def __init__(
+        self,
+        backbone: str = "mobilenet_v3_small",
+        image_size: int = 160,
+        hidden_size: int = 256,
+        learning_rate: float = 1e-3,
+        max_epochs: int = 200,
+        n_epochs_no_change: int = 15,
+        validation_size: float = 0.15,
+        batch_size: int = 64,
+        num_workers: int | None = None,
+        n_threads: int | None = None,
+        random_state: int | None = 0,
+        pretrained: bool = True,
+    ):
+        if backbone not in BACKBONES:
+            raise ValueError(f"Unknown backbone {backbone}, pick one of {list(BACKBONES)}.")
+        self.backbone_name = backbone
+        self.image_size = image_size
+        self.hidden_size = hidden_size
+        self.learning_rate = learning_rate
+        self.max_epochs = max_epochs
+        self.n_epochs_no_change = n_epochs_no_change
+        self.validation_size = validation_size
+        self.batch_size = batch_size
+        self.num_workers = max(min(4, (os.cpu_count() or 1) - 1), 0) if num_workers is None else num_workers
+        self.n_threads = n_threads
+        self.random_state = random_state
+        self.transform = make_transform(image_size)
+        self.backbone, self.embedding_size = BACKBONES[backbone](pretrained)
+        self.backbone.eval().requires_grad_(False)
+        self.backbone = self.backbone.to(memory_format=torch.channels_last)
+        self.head = None
+        self.classes_ = None
+
+    @property
+    def estimator(self) -> torch.nn.Module:
+        """
+            Backbone and head as one module, from covers to rating logits.
+        """
+        return torch.nn.Sequential(self.backbone, self.head).eval()
+
+    def _new_head(self, n_classes: int) -> torch.nn.Module:
+        return torch.nn.Sequential(
+            torch.nn.Linear(self.embedding_size, self.hidden_size),
+            torch.nn.ReLU(),
+            torch.nn.Dropout(0.2),
+            torch.nn.Linear(self.hidden_size, n_classes),
+        )
+
+    def embed(self, image_paths: list[str]) -> np.ndarray:
+        """
+            Backbone embeddings of the covers, computed in batches without autograd.
+        """
+        loader = DataLoader(
+            CoverDataset(image_paths, self.transform),
+            batch_size=self.batch_size,
+            shuffle=False,
+            num_workers=self.num_workers,
+        )
+        embeddings = []
+        with torch_threads(self.n_threads), torch.inference_mode():
+            for images in loader:
+                embeddings.append(self.backbone(images.to(memory_format=torch.channels_last)).flatten(1).numpy())
+        return np.concatenate(embeddings) if embeddings else np.zeros((0, self.embedding_size), dtype=np.float32)
+
+    def extract_features(self, dataset: pd.DataFrame, feature_set: list[str], omit_mode: bool = True) -> pd.DataFrame:
+        if omit_mode:
+            return dataset.drop(columns=[feature for feature in feature_set if feature in dataset.columns])
+        return dataset[feature_set]
+
+    def preprocess(self, dataset) -> pd.DataFrame:
+        """
+            Embeds the covers, given either their file paths or a DataFrame with an image_path column.
+        """
+        image_paths = dataset["image_path"] if isinstance(dataset, pd.DataFrame) else dataset
+        with span("cover_cnn.embed"):
+            embeddings = self.embed(list(image_paths))
+        return pd.DataFrame(embeddings, columns=[f"embedding_{i}" for i in range(embeddings.shape[1])])
+
+    def train_embeddings(self, embeddings: np.ndarray, response_data):
+        """
+            Trains the head on already computed embeddings, e.g. cached ones shared between duplicate covers.
+        """
+        from sklearn.model_selection import train_test_split
+
+        self.classes_ = np.sort(np.unique(response_data))
+        targets = np.searchsorted(self.classes_, np.asarray(response_data))
+        X_train, X_val, y_train, y_val = train_test_split(
+            np.asarray(embeddings, dtype=np.float32), targets, test_size=self.validation_size, random_state=self.random_state
+        )
+        X_train, X_val = torch.from_numpy(X_train), torch.from_numpy(X_val)
+        y_train, y_val = torch.from_numpy(y_train), torch.from_numpy(y_val)
+
+        if self.random_state is not None:
+            torch.manual_seed(self.random_state)
+        self.head = self._new_head(self.classes_.shape[0])
+        optimizer = torch.optim.Adam(self.head.parameters(), lr=self.learning_rate)
+        loss_function = torch.nn.CrossEntropyLoss()
+        best_loss, best_state, epochs_without_improvement = np.inf, copy.deepcopy(self.head.state_dict()), 0
+
+        with torch_threads(self.n_threads):
+            for _ in range(self.max_epochs):
+                self.head.train()
+                for batch in torch.randperm(X_train.shape[0]).split(self.batch_size):
+                    optimizer.zero_grad()
+                    loss_function(self.head(X_train[batch]), y_train[batch]).backward()
+                    optimizer.step()
+                self.head.eval()
+                with torch.inference_mode():
+                    validation_loss = loss_function(self.head(X_val), y_val).item()
+                if validation_loss < best_loss:
+                    best_loss, best_state, epochs_without_improvement = validation_loss, copy.deepcopy(self.head.state_dict()), 0
+                else:
+                    epochs_without_improvement += 1
+                    if epochs_without_improvement >= self.n_epochs_no_change:
+                        break
+        self.head.load_state_dict(best_state)
+        self.head.eval()
+        return self
+
+    def train(self, input_data, response_data):
+        """
+            Embeds the covers once, then trains the head on the embeddings.
+        """
+        return self.train_embeddings(self.preprocess(input_data).to_numpy(), response_data)
+
+    def predict_embeddings(self, embeddings: np.ndarray) -> np.ndarray:
+        with torch_threads(self.n_threads), torch.inference_mode():
+            # to_numpy() of a DataFrame can be read-only, which torch.from_numpy warns about
+            logits = self.head(torch.from_numpy(np.array(embeddings, dtype=np.float32)))
+        return self.classes_[logits.argmax(dim=1).numpy()]
+
+    def predict(self, input_data) -> np.ndarray:
+        return self.predict_embeddings(self.preprocess(input_data).to_numpy())
+
+    def evaluate(self, input_data, response_data, loss_fn=accuracy) -> float:
+        return loss_fn(response_data, self.predict(input_data))
+
+    def quantized_estimator(self) -> torch.nn.Module:
+        """
+            The estimator with its Linear layers dynamically quantized to int8. Convolutions stay float32, so this
+            mostly pays off for the head and VGG16's 4096-wide classifier layers.
+        """
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(self.estimator), {torch.nn.Linear}, dtype=torch.qint8)
+
+    def export_torchscript(self, file_name: str, quantize: bool = False):
+        """
+            Saves the estimator as a frozen TorchScript module, loadable with torch.jit.load and no FantAIno code.
+        """
+        module = self.quantized_estimator() if quantize else self.estimator
+        example = torch.zeros(1, 3, self.image_size, self.image_size).to(memory_format=torch.channels_last)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(module, example))
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        traced.save(file_name)
+
+
+def measure_throughput(
+    module: torch.nn.Module, image_size: int, batch_size: int, n_threads: int | None, num_batches: int = 10, warmup_batches: int = 2
+) -> float:
+    """
+        Images per second through module on random inputs, after a few warmup batches.
+    """
+    images = torch.randn(batch_size, 3, image_size, image_size).to(memory_format=torch.channels_last)
+    with torch_threads(n_threads), torch.inference_mode():
+        for _ in range(warmup_batches):
+            module(images)
+        start = time.perf_counter()
+        for _ in range(num_batches):
+            module(images)
+        elapsed = time.perf_counter() - start
+    return batch_size * num_batches / elapsed
+
+
+def benchmark_throughput(
+    backbones: list[str],
+    image_size: int,
+    batch_sizes: list[int],
+    threads: list[int],
+    int8: bool = False,
+    torchscript: bool = False,
+    pretrained: bool = False,
+) -> pd.DataFrame:
+    """
+        CPU throughput of every backbone/variant/batch size/thread count combination. The head is untrained and
+        the backbone randomly initialized unless pretrained, neither of which changes their speed.
+    """
+    rows = []
+    for backbone in backbones:
+        model = FantAInoCoverModel(backbone=backbone, image_size=image_size, pretrained=pretrained)
+        model.head = model._new_head(12).eval()
+        variants = {"float32": model.estimator}
+        if int8:
+            variants["int8"] = model.quantized_estimator()
+        if torchscript:
+            example = torch.zeros(1, 3, image_size, image_size).to(memory_format=torch.channels_last)
+            with torch.no_grad():
+                variants["torchscript"] = torch.jit.freeze(torch.jit.trace(model.estimator, example))
+        for variant, module in variants.items():
+            for batch_size in batch_sizes:
+                for n_threads in threads:
+                    images_per_s = measure_throughput(module, image_size, batch_size, n_threads)
+                    rows.append({
+                        "backbone": backbone,
+                        "variant": variant,
+                        "image_size": image_size,
+                        "batch_size": batch_size,
+                        "n_threads": n_threads,
+                        "images_per_s": images_per_s,
+                    })
+                    print(f"{backbone} {variant} batch={batch_size} threads={n_threads}: {images_per_s:.1f} images/s")
+    return pd.DataFrame(rows)
+
+
+def train_from_store(model: FantAInoCoverModel, cover_store, train_df: pd.DataFrame, test_df: pd.DataFrame) -> float:
+    """
+        Trains the model on the stored covers of the train albums and returns its accuracy on the test albums.
+        Albums sharing a cover are embedded once, and the embeddings are cached in the store between runs.
+
+        Args:
+            cover_store: the utils.cover_store.CoverStore the covers were downloaded to.
+            train_df, test_df: melondy rows, albums without a stored cover are skipped.
+    """
+    cache_name = f"{model.backbone_name}_{model.image_size}"
+
+    def stored_albums(melondy_df: pd.DataFrame) -> tuple[list[str], np.ndarray]:
+        keys = [cover_store.album_key(artist_name, album_name) for artist_name, album_name in zip(melondy_df["artist"], melondy_df["album"])]
+        is_stored = np.array([key in cover_store.index["albums"] for key in keys], dtype=bool)
+        return [key for key, stored in zip(keys, is_stored) if stored], melondy_df["rating"].to_numpy()[is_stored]
+
+    train_keys, train_ratings = stored_albums(train_df)
+    test_keys, test_ratings = stored_albums(test_df)
+    with span("cover_cnn.embed"):
+        train_embeddings = cover_store.get_embeddings(train_keys, model.embed, cache_name)
+        test_embeddings = cover_store.get_embeddings(test_keys, model.embed, cache_name)
+    with span("cover_cnn.fit"):
+        model.train_embeddings(train_embeddings, train_ratings)
+    with span("cover_cnn.predict"):
+        return accuracy(test_ratings, model.predict_embeddings(test_embeddings))
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train")
+    train_parser.add_argument("--backbone", default="mobilenet_v3_small", choices=list(BACKBONES))
+    train_parser.add_argument("--image-size", type=int, default=160)
+    train_parser.add_argument("--threads", type=int)
+    train_parser.add_argument("--num-workers", type=int)
+    train_parser.add_argument("--export", help="TorchScript file to write the trained model to")
+    train_parser.add_argument("--int8", action="store_true", help="quantize the exported model")
+    benchmark_parser = subparsers.add_parser("benchmark")
+    benchmark_parser.add_argument("--backbones", nargs="+", default=["mobilenet_v3_small", "resnet18", "vgg16"], choices=list(BACKBONES))
+    benchmark_parser.add_argument("--image-size", type=int, default=160)
+    benchmark_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+    benchmark_parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    benchmark_parser.add_argument("--int8", action="store_true")
+    benchmark_parser.add_argument("--torchscript", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        results_df = benchmark_throughput(args.backbones, args.image_size, args.batch_sizes, args.threads, args.int8, args.torchscript)
+        os.makedirs("results", exist_ok=True)
+        results_df.to_csv("results/cover_cnn_throughput.csv", index=False)
+        return
+
+    # only training needs the package layout, the benchmark runs on random inputs
+    import FantAIno
+
+    from utils.cover_store import CoverStore, train_test_albums
+    from utils.data_utils import read_melondy_csv
+
+    root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+    processed_data_dir = os.path.join(root_dir, "data", "processed")
+
+    # the same split as the download_images pipeline stage
+    train_df, test_df = train_test_albums(read_melondy_csv(os.path.join(processed_data_dir, "melondy.csv")))
+    model = FantAInoCoverModel(backbone=args.backbone, image_size=args.image_size, n_threads=args.threads, num_workers=args.num_workers)
+    test_accuracy = train_from_store(model, CoverStore(os.path.join(processed_data_dir, "cover_store")), train_df, test_df)
+    print(f"Test accuracy of the {args.backbone} cover model: {test_accuracy}")
+    if args.export:
+        model.export_torchscript(args.export, quantize=args.int8)
+
+
+if __name__ == "__main__":
+    main()
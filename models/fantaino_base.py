@@ -1,14 +1,32 @@
+"""
+The interface every FantAIno model implements.
+
+The modules defining models import sklearn inside the methods that use it (usually the constructor), not at the
+top: sklearn.metrics alone takes about a second to import, which importing a model, e.g. to unpickle it and
+predict, doesn't need to pay.
+"""
+
 from abc import ABC, abstractmethod
 
+
+def accuracy(response_data, predictions) -> float:
+    """
+        sklearn's accuracy_score, imported on first use.
+    """
+    from sklearn.metrics import accuracy_score
+
+    return accuracy_score(response_data, predictions)
+
+
 class FantAInoFitter(ABC):
 
     @property
     @abstractmethod
-    def estaimtor(self):
+    def estimator(self):
         """The underlying model estimator."""
 
     @abstractmethod
-    def train(input_data, response_data):
+    def train(self, input_data, response_data):
         """Training method"""
 
     @abstractmethod
@@ -26,7 +44,11 @@ class FantAInoFitter(ABC):
         feature_set,
         omit_mode=True,
     ):
+        """
+            Feature selection method. When omit_mode is True, the features in feature_set are dropped
+            from the dataset, otherwise only the features in feature_set are kept.
+        """
 
     @abstractmethod
-    def preprocess(self):
-        """Preprcoessing steps that must occur for this model"""
\ No newline at end of file
+    def preprocess(self, dataset):
+        """Preprcoessing steps that must occur for this model"""
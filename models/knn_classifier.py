@@ -1,17 +1,19 @@
 import FantAIno
-import matplotlib.pyplot as plt
 import os
 import pandas as pd
-import seaborn as sns
 
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.metrics import accuracy_score, confusion_matrix
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import StandardScaler
 
+from utils.artifacts import save_confusion_matrix, save_predictions
+from utils.profiling import span
+
 
 root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
-melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+with span("knn_classifier.load_data"):
+    melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
 
 FantAIno_KNN_features = [
     "total_tracks",
@@ -39,36 +41,18 @@ FantAIno_KNN_X_train = scaler.fit_transform(FantAIno_KNN_X_train)
 FantAIno_KNN_X_test = scaler.transform(FantAIno_KNN_X_test)
 
 knn = KNeighborsClassifier(n_neighbors=2)
-knn.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
+with span("knn_classifier.fit"):
+    knn.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
 
 # Get the unique labels from the actual test data
 labels = sorted(FantAIno_KNN_y_test.unique())
 
-preds = knn.predict(FantAIno_KNN_X_test)
+with span("knn_classifier.predict"):
+    preds = knn.predict(FantAIno_KNN_X_test)
 acc = accuracy_score(y_true=FantAIno_KNN_y_test, y_pred=preds)
 cm = confusion_matrix(y_true=FantAIno_KNN_y_test, y_pred=preds, labels=labels)
 
 print(acc)
 
-# Create a heatmap for the confusion matrix
-sns.heatmap(cm,
-            annot=True,  # Show the numbers in each cell
-            fmt='g',     # Format the numbers as general (non-scientific)
-            xticklabels=labels,  # Set labels for the x-axis (predictions)
-            yticklabels=labels)  # Set labels for the y-axis (actuals)
-
-# Set the label for the y-axis
-plt.ylabel('Actual', fontsize=13)
-# Set the title of the plot
-plt.title('Confusion Matrix', fontsize=17, pad=20)
-# Position the x-axis label at the top
-plt.gca().xaxis.set_label_position('top')
-# Set the label for the x-axis
-plt.xlabel('Prediction', fontsize=13)
-# Move the x-axis ticks to the top
-plt.gca().xaxis.tick_top()
-
-plt.gca().figure.subplots_adjust(bottom=0.2)
-plt.gca().figure.text(0.5, 0.05, 'Prediction', ha='center', fontsize=13)
-
-plt.savefig("results/knn_classification_CM.png")
\ No newline at end of file
+save_confusion_matrix("knn_classifier", cm, labels, "results/knn_classification_CM.png")
+save_predictions("knn_classifier", FantAIno_KNN_y_test, preds)
@@ -1,18 +1,30 @@
 import FantAIno
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas as pd
-import seaborn as sns
 
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.metrics import accuracy_score, confusion_matrix
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsRegressor
+from sklearn.pipeline import Pipeline
+from scipy import sparse
 from sklearn.preprocessing import StandardScaler
 
+from utils.artifacts import save_confusion_matrix, save_predictions
+from utils.list_feature_utils import LIST_FEATURE_COLUMNS, make_list_feature_transformer
+from utils.profiling import span
+
 
 root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
-melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+with span("knn_regressor.load_data"):
+    melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+
+# hash featured_artists and track_names into sparse columns as well
+USE_LIST_FEATURES = False
+# add the lyrics richness and hashed TF-IDF features of utils/lyrics_utils.py, from the lyrics store that
+# python -m utils.lyrics_utils writes
+USE_LYRICS_FEATURES = False
+LYRICS_STORE_FILE = os.path.join(root_dir, "data", "processed", "lyrics.jsonl.gz")
 
 FantAIno_KNN_features = [
     "total_tracks",
@@ -23,7 +35,16 @@ FantAIno_KNN_features = [
     "num_features"
 ]
 FantAIno_KNN_response = melondy_and_spotify_df["rating"]
-FantAIno_KNN_df = melondy_and_spotify_df[FantAIno_KNN_features]
+if USE_LIST_FEATURES:
+    FantAIno_KNN_df = melondy_and_spotify_df[FantAIno_KNN_features + LIST_FEATURE_COLUMNS]
+    # centering would densify the hashed columns, so they are only scaled
+    scaler = Pipeline([
+        ("features", make_list_feature_transformer(FantAIno_KNN_features)),
+        ("scaler", StandardScaler(with_mean=False)),
+    ])
+else:
+    FantAIno_KNN_df = melondy_and_spotify_df[FantAIno_KNN_features]
+    scaler = StandardScaler()
 
 (
     FantAIno_KNN_X_train,
@@ -32,41 +53,39 @@ FantAIno_KNN_df = melondy_and_spotify_df[FantAIno_KNN_features]
     FantAIno_KNN_y_test
 ) = train_test_split(FantAIno_KNN_df, FantAIno_KNN_response, stratify=FantAIno_KNN_response)
 
-scaler = StandardScaler()
+train_rows = melondy_and_spotify_df.index.get_indexer(FantAIno_KNN_X_train.index)
+test_rows = melondy_and_spotify_df.index.get_indexer(FantAIno_KNN_X_test.index)
 FantAIno_KNN_X_train = scaler.fit_transform(FantAIno_KNN_X_train)
 FantAIno_KNN_X_test = scaler.transform(FantAIno_KNN_X_test)
 
+if USE_LYRICS_FEATURES:
+    from utils.lyrics_utils import compute_lyrics_features
+
+    # the IDF weights and the richness scaling are fit on the training albums only
+    lyrics_richness_df, lyrics_tfidf = compute_lyrics_features(
+        melondy_and_spotify_df, LYRICS_STORE_FILE, train_index=melondy_and_spotify_df.index[train_rows]
+    )
+    lyrics_scaler = StandardScaler()
+    FantAIno_KNN_X_train = sparse.hstack([
+        FantAIno_KNN_X_train, lyrics_scaler.fit_transform(lyrics_richness_df.iloc[train_rows]), lyrics_tfidf[train_rows]
+    ]).tocsr()
+    FantAIno_KNN_X_test = sparse.hstack([
+        FantAIno_KNN_X_test, lyrics_scaler.transform(lyrics_richness_df.iloc[test_rows]), lyrics_tfidf[test_rows]
+    ]).tocsr()
+
 knn = KNeighborsRegressor(n_neighbors=2)
-knn.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
+with span("knn_regressor.fit"):
+    knn.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
 
 # Get the unique labels from the actual test data
 labels = sorted(FantAIno_KNN_y_test.unique())
 
-preds = np.round(knn.predict(FantAIno_KNN_X_test), decimals=0)
+with span("knn_regressor.predict"):
+    preds = np.round(knn.predict(FantAIno_KNN_X_test), decimals=0)
 acc = accuracy_score(y_true=FantAIno_KNN_y_test, y_pred=preds)
 cm = confusion_matrix(y_true=FantAIno_KNN_y_test, y_pred=preds, labels=labels)
 
 print(acc)
 
-# Create a heatmap for the confusion matrix
-sns.heatmap(cm,
-            annot=True,  # Show the numbers in each cell
-            fmt='g',     # Format the numbers as general (non-scientific)
-            xticklabels=labels,  # Set labels for the x-axis (predictions)
-            yticklabels=labels)  # Set labels for the y-axis (actuals)
-
-# Set the label for the y-axis
-plt.ylabel('Actual', fontsize=13)
-# Set the title of the plot
-plt.title('Confusion Matrix', fontsize=17, pad=20)
-# Position the x-axis label at the top
-plt.gca().xaxis.set_label_position('top')
-# Set the label for the x-axis
-plt.xlabel('Prediction', fontsize=13)
-# Move the x-axis ticks to the top
-plt.gca().xaxis.tick_top()
-
-plt.gca().figure.subplots_adjust(bottom=0.2)
-plt.gca().figure.text(0.5, 0.05, 'Prediction', ha='center', fontsize=13)
-
-plt.savefig("results/knn_regression_CM.png")
\ No newline at end of file
+save_confusion_matrix("knn_regressor", cm, labels, "results/knn_regression_CM.png")
+save_predictions("knn_regressor", FantAIno_KNN_y_test, preds)
@@ -0,0 +1,77 @@
+import FantAIno
+import numpy as np
+import os
+import pandas as pd
+import time
+
+from sklearn.metrics import accuracy_score, mean_absolute_error
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+from models.catboost_regressor import FantAInoCatBoost
+from models.ordinal_logistic_regression import FantAInoOrdinalRegressor
+from models.streaming_regressor import FantAInoStreamingRegressor
+from utils.evaluation import evaluate_repeated
+from utils.profiling import span
+
+N_THREADS = os.cpu_count()
+RANDOM_STATE = 0
+N_REPEATS = 20
+
+root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+with span("model_comparison.load_data"):
+    melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+
+DROPPED_FEATURES = [
+    "artist",
+    "album",
+    "image_url",
+    "featured_artists",
+    "track_names",
+]
+
+FantAIno_response = melondy_and_spotify_df["rating"]
+FantAIno_df = melondy_and_spotify_df.drop(columns=["rating"])
+
+(
+    FantAIno_X_train,
+    FantAIno_X_test,
+    FantAIno_y_train,
+    FantAIno_y_test
+) = train_test_split(FantAIno_df, FantAIno_response, stratify=FantAIno_response, random_state=RANDOM_STATE)
+
+comparison = []
+
+# the existing random forest pipeline, as in random_forest_regressor.py
+rf_pipe = Pipeline([
+    ("rf", RandomForestRegressor(n_jobs=N_THREADS, random_state=RANDOM_STATE))
+])
+start = time.perf_counter()
+with span("model_comparison.random_forest.fit"):
+    rf_pipe.fit(X=FantAIno_X_train.drop(columns=DROPPED_FEATURES), y=FantAIno_y_train)
+train_time = time.perf_counter() - start
+rf_preds = np.clip(np.rint(rf_pipe.predict(FantAIno_X_test.drop(columns=DROPPED_FEATURES))), a_min=-1, a_max=10).astype(int)
+comparison.append({
+    "model": "random_forest",
+    "n_splits": 1,
+    "train_time_in_s": train_time,
+    "accuracy": accuracy_score(y_true=FantAIno_y_test, y_pred=rf_preds),
+    "mae": mean_absolute_error(y_true=FantAIno_y_test, y_pred=rf_preds),
+})
+
+# every fit runs on one core, the splits are spread over the cores instead
+fitters = {
+    "catboost": FantAInoCatBoost(thread_count=1, random_state=RANDOM_STATE),
+    "ordinal_logistic_regression": FantAInoOrdinalRegressor(random_state=RANDOM_STATE),
+    # the out-of-core model, trained in memory here so it's scored on the same splits
+    "streaming_ordinal": FantAInoStreamingRegressor(loss="ordinal", random_state=RANDOM_STATE),
+}
+# the fitters are scored over repeated seeded splits, with the majority class baseline
+with span("model_comparison.evaluate_repeated"):
+    repeated_summary, _ = evaluate_repeated(fitters, FantAIno_df, FantAIno_response, n_repeats=N_REPEATS, random_state=RANDOM_STATE)
+comparison.extend(repeated_summary.rename(columns={"time_in_s": "train_time_in_s"}).to_dict("records"))
+
+comparison_df = pd.DataFrame(comparison)
+print(comparison_df.to_string(index=False))
+comparison_df.to_csv("results/model_comparison.csv", index=False)
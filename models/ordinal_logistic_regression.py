@@ -0,0 +1,264 @@
+"""
+Ordinal (proportional odds) logistic regression over Fantano's -1..10 rating scale, where
+"NOT GOOD" (-1) is the lowest category. Fit with full batch gradient descent so that training
+can stop early on a validation split, or one mini-batch at a time with partial_fit.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scipy.special import expit
+from threadpoolctl import threadpool_limits
+
+from models.fantaino_base import FantAInoFitter, accuracy
+
+DROPPED_FEATURES = [
+    "artist",
+    "album",
+    "image_url",
+    "featured_artists",
+    "track_names",
+    "genre",
+]
+
+
+class FantAInoOrdinalRegressor(FantAInoFitter):
+    """
+        Proportional odds model: P(rating <= k | x) = sigmoid(theta_k - x @ w), with ordered thresholds theta.
+
+        Args:
+            alpha: L2 penalty on the feature weights.
+            learning_rate: Adam step size.
+            max_iter: the maximum number of full batch gradient steps.
+            n_iter_no_change: stop once the validation loss hasn't improved for this many steps.
+            tol: the minimum validation loss improvement that counts as an improvement.
+            validation_size: fraction of the training data held out for early stopping.
+            n_threads: number of BLAS threads used during training and prediction, None leaves it unchanged.
+            random_state: seed for the validation split.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 1e-3,
+        learning_rate: float = 0.05,
+        max_iter: int = 2000,
+        n_iter_no_change: int = 50,
+        tol: float = 1e-5,
+        validation_size: float = 0.15,
+        n_threads: int | None = None,
+        random_state: int | None = None,
+    ):
+        self.alpha = alpha
+        self.learning_rate = learning_rate
+        self.max_iter = max_iter
+        self.n_iter_no_change = n_iter_no_change
+        self.tol = tol
+        self.validation_size = validation_size
+        self.n_threads = n_threads
+        self.random_state = random_state
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.classes_ = None
+        self.coef_ = None
+        self.thresholds_ = None
+        self.n_iter_ = 0
+        # Adam state carried between partial_fit calls
+        self._parameters = None
+        self._first_moment = None
+        self._second_moment = None
+
+    @property
+    def estimator(self):
+        return self
+
+    def preprocess(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        """
+            Drops the free-text columns and casts the genre dummies to floats.
+        """
+        dataset = self.extract_features(dataset, DROPPED_FEATURES + ["rating"], omit_mode=True)
+        return dataset.astype(float)
+
+    def extract_features(self, dataset: pd.DataFrame, feature_set: list[str], omit_mode: bool = True) -> pd.DataFrame:
+        if omit_mode:
+            return dataset.drop(columns=[feature for feature in feature_set if feature in dataset.columns])
+        return dataset[feature_set]
+
+    def _unpack_thresholds(self, raw_thresholds: np.ndarray) -> np.ndarray:
+        # theta_0 is free, every following threshold adds a positive increment so the order is kept
+        return np.cumsum(np.concatenate([raw_thresholds[:1], np.exp(raw_thresholds[1:])]))
+
+    def _cumulative_probabilities(self, X: np.ndarray, coef: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+        linear_predictor = X @ coef
+        cumulative = expit(thresholds[None, :] - linear_predictor[:, None])
+        n_samples = X.shape[0]
+        return np.hstack([np.zeros((n_samples, 1)), cumulative, np.ones((n_samples, 1))])
+
+    def _loss_and_gradient(self, X: np.ndarray, y: np.ndarray, coef: np.ndarray, raw_thresholds: np.ndarray):
+        thresholds = self._unpack_thresholds(raw_thresholds)
+        cumulative = self._cumulative_probabilities(X, coef, thresholds)
+        density = cumulative * (1 - cumulative)
+        rows = np.arange(X.shape[0])
+        upper, lower = cumulative[rows, y + 1], cumulative[rows, y]
+        upper_density, lower_density = density[rows, y + 1], density[rows, y]
+        probability = np.clip(upper - lower, 1e-12, None)
+
+        n_samples = X.shape[0]
+        loss = -np.log(probability).mean() + 0.5 * self.alpha * coef @ coef
+
+        d_linear_predictor = (upper_density - lower_density) / probability
+        coef_gradient = X.T @ d_linear_predictor / n_samples + self.alpha * coef
+
+        n_thresholds = thresholds.shape[0]
+        threshold_gradient = np.zeros(n_thresholds)
+        # the upper boundary of class k is threshold k, the lower boundary is threshold k - 1
+        upper_mask, lower_mask = y < n_thresholds, y > 0
+        np.add.at(threshold_gradient, y[upper_mask], -upper_density[upper_mask] / probability[upper_mask])
+        np.add.at(threshold_gradient, y[lower_mask] - 1, lower_density[lower_mask] / probability[lower_mask])
+        threshold_gradient /= n_samples
+
+        # chain rule through the cumulative sum and the exponentiated increments
+        raw_gradient = np.cumsum(threshold_gradient[::-1])[::-1]
+        raw_gradient[1:] *= np.exp(raw_thresholds[1:])
+        return loss, coef_gradient, raw_gradient
+
+    def _validation_loss(self, X: np.ndarray, y: np.ndarray, coef: np.ndarray, raw_thresholds: np.ndarray) -> float:
+        cumulative = self._cumulative_probabilities(X, coef, self._unpack_thresholds(raw_thresholds))
+        rows = np.arange(X.shape[0])
+        return -np.log(np.clip(cumulative[rows, y + 1] - cumulative[rows, y], 1e-12, None)).mean()
+
+    def _starting_raw_thresholds(self, class_counts: np.ndarray) -> np.ndarray:
+        # start the thresholds at the logits of the cumulative class frequencies
+        empirical_cdf = np.clip(np.cumsum(class_counts)[:-1] / class_counts.sum(), 1e-3, 1 - 1e-3)
+        starting_thresholds = np.maximum.accumulate(np.log(empirical_cdf / (1 - empirical_cdf)))
+        return np.concatenate([starting_thresholds[:1], np.log(np.maximum(np.diff(starting_thresholds), 1e-3))])
+
+    def _adam_step(self, parameters, gradient, first_moment, second_moment, iteration):
+        first_moment = 0.9 * first_moment + 0.1 * gradient
+        second_moment = 0.999 * second_moment + 0.001 * gradient ** 2
+        corrected_first = first_moment / (1 - 0.9 ** iteration)
+        corrected_second = second_moment / (1 - 0.999 ** iteration)
+        parameters = parameters - self.learning_rate * corrected_first / (np.sqrt(corrected_second) + 1e-8)
+        return parameters, first_moment, second_moment
+
+    def train(self, input_data: pd.DataFrame, response_data: pd.Series):
+        """
+            Fits the model with Adam, keeping the parameters with the best validation loss.
+        """
+        from sklearn.model_selection import train_test_split
+
+        features = self.preprocess(input_data)
+        self.classes_ = np.sort(np.unique(response_data))
+        encoded_response = np.searchsorted(self.classes_, np.asarray(response_data))
+        X_train, X_val, y_train, y_val = train_test_split(
+            features.to_numpy(),
+            encoded_response,
+            test_size=self.validation_size,
+            random_state=self.random_state,
+        )
+
+        with threadpool_limits(limits=self.n_threads):
+            X_train = self.scaler.fit_transform(X_train)
+            X_val = self.scaler.transform(X_val)
+
+            n_classes = self.classes_.shape[0]
+            coef = np.zeros(X_train.shape[1])
+            raw_thresholds = self._starting_raw_thresholds(np.bincount(y_train, minlength=n_classes))
+
+            parameters = np.concatenate([coef, raw_thresholds])
+            first_moment, second_moment = np.zeros_like(parameters), np.zeros_like(parameters)
+            best_loss, best_parameters, iterations_without_improvement = np.inf, parameters.copy(), 0
+            n_features = X_train.shape[1]
+
+            for iteration in range(1, self.max_iter + 1):
+                _, coef_gradient, raw_gradient = self._loss_and_gradient(
+                    X_train, y_train, parameters[:n_features], parameters[n_features:]
+                )
+                gradient = np.concatenate([coef_gradient, raw_gradient])
+                parameters, first_moment, second_moment = self._adam_step(
+                    parameters, gradient, first_moment, second_moment, iteration
+                )
+
+                validation_loss = self._validation_loss(X_val, y_val, parameters[:n_features], parameters[n_features:])
+                if validation_loss < best_loss - self.tol:
+                    best_loss, best_parameters, iterations_without_improvement = validation_loss, parameters.copy(), 0
+                else:
+                    iterations_without_improvement += 1
+                    if iterations_without_improvement >= self.n_iter_no_change:
+                        break
+
+        self.n_iter_ = iteration
+        self.coef_ = best_parameters[:n_features]
+        self.thresholds_ = self._unpack_thresholds(best_parameters[n_features:])
+        return self
+
+    def partial_fit(self, input_data: pd.DataFrame, response_data: pd.Series, classes: np.ndarray | None = None, class_counts: np.ndarray | None = None):
+        """
+            Takes one Adam step on a mini-batch, so the model can be trained on data that doesn't fit in memory.
+            The scaler should already be fitted on the whole dataset (e.g. with scaler.partial_fit over every
+            batch), otherwise it is fitted on the first batch.
+
+            Args:
+                input_data: the mini-batch.
+                response_data: the mini-batch's ratings.
+                classes: every rating the model should know about, required on the first call.
+                class_counts: how often each of classes occurs, used to start the thresholds on the first call.
+        """
+        features = self.preprocess(input_data).to_numpy()
+        if not hasattr(self.scaler, "mean_"):
+            self.scaler.fit(features)
+        with threadpool_limits(limits=self.n_threads):
+            X = self.scaler.transform(features)
+            return self.partial_fit_scaled(X, np.asarray(response_data), classes=classes, class_counts=class_counts)
+
+    def partial_fit_scaled(self, X: np.ndarray, y: np.ndarray, classes: np.ndarray | None = None, class_counts: np.ndarray | None = None):
+        """
+            partial_fit on features that were already preprocessed and scaled with self.scaler, which saves
+            redoing the DataFrame work for every mini-batch of a chunk. Doesn't limit the BLAS threads itself,
+            since setting up the limit costs more than a small mini-batch step; callers wrap their loop instead.
+        """
+        if self._parameters is None:
+            if classes is None:
+                raise ValueError("classes must be passed to the first call of partial_fit.")
+            self.classes_ = np.sort(np.asarray(classes))
+            n_classes = self.classes_.shape[0]
+            class_counts = np.ones(n_classes) if class_counts is None else np.asarray(class_counts, dtype=float)
+            self._parameters = np.concatenate([np.zeros(X.shape[1]), self._starting_raw_thresholds(class_counts)])
+            self._first_moment, self._second_moment = np.zeros_like(self._parameters), np.zeros_like(self._parameters)
+            self.n_iter_ = 0
+
+        n_features = X.shape[1]
+        encoded_response = np.searchsorted(self.classes_, y)
+        _, coef_gradient, raw_gradient = self._loss_and_gradient(
+            X, encoded_response, self._parameters[:n_features], self._parameters[n_features:]
+        )
+        self.n_iter_ += 1
+        self._parameters, self._first_moment, self._second_moment = self._adam_step(
+            self._parameters, np.concatenate([coef_gradient, raw_gradient]), self._first_moment, self._second_moment, self.n_iter_
+        )
+        self.coef_ = self._parameters[:n_features]
+        self.thresholds_ = self._unpack_thresholds(self._parameters[n_features:])
+        return self
+
+    def loss(self, input_data: pd.DataFrame, response_data: pd.Series) -> float:
+        """
+            The mean negative log likelihood of the ratings.
+        """
+        with threadpool_limits(limits=self.n_threads):
+            X = self.scaler.transform(self.preprocess(input_data).to_numpy())
+            y = np.searchsorted(self.classes_, np.asarray(response_data))
+            cumulative = self._cumulative_probabilities(X, self.coef_, self.thresholds_)
+        rows = np.arange(X.shape[0])
+        return -np.log(np.clip(cumulative[rows, y + 1] - cumulative[rows, y], 1e-12, None)).mean()
+
+    def predict_proba(self, input_data: pd.DataFrame) -> np.ndarray:
+        with threadpool_limits(limits=self.n_threads):
+            X = self.scaler.transform(self.preprocess(input_data).to_numpy())
+            cumulative = self._cumulative_probabilities(X, self.coef_, self.thresholds_)
+        return np.diff(cumulative, axis=1)
+
+    def predict(self, input_data: pd.DataFrame) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(input_data), axis=1)]
+
+    def evaluate(self, input_data: pd.DataFrame, response_data: pd.Series, loss_fn=accuracy) -> float:
+        return loss_fn(response_data, self.predict(input_data))
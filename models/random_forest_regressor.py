@@ -1,24 +1,25 @@
 import FantAIno
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas as pd
-import seaborn as sns
 
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, mean_squared_error
+from sklearn.metrics import accuracy_score, confusion_matrix
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
+from utils.artifacts import save_confusion_matrix, save_predictions
+from utils.list_feature_utils import make_list_feature_transformer
+from utils.profiling import span
+
 
 root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
-melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+with span("random_forest_regressor.load_data"):
+    melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
 
-pipe = Pipeline([
-    # ("scaler", StandardScaler()),
-    ("rf", RandomForestRegressor())
-])
+# hash featured_artists and track_names into sparse columns instead of dropping them
+USE_LIST_FEATURES = False
 
 DROPPED_FEATURES = [
     "artist",
@@ -29,7 +30,20 @@ DROPPED_FEATURES = [
 ]
 
 FantAIno_KNN_response = melondy_and_spotify_df["rating"]
-FantAIno_KNN_df = melondy_and_spotify_df.drop(["rating"] + DROPPED_FEATURES, axis=1)
+if USE_LIST_FEATURES:
+    # the list columns (and the artist, for the collaboration graph) go through the featurizer
+    FantAIno_KNN_df = melondy_and_spotify_df.drop(columns=["rating", "album", "image_url"])
+    numeric_features = [column for column in FantAIno_KNN_df.columns if column not in DROPPED_FEATURES]
+    pipe = Pipeline([
+        ("features", make_list_feature_transformer(numeric_features)),
+        ("rf", RandomForestRegressor())
+    ])
+else:
+    FantAIno_KNN_df = melondy_and_spotify_df.drop(["rating"] + DROPPED_FEATURES, axis=1)
+    pipe = Pipeline([
+        # ("scaler", StandardScaler()),
+        ("rf", RandomForestRegressor())
+    ])
 
 (
     FantAIno_KNN_X_train,
@@ -38,37 +52,19 @@ FantAIno_KNN_df = melondy_and_spotify_df.drop(["rating"] + DROPPED_FEATURES, axi
     FantAIno_KNN_y_test
 ) = train_test_split(FantAIno_KNN_df, FantAIno_KNN_response, stratify=FantAIno_KNN_response)
 
-pipe.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
+with span("random_forest_regressor.fit"):
+    pipe.fit(X=FantAIno_KNN_X_train, y=FantAIno_KNN_y_train)
 
 # Get the unique labels from the actual test data
 labels = sorted(FantAIno_KNN_y_test.unique())
 
-raw_preds = pipe.predict(FantAIno_KNN_X_test)
+with span("random_forest_regressor.predict"):
+    raw_preds = pipe.predict(FantAIno_KNN_X_test)
 preds = np.clip(np.rint(raw_preds), a_min=-1, a_max=10).astype(int)
 acc = accuracy_score(y_true=FantAIno_KNN_y_test, y_pred=preds)
 cm = confusion_matrix(y_true=FantAIno_KNN_y_test, y_pred=preds, labels=labels)
 
 print(acc)
 
-# Create a heatmap for the confusion matrix
-sns.heatmap(cm,
-            annot=True,  # Show the numbers in each cell
-            fmt='g',     # Format the numbers as general (non-scientific)
-            xticklabels=labels,  # Set labels for the x-axis (predictions)
-            yticklabels=labels)  # Set labels for the y-axis (actuals)
-
-# Set the label for the y-axis
-plt.ylabel('Actual', fontsize=13)
-# Set the title of the plot
-plt.title('Confusion Matrix', fontsize=17, pad=20)
-# Position the x-axis label at the top
-plt.gca().xaxis.set_label_position('top')
-# Set the label for the x-axis
-plt.xlabel('Prediction', fontsize=13)
-# Move the x-axis ticks to the top
-plt.gca().xaxis.tick_top()
-
-plt.gca().figure.subplots_adjust(bottom=0.2)
-plt.gca().figure.text(0.5, 0.05, 'Prediction', ha='center', fontsize=13)
-
-plt.savefig("results/RF_regression.png")
+save_confusion_matrix("random_forest_regressor", cm, labels, "results/RF_regression.png")
+save_predictions("random_forest_regressor", FantAIno_KNN_y_test, preds)
@@ -0,0 +1,232 @@
+"""
+Stacking over FantAInoFitter models, e.g. the tabular models, the cover model (models/cover_cnn.py) and a model on
+the lyrics features. Every base model takes the whole dataset and picks its own columns in preprocess, so models
+on different inputs combine as they are.
+
+Training: every base model is trained on n_splits - 1 folds and predicts the remaining fold, so the meta model
+learns from out-of-fold outputs that look like outputs on unseen albums. The fold fits and the final fits of every
+base model are independent, and run in parallel with joblib.
+
+Inference: the base models run concurrently in threads (numpy, sklearn and torch release the GIL in their heavy
+parts), so a prediction waits for the slowest base model instead of the sum of them. Each base model's outputs
+are cached per album row in a bounded LRU cache, so albums that were predicted before don't go through the cover
+model again.
+
+Usage (from the repository root):
+    python -m models.stacked_ensemble
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from models.fantaino_base import FantAInoFitter, accuracy
+from utils.profiling import span
+
+
+def _base_outputs(fitter: FantAInoFitter, input_data: pd.DataFrame, classes: np.ndarray) -> np.ndarray:
+    """
+        The meta features of one base model: its predicted rating, then its probability of every rating in
+        classes when it has predict_proba.
+    """
+    outputs = [np.asarray(fitter.predict(input_data), dtype=float)[:, None]]
+    if hasattr(fitter, "predict_proba") and getattr(fitter, "classes_", None) is not None:
+        probabilities = np.asarray(fitter.predict_proba(input_data))
+        # a model trained on a fold may not have seen every rating
+        aligned = np.zeros((probabilities.shape[0], classes.shape[0]))
+        aligned[:, np.searchsorted(classes, fitter.classes_)] = probabilities
+        outputs.append(aligned)
+    return np.hstack(outputs)
+
+
+def _fit_base_model(fitter: FantAInoFitter, input_data: pd.DataFrame, response_data: pd.Series, train_rows: np.ndarray,
+                    test_rows: np.ndarray | None, classes: np.ndarray):
+    """
+        Trains a copy of fitter on train_rows. Returns its outputs on test_rows, or the trained copy when test_rows
+        is None.
+    """
+    fitter = copy.deepcopy(fitter)
+    fitter.train(input_data.iloc[train_rows], response_data.iloc[train_rows])
+    if test_rows is None:
+        return fitter
+    return _base_outputs(fitter, input_data.iloc[test_rows], classes)
+
+
+class FantAInoStackedEnsemble(FantAInoFitter):
+    """
+        Args:
+            base_models: name -> an untrained FantAInoFitter.
+            meta_model: the sklearn classifier trained on the base models' outputs, a multinomial logistic
+                regression on standardized outputs by default.
+            n_splits: the number of folds of the out-of-fold outputs.
+            n_jobs: the number of base model fits run in parallel, -1 for one per core.
+            cache_size: the number of album rows whose outputs are cached per base model, 0 disables the cache.
+            random_state: seed for the folds.
+    """
+
+    def __init__(
+        self,
+        base_models: dict[str, FantAInoFitter],
+        meta_model=None,
+        n_splits: int = 5,
+        n_jobs: int | None = None,
+        cache_size: int = 10_000,
+        random_state: int | None = 0,
+    ):
+        self.base_models = base_models
+        self.n_splits = n_splits
+        self.n_jobs = n_jobs
+        self.cache_size = cache_size
+        self.random_state = random_state
+        if meta_model is None:
+            from sklearn.linear_model import LogisticRegression
+            from sklearn.pipeline import make_pipeline
+            from sklearn.preprocessing import StandardScaler
+
+            meta_model = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+        self.meta_model = meta_model
+        self.classes_ = None
+        self.fitted_base_models_ = None
+        self._caches = {name: OrderedDict() for name in base_models}
+        self._cache_lock = threading.Lock()
+
+    def __getstate__(self):
+        # locks can't be pickled, e.g. to send the ensemble to an evaluation worker
+        state = self.__dict__.copy()
+        del state["_cache_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+    @property
+    def estimator(self):
+        return self.meta_model
+
+    def extract_features(self, dataset: pd.DataFrame, feature_set: list[str], omit_mode: bool = True) -> pd.DataFrame:
+        if omit_mode:
+            return dataset.drop(columns=[feature for feature in feature_set if feature in dataset.columns])
+        return dataset[feature_set]
+
+    def preprocess(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        """
+            The base models preprocess the dataset themselves.
+        """
+        return dataset
+
+    def train(self, input_data: pd.DataFrame, response_data: pd.Series):
+        """
+            Trains the base models on the folds and on all of input_data in parallel, then the meta model on the
+            out-of-fold outputs.
+        """
+        from joblib import Parallel, delayed
+        from sklearn.model_selection import StratifiedKFold
+
+        input_data, response_data = self.preprocess(input_data), pd.Series(np.asarray(response_data), index=input_data.index)
+        self.classes_ = np.sort(np.unique(response_data))
+        folds = list(StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state).split(input_data, response_data))
+        all_rows = np.arange(len(input_data))
+        # (name, fold) for the out-of-fold outputs, (name, None) for the final fit
+        tasks = [(name, fold) for name in self.base_models for fold in [*range(len(folds)), None]]
+        with span("stacked_ensemble.train_base_models"):
+            results = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_base_model)(
+                    self.base_models[name], input_data, response_data,
+                    *(folds[fold] if fold is not None else (all_rows, None)), self.classes_,
+                )
+                for name, fold in tasks
+            )
+
+        self.fitted_base_models_ = {}
+        out_of_fold = {}
+        for (name, fold), result in zip(tasks, results):
+            if fold is None:
+                self.fitted_base_models_[name] = result
+                continue
+            if name not in out_of_fold:
+                out_of_fold[name] = np.zeros((len(input_data), result.shape[1]))
+            out_of_fold[name][folds[fold][1]] = result
+
+        with span("stacked_ensemble.train_meta_model"):
+            self.meta_model.fit(np.hstack([out_of_fold[name] for name in self.base_models]), response_data.to_numpy())
+        self.clear_cache()
+        return self
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._caches = {name: OrderedDict() for name in self.base_models}
+
+    def _cached_base_outputs(self, name: str, input_data: pd.DataFrame, row_keys: np.ndarray) -> np.ndarray:
+        """
+            One base model's outputs, computing only the rows that aren't cached yet.
+        """
+        cache = self._caches[name]
+        with self._cache_lock:
+            cached = [cache.get(key) for key in row_keys]
+        missing_rows = [row for row, outputs in enumerate(cached) if outputs is None]
+        if missing_rows:
+            with span(f"stacked_ensemble.{name}.predict"):
+                computed = _base_outputs(self.fitted_base_models_[name], input_data.iloc[missing_rows], self.classes_)
+            for row, outputs in zip(missing_rows, computed):
+                cached[row] = outputs
+        with self._cache_lock:
+            for row, key in enumerate(row_keys):
+                cache[key] = cached[row]
+                cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return np.vstack(cached)
+
+    def base_outputs(self, input_data: pd.DataFrame) -> np.ndarray:
+        """
+            The meta features of input_data: every base model's outputs, side by side, computed concurrently.
+        """
+        input_data = self.preprocess(input_data)
+        # the same album always hashes to the same key, whatever its index
+        row_keys = pd.util.hash_pandas_object(input_data, index=False).to_numpy()
+        with ThreadPoolExecutor(max_workers=len(self.fitted_base_models_)) as executor:
+            futures = [executor.submit(self._cached_base_outputs, name, input_data, row_keys) for name in self.base_models]
+            return np.hstack([future.result() for future in futures])
+
+    def predict_proba(self, input_data: pd.DataFrame) -> np.ndarray:
+        return self.meta_model.predict_proba(self.base_outputs(input_data))
+
+    def predict(self, input_data: pd.DataFrame) -> np.ndarray:
+        return self.meta_model.predict(self.base_outputs(input_data))
+
+    def evaluate(self, input_data: pd.DataFrame, response_data: pd.Series, loss_fn=accuracy) -> float:
+        return loss_fn(response_data, self.predict(input_data))
+
+
+if __name__ == "__main__":
+    import FantAIno
+    import os
+
+    from sklearn.model_selection import train_test_split
+
+    from models.ordinal_logistic_regression import FantAInoOrdinalRegressor
+    from models.streaming_regressor import FantAInoStreamingRegressor
+
+    root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+    with span("stacked_ensemble.load_data"):
+        melondy_and_spotify_df = pd.read_csv(os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv")).dropna()
+    FantAIno_response = melondy_and_spotify_df["rating"]
+    FantAIno_df = melondy_and_spotify_df.drop(columns=["rating"])
+    FantAIno_X_train, FantAIno_X_test, FantAIno_y_train, FantAIno_y_test = train_test_split(
+        FantAIno_df, FantAIno_response, stratify=FantAIno_response, random_state=0
+    )
+
+    ensemble = FantAInoStackedEnsemble({
+        "ordinal_logistic_regression": FantAInoOrdinalRegressor(random_state=0),
+        "streaming_squared_error": FantAInoStreamingRegressor(loss="squared_error", random_state=0),
+    }, n_jobs=-1)
+    with span("stacked_ensemble.fit"):
+        ensemble.train(FantAIno_X_train, FantAIno_y_train)
+    for name, fitter in ensemble.fitted_base_models_.items():
+        print(f"{name}: {fitter.evaluate(FantAIno_X_test, FantAIno_y_test)}")
+    print(f"stacked_ensemble: {ensemble.evaluate(FantAIno_X_test, FantAIno_y_test)}")
@@ -0,0 +1,273 @@
+"""
+Out-of-core training over the processed dataset. The CSV is streamed chunksize rows at a time: a first pass fits
+the scaler with partial_fit and counts the ratings, then every epoch streams the chunks again and takes one
+mini-batch step per batch_size rows. Only one chunk is in memory at a time, so peak memory depends on chunksize
+and not on the number of albums.
+
+Rows are put in the train, validation or test set by a hash of their (artist, album), so the split is the same
+on every pass and every run without keeping a list of rows in memory.
+
+Usage (from the repository root):
+    python -m models.streaming_regressor --loss ordinal --chunksize 5000
+"""
+
+import argparse
+import copy
+import numpy as np
+import os
+import pandas as pd
+
+from threadpoolctl import threadpool_limits
+from typing import Callable, Iterator
+
+from models.fantaino_base import FantAInoFitter, accuracy
+from models.ordinal_logistic_regression import FantAInoOrdinalRegressor
+from utils.data_utils import iter_melondy_csv_chunks
+from utils.profiling import span
+
+DROPPED_FEATURES = [
+    "artist",
+    "album",
+    "image_url",
+    "featured_artists",
+    "track_names",
+    "genre",
+]
+# never used as features, so they aren't even parsed when streaming the CSV
+UNREAD_COLUMNS = ["image_url", "featured_artists", "track_names", "genre"]
+SPLIT_KEY = ["artist", "album"]
+_NUM_HASH_BUCKETS = 10_000
+
+
+class FantAInoStreamingRegressor(FantAInoFitter):
+    """
+        A linear model trained one chunk at a time, either the ordinal model or an SGD regressor.
+
+        Args:
+            loss: "ordinal" for the proportional odds model, or "squared_error"/"huber" for an SGDRegressor.
+            chunksize: the number of rows read from the CSV at once.
+            batch_size: the number of rows per gradient step.
+            max_epochs: the maximum number of passes over the training rows.
+            n_epochs_no_change: stop once the validation loss hasn't improved for this many epochs.
+            tol: the minimum validation loss improvement that counts as an improvement.
+            validation_size: fraction of the albums held out for early stopping.
+            test_size: fraction of the albums held out for evaluate_file, only used when training from a file.
+            alpha: L2 penalty on the feature weights.
+            learning_rate: Adam step size of the ordinal model, initial step size of the SGD regressor.
+            n_threads: number of BLAS threads used by the ordinal model, None leaves it unchanged.
+            random_state: seed for shuffling the rows within each chunk.
+    """
+
+    def __init__(
+        self,
+        loss: str = "ordinal",
+        chunksize: int = 10_000,
+        batch_size: int = 256,
+        max_epochs: int = 50,
+        n_epochs_no_change: int = 5,
+        tol: float = 1e-4,
+        validation_size: float = 0.15,
+        test_size: float = 0.2,
+        alpha: float = 1e-3,
+        learning_rate: float = 0.01,
+        n_threads: int | None = None,
+        random_state: int | None = None,
+    ):
+        if loss not in ("ordinal", "squared_error", "huber"):
+            raise ValueError(f"Unknown loss {loss}.")
+        self.loss = loss
+        self.chunksize = chunksize
+        self.batch_size = batch_size
+        self.max_epochs = max_epochs
+        self.n_epochs_no_change = n_epochs_no_change
+        self.tol = tol
+        self.validation_size = validation_size
+        self.test_size = test_size
+        self.alpha = alpha
+        self.learning_rate = learning_rate
+        self.n_threads = n_threads
+        self.random_state = random_state
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.feature_columns_ = None
+        self.classes_ = None
+        self.n_epochs_ = 0
+        self.validation_losses_ = []
+        self._model = self._new_model()
+
+    def _new_model(self):
+        if self.loss == "ordinal":
+            return FantAInoOrdinalRegressor(alpha=self.alpha, learning_rate=self.learning_rate, n_threads=self.n_threads)
+        from sklearn.linear_model import SGDRegressor
+
+        return SGDRegressor(
+            loss=self.loss, alpha=self.alpha, learning_rate="invscaling", eta0=self.learning_rate, random_state=self.random_state
+        )
+
+    @property
+    def estimator(self):
+        return self._model
+
+    def extract_features(self, dataset: pd.DataFrame, feature_set: list[str], omit_mode: bool = True) -> pd.DataFrame:
+        if omit_mode:
+            return dataset.drop(columns=[feature for feature in feature_set if feature in dataset.columns])
+        return dataset[feature_set]
+
+    def preprocess(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        """
+            Drops the free-text columns and lines the chunk up with the features seen in the first chunk.
+        """
+        features = self.extract_features(dataset, DROPPED_FEATURES + ["rating"], omit_mode=True)
+        if self.feature_columns_ is None:
+            self.feature_columns_ = list(features.columns)
+        return features.reindex(columns=self.feature_columns_, fill_value=False).astype(float)
+
+    def _split(self, chunk: pd.DataFrame, test_size: float) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        buckets = pd.util.hash_pandas_object(chunk[SPLIT_KEY], index=False).to_numpy() % _NUM_HASH_BUCKETS
+        fractions = buckets / _NUM_HASH_BUCKETS
+        is_test = fractions < test_size
+        is_validation = ~is_test & (fractions < test_size + self.validation_size)
+        return chunk[~is_test & ~is_validation], chunk[is_validation], chunk[is_test]
+
+    def _step(self, X: np.ndarray, y: np.ndarray):
+        if self.loss == "ordinal":
+            self._model.partial_fit_scaled(X, y, classes=self.classes_, class_counts=self._class_counts)
+        else:
+            self._model.partial_fit(X, y)
+
+    def _batch_loss(self, batch: pd.DataFrame) -> float:
+        if self.loss == "ordinal":
+            return self._model.loss(batch, batch["rating"])
+        predictions = self._model.predict(self.scaler.transform(self.preprocess(batch).to_numpy()))
+        return float(np.mean((predictions - batch["rating"].to_numpy()) ** 2))
+
+    def _fit(self, iter_chunks: Callable[[], Iterator[pd.DataFrame]], test_size: float):
+        """
+            Fits the scaler in one pass over the training rows, then runs the epochs with early stopping.
+        """
+        rng = np.random.default_rng(self.random_state)
+        class_counts = pd.Series(dtype=np.int64)
+        with span("streaming_regressor.scaler_pass"):
+            for chunk in iter_chunks():
+                train_chunk, _, _ = self._split(chunk, test_size)
+                if train_chunk.shape[0]:
+                    self.scaler.partial_fit(self.preprocess(train_chunk).to_numpy())
+                    class_counts = class_counts.add(train_chunk["rating"].value_counts(), fill_value=0)
+        if class_counts.empty:
+            raise ValueError("There are no training rows.")
+        self.classes_ = np.sort(class_counts.index.to_numpy())
+        self._class_counts = class_counts.loc[self.classes_].to_numpy()
+        if self.loss == "ordinal":
+            self._model.scaler = self.scaler
+
+        with threadpool_limits(limits=self.n_threads):
+            self._run_epochs(iter_chunks, test_size, rng)
+        return self
+
+    def _run_epochs(self, iter_chunks: Callable[[], Iterator[pd.DataFrame]], test_size: float, rng: np.random.Generator):
+        best_loss, best_model, epochs_without_improvement = np.inf, copy.deepcopy(self._model), 0
+        self.validation_losses_ = []
+        for epoch in range(1, self.max_epochs + 1):
+            loss_sum, num_validation_rows = 0.0, 0
+            with span("streaming_regressor.epoch"):
+                for chunk in iter_chunks():
+                    train_chunk, validation_chunk, _ = self._split(chunk, test_size)
+                    if train_chunk.shape[0]:
+                        # preprocess the chunk once, then step through it as arrays
+                        X = self.scaler.transform(self.preprocess(train_chunk).to_numpy())
+                        y = train_chunk["rating"].to_numpy()
+                        # the file may be sorted (e.g. by review date), so shuffle within the chunk
+                        order = rng.permutation(X.shape[0])
+                        for start in range(0, X.shape[0], self.batch_size):
+                            batch = order[start:start + self.batch_size]
+                            self._step(X[batch], y[batch])
+                    if validation_chunk.shape[0]:
+                        loss_sum += self._batch_loss(validation_chunk) * validation_chunk.shape[0]
+                        num_validation_rows += validation_chunk.shape[0]
+            self.n_epochs_ = epoch
+            if num_validation_rows == 0:
+                best_model = self._model
+                continue
+            validation_loss = loss_sum / num_validation_rows
+            self.validation_losses_.append(validation_loss)
+            if validation_loss < best_loss - self.tol:
+                best_loss, best_model, epochs_without_improvement = validation_loss, copy.deepcopy(self._model), 0
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= self.n_epochs_no_change:
+                    break
+        self._model = best_model
+
+    def train(self, input_data: pd.DataFrame, response_data: pd.Series):
+        """
+            Trains on an in-memory dataset, chunksize rows at a time, the same way train_file does.
+        """
+        dataset = input_data.assign(rating=np.asarray(response_data))
+
+        def iter_chunks():
+            for start in range(0, dataset.shape[0], self.chunksize):
+                yield dataset.iloc[start:start + self.chunksize]
+
+        return self._fit(iter_chunks, test_size=0.0)
+
+    def _iter_file_chunks(self, file_name: str) -> Iterator[pd.DataFrame]:
+        usecols = lambda column: column not in UNREAD_COLUMNS
+        for chunk in iter_melondy_csv_chunks(file_name, chunksize=self.chunksize, usecols=usecols):
+            yield chunk.dropna()
+
+    def train_file(self, file_name: str):
+        """
+            Trains on a processed CSV without loading it, leaving the test_size share of albums out.
+        """
+        return self._fit(lambda: self._iter_file_chunks(file_name), test_size=self.test_size)
+
+    def predict(self, input_data: pd.DataFrame) -> np.ndarray:
+        if self.loss == "ordinal":
+            return self._model.predict(input_data)
+        raw_predictions = self._model.predict(self.scaler.transform(self.preprocess(input_data).to_numpy()))
+        return np.clip(np.rint(raw_predictions), a_min=-1, a_max=10).astype(int)
+
+    def evaluate(self, input_data: pd.DataFrame, response_data: pd.Series, loss_fn=accuracy) -> float:
+        return loss_fn(response_data, self.predict(input_data))
+
+    def evaluate_file(self, file_name: str) -> dict[str, float]:
+        """
+            Accuracy and mean absolute error over the held out test albums of a processed CSV, streamed like training.
+        """
+        num_rows, num_correct, absolute_error = 0, 0, 0.0
+        for chunk in self._iter_file_chunks(file_name):
+            _, _, test_chunk = self._split(chunk, self.test_size)
+            if test_chunk.shape[0] == 0:
+                continue
+            errors = self.predict(test_chunk) - test_chunk["rating"].to_numpy()
+            num_rows += errors.shape[0]
+            num_correct += int((errors == 0).sum())
+            absolute_error += float(np.abs(errors).sum())
+        return {"num_rows": num_rows, "accuracy": num_correct / max(num_rows, 1), "mae": absolute_error / max(num_rows, 1)}
+
+
+def main(argv: list[str] | None = None):
+    import FantAIno
+
+    root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=os.path.join(root_dir, "data", "processed", "melondy_and_spotify.csv"))
+    parser.add_argument("--loss", default="ordinal", choices=["ordinal", "squared_error", "huber"])
+    parser.add_argument("--chunksize", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-epochs", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    regressor = FantAInoStreamingRegressor(
+        loss=args.loss, chunksize=args.chunksize, batch_size=args.batch_size, max_epochs=args.max_epochs, random_state=0
+    )
+    with span("streaming_regressor.fit"):
+        regressor.train_file(args.file)
+    with span("streaming_regressor.evaluate"):
+        metrics = regressor.evaluate_file(args.file)
+    print(f"Trained for {regressor.n_epochs_} epochs. Test set: {metrics}")
+
+
+if __name__ == "__main__":
+    main()
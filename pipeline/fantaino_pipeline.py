@@ -0,0 +1,241 @@
+"""
+The FantAIno data flow as pipeline stages:
+
+    crawl_aoty                                        -> data/raw/aoty_reviews.json
+    crawl_fantano_website                             -> data/raw/fantano_website_archive/ (sharded .jsonl.gz)
+      -> process_scraped_data                         -> data/processed/fantano_album_reviews.jsonl
+      -> extract_ratings                              -> data/processed/fantano_website_ratings.jsonl
+    data/processed/melondy.csv
+      -> encode_genres                                -> data/processed/melondy_w_dummy_genres.csv
+         -> spotify_enrichment                        -> data/processed/melondy_and_spotify.csv
+            -> models/*.py                            -> results/*, results/artifacts/*
+               -> render_reports                      -> results/*.png
+            -> similarity_index                       -> data/processed/similarity_index/ (updated in place)
+      -> download_images (in parallel with the above) -> data/processed/album_ImageFolder (links into
+                                                         data/processed/cover_store), data/processed/cover_leakage.csv
+
+Usage (from the repository root):
+    python -m pipeline.fantaino_pipeline                       # bring everything up to date
+    python -m pipeline.fantaino_pipeline --dry-run             # show what would run
+    python -m pipeline.fantaino_pipeline random_forest_regressor --force spotify_enrichment
+    python -m pipeline.fantaino_pipeline --full-enrichment     # re-enrich every album, not only new ones
+"""
+
+import FantAIno
+import argparse
+import asyncio
+import json
+import jsonlines
+import os
+import subprocess
+import sys
+
+from functools import partial
+
+from constants import AOTY_URL_ROOT, FANTANO_WEBSITE_URL_ROOT
+from pipeline.runner import Pipeline, Stage
+
+root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+raw_data_dir = os.path.join(root_dir, "data", "raw")
+processed_data_dir = os.path.join(root_dir, "data", "processed")
+
+AOTY_REVIEWS_FILE = os.path.join(raw_data_dir, "aoty_reviews.json")
+FANTANO_WEBSITE_ARCHIVE = os.path.join(raw_data_dir, "fantano_website_archive")
+FANTANO_ALBUM_REVIEWS_FILE = os.path.join(processed_data_dir, "fantano_album_reviews.jsonl")
+FANTANO_RATINGS_FILE = os.path.join(processed_data_dir, "fantano_website_ratings.jsonl")
+MELONDY_FILE = os.path.join(processed_data_dir, "melondy.csv")
+MELONDY_GENRES_FILE = os.path.join(processed_data_dir, "melondy_w_dummy_genres.csv")
+MELONDY_AND_SPOTIFY_FILE = os.path.join(processed_data_dir, "melondy_and_spotify.csv")
+ALBUM_IMAGE_FOLDER = os.path.join(processed_data_dir, "album_ImageFolder")
+COVER_STORE_DIR = os.path.join(processed_data_dir, "cover_store")
+COVER_LEAKAGE_FILE = os.path.join(processed_data_dir, "cover_leakage.csv")
+SIMILARITY_INDEX_DIR = os.path.join(processed_data_dir, "similarity_index")
+STATE_FILE = os.path.join(root_dir, "data", ".pipeline_state.json")
+
+GENRE_TOP_K_PCT = 1.0
+IMAGE_TEST_SIZE = 0.2
+
+# model script -> the result files it writes, its figures are rendered from its artifacts by render_reports
+MODEL_SCRIPTS = {
+    "knn_classifier_grid": ["results/knn_classification_cv_results.csv", "results/test_songs.csv",
+                            "results/artifacts/knn_classifier_grid.confusion_matrix.json"],
+    "knn_regressor_grid": ["results/knn_regression_cv_results.csv", "results/artifacts/knn_regressor_grid.confusion_matrix.json"],
+    "random_forest_regressor": ["results/artifacts/random_forest_regressor.confusion_matrix.json"],
+    "model_comparison": ["results/model_comparison.csv"],
+}
+REPORT_FIGURES = ["results/knn_classification_cv_CM.png", "results/knn_regression_cv_CM.png", "results/RF_regression.png"]
+
+
+def _package_file(*parts: str) -> str:
+    return os.path.join(package_dir, *parts)
+
+
+def crawl_aoty(requests_per_second: float | None = None):
+    from scraper.aoty_scraper import DEFAULT_REQUESTS_PER_SECOND, main
+    from scraper.crawler_config import Config
+
+    main(Config(
+        url=AOTY_URL_ROOT,
+        match="*/57-the-needle-drop/reviews/*",
+        selector=".albumBlock",
+        max_pages_to_crawl=100_000,
+        output_file_name=AOTY_REVIEWS_FILE,
+    ), requests_per_second=requests_per_second or DEFAULT_REQUESTS_PER_SECOND)
+
+
+def crawl_fantano_website():
+    import shutil
+
+    from scraper.crawler_config import Config
+    from scraper.fantano_website_scraper import main
+
+    # the archive is appended to, start from a clean one
+    if os.path.exists(FANTANO_WEBSITE_ARCHIVE):
+        shutil.rmtree(FANTANO_WEBSITE_ARCHIVE)
+    asyncio.run(main(Config(
+        url=FANTANO_WEBSITE_URL_ROOT,
+        match="*/album-reviews/*",
+        selector=".post_c_in",
+        max_pages_to_crawl=100_000,
+        output_file_name=FANTANO_WEBSITE_ARCHIVE,
+    )))
+
+
+def process_scraped_data():
+    from utils.crawl_archive import CrawlArchive
+    from utils.data_utils import process_scraped_shard
+
+    # the shards are filtered in parallel and written out in crawl order
+    with jsonlines.open(FANTANO_ALBUM_REVIEWS_FILE, "w") as writer:
+        for album_reviews in CrawlArchive(FANTANO_WEBSITE_ARCHIVE).map_shards(process_scraped_shard):
+            writer.write_all(album_reviews)
+
+
+def extract_ratings():
+    from utils.rating_utils import extract_ratings_file
+
+    counts = extract_ratings_file(FANTANO_ALBUM_REVIEWS_FILE, FANTANO_RATINGS_FILE)
+    print(f"Rating extraction: {json.dumps(counts)}")
+
+
+def encode_genres():
+    from utils.data_utils import process_melondy_genre, read_melondy_csv
+
+    melondy_df = process_melondy_genre(read_melondy_csv(MELONDY_FILE), top_K_pct=GENRE_TOP_K_PCT)
+    melondy_df.to_csv(MELONDY_GENRES_FILE, index=False)
+
+
+def spotify_enrichment(incremental: bool = True):
+    from utils.incremental_utils import update_processed_dataset
+
+    # in incremental mode only albums missing from the existing melondy_and_spotify.csv are looked up
+    if not incremental and os.path.exists(MELONDY_AND_SPOTIFY_FILE):
+        os.remove(MELONDY_AND_SPOTIFY_FILE)
+    num_enriched = update_processed_dataset(MELONDY_GENRES_FILE, MELONDY_AND_SPOTIFY_FILE)
+    print(f"Spotify enrichment: {num_enriched} albums looked up")
+
+
+def download_images():
+    from utils.cover_store import CoverStore, train_test_albums
+    from utils.data_utils import read_melondy_csv
+
+    melondy_df = read_melondy_csv(MELONDY_FILE)
+    train_df, test_df = train_test_albums(melondy_df, test_size=IMAGE_TEST_SIZE)
+    # every distinct cover is downloaded and stored once, the ImageFolder only links to it
+    cover_store = CoverStore(COVER_STORE_DIR)
+    print(cover_store.add_albums(melondy_df))
+    cover_store.materialize_image_folder(train_df, processed_data_dir, train=True)
+    cover_store.materialize_image_folder(test_df, processed_data_dir, train=False)
+    leakage_df = cover_store.leakage_report(train_df, test_df)
+    leakage_df.to_csv(COVER_LEAKAGE_FILE, index=False)
+    print(f"{leakage_df.shape[0]} train/test album pairs share (nearly) the same cover, see {COVER_LEAKAGE_FILE}.")
+
+
+def build_similarity_index():
+    from utils.similarity_index import update_similarity_index
+
+    num_albums = update_similarity_index(MELONDY_AND_SPOTIFY_FILE, SIMILARITY_INDEX_DIR)
+    print(f"{num_albums} albums in the similarity index.")
+
+
+def run_model_script(script_name: str):
+    # the model scripts are standalone scripts, so they get their own process
+    subprocess.run([sys.executable, "-m", f"models.{script_name}"], cwd=package_dir, check=True)
+
+
+def render_reports():
+    # the figure paths in the artifacts are relative to the package directory, and the pipeline process
+    # shouldn't load matplotlib either
+    subprocess.run([sys.executable, "-m", "utils.artifacts"], cwd=package_dir, check=True)
+
+
+def build_stages(incremental: bool = True, aoty_requests_per_second: float | None = None) -> list[Stage]:
+    stages = [
+        Stage(name="crawl_aoty", fn=partial(crawl_aoty, requests_per_second=aoty_requests_per_second), outputs=[AOTY_REVIEWS_FILE],
+              code=[_package_file("scraper", "aoty_scraper.py")]),
+        Stage(name="crawl_fantano_website", fn=crawl_fantano_website, outputs=[FANTANO_WEBSITE_ARCHIVE],
+              code=[_package_file("scraper", "fantano_website_scraper.py"), _package_file("utils", "crawl_archive.py")]),
+        Stage(name="process_scraped_data", fn=process_scraped_data,
+              inputs=[FANTANO_WEBSITE_ARCHIVE], outputs=[FANTANO_ALBUM_REVIEWS_FILE],
+              code=[_package_file("utils", "data_utils.py")]),
+        Stage(name="extract_ratings", fn=extract_ratings,
+              inputs=[FANTANO_ALBUM_REVIEWS_FILE], outputs=[FANTANO_RATINGS_FILE],
+              code=[_package_file("utils", "rating_utils.py")]),
+        Stage(name="encode_genres", fn=encode_genres,
+              inputs=[MELONDY_FILE], outputs=[MELONDY_GENRES_FILE],
+              code=[_package_file("utils", "data_utils.py")], params={"top_K_pct": GENRE_TOP_K_PCT}),
+        Stage(name="spotify_enrichment", fn=partial(spotify_enrichment, incremental=incremental),
+              inputs=[MELONDY_GENRES_FILE], outputs=[MELONDY_AND_SPOTIFY_FILE],
+              code=[_package_file("utils", "spotify_utils.py"), _package_file("utils", "incremental_utils.py"),
+                    _package_file("constants.py")]),
+        Stage(name="download_images", fn=download_images,
+              inputs=[MELONDY_FILE], outputs=[ALBUM_IMAGE_FOLDER, COVER_LEAKAGE_FILE],
+              code=[_package_file("utils", "cover_store.py")], params={"test_size": IMAGE_TEST_SIZE}),
+        Stage(name="similarity_index", fn=build_similarity_index,
+              inputs=[MELONDY_AND_SPOTIFY_FILE], outputs=[SIMILARITY_INDEX_DIR],
+              code=[_package_file("utils", "similarity_index.py")]),
+    ]
+    for script_name, result_files in MODEL_SCRIPTS.items():
+        stages.append(Stage(
+            name=script_name,
+            fn=partial(run_model_script, script_name),
+            inputs=[MELONDY_AND_SPOTIFY_FILE],
+            outputs=[_package_file(result_file) for result_file in result_files],
+            code=[_package_file("models", f"{script_name}.py")],
+        ))
+    artifact_files = [result_file for result_files in MODEL_SCRIPTS.values() for result_file in result_files if result_file.startswith("results/artifacts/")]
+    stages.append(Stage(
+        name="render_reports", fn=render_reports,
+        inputs=[_package_file(artifact_file) for artifact_file in artifact_files],
+        outputs=[_package_file(figure_file) for figure_file in REPORT_FIGURES],
+        code=[_package_file("utils", "artifacts.py")],
+    ))
+    return stages
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", help="stages to bring up to date, defaults to all of them")
+    parser.add_argument("--force", nargs="+", default=[], help="stages to re-run even if nothing changed")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--full-enrichment", action="store_true",
+                        help="look every album up on Spotify again instead of only the newly reviewed ones")
+    parser.add_argument("--aoty-requests-per-second", type=float, default=None,
+                        help="the request rate of the AOTY crawl, scraper.aoty_scraper.DEFAULT_REQUESTS_PER_SECOND by default")
+    args = parser.parse_args(argv)
+
+    # the crawlers have no inputs to fingerprint, so once their output exists they only re-run
+    # when forced or when their code changes
+    targets = args.targets or None
+    stages = build_stages(incremental=not args.full_enrichment, aoty_requests_per_second=args.aoty_requests_per_second)
+    pipeline = Pipeline(stages, state_file_name=STATE_FILE, max_workers=args.max_workers)
+    statuses = pipeline.run(targets=targets, force=args.force, dry_run=args.dry_run)
+    for name, status in statuses.items():
+        print(f"{name}: {status}")
+    return int(any(status in ("failed", "not run") for status in statuses.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+A small incremental DAG runner. Stages declare the files they read and write. The runner orders them by
+those files, fingerprints each stage's inputs and code, and only re-runs a stage when its fingerprint
+changed since the last successful run or one of its outputs is missing. Stages that don't depend on each
+other run concurrently.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pydantic import BaseModel, Field
+from typing import Any, Callable
+
+from utils.profiling import span
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class Stage(BaseModel):
+    """
+        name: str, unique name of the stage
+        fn: Callable[[], None], does the stage's work, reading its inputs and writing its outputs
+        inputs: list[str], files or directories the stage reads
+        outputs: list[str], files or directories the stage writes
+        code: list[str], extra source files the stage's behavior depends on (fn's own module is always included)
+        params: dict[str, Any], settings that should trigger a re-run when they change
+        always_run: bool, whether the stage has no fingerprintable inputs (e.g. crawling a website) and should run every time
+    """
+    name: str
+    fn: Callable[[], None]
+    inputs: list[str] = Field(default_factory=list)
+    outputs: list[str] = Field(default_factory=list)
+    code: list[str] = Field(default_factory=list)
+    params: dict[str, Any] = Field(default_factory=dict)
+    always_run: bool = False
+
+
+class FileHasher:
+    """
+        Content hashes of files and directories. A file's hash is reused while its size and mtime are
+        unchanged, so large unchanged inputs (e.g. the album image folder) aren't re-read on every run.
+    """
+
+    def __init__(self, known_hashes: dict[str, list] | None = None):
+        self.known_hashes = known_hashes or {}
+        self.lock = threading.Lock()
+
+    def _hash_file(self, file_name: str) -> str:
+        stat = os.stat(file_name)
+        with self.lock:
+            known = self.known_hashes.get(file_name)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        file_hash = digest.hexdigest()
+        with self.lock:
+            self.known_hashes[file_name] = [stat.st_size, stat.st_mtime_ns, file_hash]
+        return file_hash
+
+    def hash_path(self, path: str) -> str | None:
+        """
+            Hashes a file, or every file under a directory with its relative path. None if path doesn't exist.
+        """
+        if os.path.isfile(path):
+            return self._hash_file(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for directory, subdirectories, file_names in os.walk(path):
+            subdirectories.sort()
+            for file_name in sorted(file_names):
+                full_path = os.path.join(directory, file_name)
+                digest.update(os.path.relpath(full_path, path).encode("utf-8"))
+                digest.update(self._hash_file(full_path).encode("ascii"))
+        return digest.hexdigest()
+
+
+class Pipeline:
+    """
+        Runs a set of stages in dependency order, skipping the ones whose fingerprint is unchanged.
+
+        Args:
+            stages: the stages, in any order. A stage depends on every stage that outputs one of its inputs.
+            state_file_name: JSON file where fingerprints of successful runs are kept between runs.
+            max_workers: the maximum number of stages running at once.
+    """
+
+    def __init__(self, stages: list[Stage], state_file_name: str, max_workers: int = 4):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique.")
+        self.state_file_name = state_file_name
+        self.max_workers = max_workers
+        self.dependencies = self._resolve_dependencies()
+        self.state = self._load_state()
+        self.hasher = FileHasher(self.state.get("file_hashes"))
+        self.state_lock = threading.Lock()
+
+    def _resolve_dependencies(self) -> dict[str, set[str]]:
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is written by both {producers[output]} and {stage.name}.")
+                producers[output] = stage.name
+        dependencies = {
+            stage.name: {producers[path] for path in stage.inputs if path in producers}
+            for stage in self.stages.values()
+        }
+        # detect cycles with a depth first search
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"The pipeline has a cycle through {name}.")
+            visiting.add(name)
+            for dependency in dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in dependencies:
+            visit(name)
+        return dependencies
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_file_name):
+            return {"stages": {}, "file_hashes": {}}
+        with open(self.state_file_name, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        with self.state_lock:
+            self.state["file_hashes"] = self.hasher.known_hashes
+            os.makedirs(os.path.dirname(self.state_file_name) or ".", exist_ok=True)
+            temporary_file_name = f"{self.state_file_name}.tmp"
+            with open(temporary_file_name, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(temporary_file_name, self.state_file_name)
+
+    def fingerprint(self, stage: Stage) -> str:
+        """
+            Hash of the stage's code, params and current input contents.
+        """
+        digest = hashlib.sha256()
+        fn = stage.fn
+        while isinstance(fn, functools.partial):
+            digest.update(f"partial:{fn.args!r}:{sorted(fn.keywords.items())!r}\n".encode("utf-8"))
+            fn = fn.func
+        code_files = [inspect.getsourcefile(fn)] + stage.code
+        for code_file in code_files:
+            digest.update(f"code:{code_file}:{self.hasher.hash_path(code_file)}\n".encode("utf-8"))
+        digest.update(f"params:{json.dumps(stage.params, sort_keys=True, default=str)}\n".encode("utf-8"))
+        for path in stage.inputs:
+            digest.update(f"input:{path}:{self.hasher.hash_path(path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage: Stage) -> bool:
+        if stage.always_run:
+            return False
+        previous = self.state["stages"].get(stage.name)
+        if previous is None or not all(os.path.exists(output) for output in stage.outputs):
+            return False
+        return previous["fingerprint"] == self.fingerprint(stage)
+
+    def _selected_stages(self, targets: list[str] | None) -> set[str]:
+        if not targets:
+            return set(self.stages)
+        selected = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage {name}.")
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.dependencies[name])
+        return selected
+
+    def _run_stage(self, stage: Stage, force: bool) -> str:
+        if not force and self.is_up_to_date(stage):
+            return "skipped"
+        with span(f"pipeline.{stage.name}"):
+            stage.fn()
+        # fingerprint after the run, so an input the stage itself touched doesn't cause a re-run next time
+        fingerprint = self.fingerprint(stage)
+        with self.state_lock:
+            self.state["stages"][stage.name] = {"fingerprint": fingerprint}
+        self._save_state()
+        return "ran"
+
+    def run(self, targets: list[str] | None = None, force: list[str] | None = None, dry_run: bool = False) -> dict[str, str]:
+        """
+            Runs the target stages (all stages if None) and whatever they depend on.
+
+            Args:
+                targets: names of the stages to bring up to date.
+                force: names of stages to re-run even if their fingerprint is unchanged.
+                dry_run: only report which stages would run.
+
+            Returns:
+                stage name -> "ran", "skipped", "would run", "failed" or "not run" (when an upstream stage failed).
+        """
+        selected = self._selected_stages(targets)
+        force = set(force or [])
+        statuses: dict[str, str] = {}
+
+        if dry_run:
+            for name in self._topological_order(selected):
+                stage = self.stages[name]
+                upstream_runs = any(statuses.get(dependency) == "would run" for dependency in self.dependencies[name])
+                stale = name in force or upstream_runs or not self.is_up_to_date(stage)
+                statuses[name] = "would run" if stale else "skipped"
+            return statuses
+
+        remaining = {name: self.dependencies[name] & selected for name in selected}
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for name in [name for name, dependencies in remaining.items() if not dependencies - set(statuses)]:
+                    del remaining[name]
+                    if any(statuses[dependency] in ("failed", "not run") for dependency in self.dependencies[name] & selected):
+                        statuses[name] = "not run"
+                        continue
+                    print(f"Pipeline: starting {name}")
+                    running[executor.submit(self._run_stage, self.stages[name], name in force)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        statuses[name] = future.result()
+                    except Exception as e:
+                        print(f"Pipeline: {name} failed: {e}")
+                        statuses[name] = "failed"
+                    print(f"Pipeline: {name} {statuses[name]}")
+        return statuses
+
+    def _topological_order(self, selected: set[str]) -> list[str]:
+        order, visited = [], set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            visited.add(name)
+            for dependency in sorted(self.dependencies[name] & selected):
+                visit(dependency)
+            order.append(name)
+
+        for name in sorted(selected):
+            visit(name)
+        return order
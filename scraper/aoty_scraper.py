@@ -1,19 +1,44 @@
-import FantAIno
+"""
+Crawls Fantano's (The Needle Drop's) reviews on albumoftheyear.org.
+
+The review index is paginated as /publication/57-the-needle-drop/reviews/<n>/, so by default the crawler reads
+the last page number off the first index page and fetches every index page concurrently, instead of
+discovering the pages one link hop at a time (crawl, kept for other sites' layouts). Each page's .albumBlock
+entries are read in one streaming pass, without building a tree of the whole page. Requests to the live site are
+rate limited, DEFAULT_REQUESTS_PER_SECOND across all workers unless --requests-per-second says otherwise.
+
+Usage (from the repository root):
+    python -m scraper.aoty_scraper                              # paginated
+    python -m scraper.aoty_scraper --requests-per-second 4      # paginated, faster
+    python -m scraper.aoty_scraper --bfs                        # breadth-first link following
+"""
+import argparse
 import asyncio
 import json
 import jsonlines
-import fnmatch
+import re
+import threading
 from scraper.crawler_config import Config
+from scraper.page_parser import extract_page
+from utils.profiling import span
+from utils.rate_limiter import RateLimiter
+from utils.text_normalization import normalize_text
 import sys
 import os
 import requests
-from urllib.parse import urljoin
 from collections import deque
-
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 
 from constants import AOTY_URL_ROOT
 
+# the page number at the end of an index page URL, e.g. .../57-the-needle-drop/reviews/12/
+_INDEX_PAGE_NUMBER = re.compile(r"/57-the-needle-drop/reviews/(\d+)/?$")
+_INDEX_PAGE_HREF = re.compile(r"""href=["'][^"']*/57-the-needle-drop/reviews/(\d+)/?["']""")
+# a paginated crawl of albumoftheyear.org shouldn't hit it much harder than the old sequential crawl did
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+
 def crawl(config: Config):
     visited_pages = set()
     results = []
@@ -37,22 +62,17 @@ def crawl(config: Config):
             if url in visited_pages or not url.startswith("https://www.albumoftheyear.org/publication/57-the-needle-drop"):
                 continue
             print(f"Crawler: Crawling {url}")
-            response = session.get(url)
+            with span("fetch"):
+                response = session.get(url)
             print(response)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            if url != AOTY_URL_ROOT and "57-the-needle-drop/reviews" in url:
-                html = soup.select_one(config.selector).get_text() if soup.select_one(config.selector) else ""
+            with span("parse"):
+                html, hrefs = extract_page(response.text, config, capture_text=url != AOTY_URL_ROOT and "57-the-needle-drop/reviews" in url)
+            if html is not None:
                 results.append({'url': url, 'html': html})
 
             # Extract and enqueue links
-            links = soup.find_all("a")
-            for link in links:
-                href = link.get("href")
-                # ensure we only enqueue links that match the pattern in config.match
-                if href and fnmatch.fnmatch(href, config.match):
-                    new_url = urljoin(response.url, href)
-                    queue.append(href)
+            queue.extend(hrefs)
 
             # except Exception as e: # Catch any general exception and store it in 'e'
             #     print(f"Crawler: An error occurred: {e}") # Print the error message
@@ -61,17 +81,164 @@ def crawl(config: Config):
     return results
 
 
-def main(config: Config):
+def index_page_url(first_page_url: str, page_number: int) -> str:
+    return _INDEX_PAGE_NUMBER.sub(f"/57-the-needle-drop/reviews/{page_number}/", first_page_url)
+
+
+def find_last_page(page_html: str) -> int:
+    """
+        The highest page number linked from an index page's pagination, 1 if it links to no other page.
+    """
+    return max((int(page_number) for page_number in _INDEX_PAGE_HREF.findall(page_html)), default=1)
+
+
+class _AlbumBlockParser(HTMLParser):
+    """
+        Streams through an index page and only keeps what's inside <div class="albumBlock"> elements: the
+        artistTitle, albumTitle and rating texts, the first link and the cover image of each block.
+    """
+
+    _FIELDS = {"artistTitle": "artist", "albumTitle": "album", "rating": "rating"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.albums = []
+        self.block_texts = []
+        # the number of divs open inside the current album block, 0 outside of one
+        self._block_depth = 0
+        # the field being read and the div depth it started at
+        self._field = None
+        self._field_depth = 0
+        self._field_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._block_depth == 0:
+            if tag == "div" and "albumBlock" in (dict(attrs).get("class") or "").split():
+                self._block_depth = 1
+                self.albums.append({"artist": None, "album": None, "rating": None, "album_url": None, "image_url": None})
+                self.block_texts.append([])
+            return
+        attributes = dict(attrs)
+        album = self.albums[-1]
+        if tag == "div":
+            self._block_depth += 1
+            if self._field is None:
+                for class_name in (attributes.get("class") or "").split():
+                    if class_name in self._FIELDS:
+                        self._field, self._field_depth, self._field_text = self._FIELDS[class_name], self._block_depth, []
+                        break
+        elif tag == "a" and album["album_url"] is None and attributes.get("href"):
+            album["album_url"] = attributes["href"]
+        elif tag == "img" and album["image_url"] is None:
+            album["image_url"] = attributes.get("data-src") or attributes.get("src")
+
+    def handle_endtag(self, tag):
+        if self._block_depth == 0 or tag != "div":
+            return
+        if self._field is not None and self._block_depth == self._field_depth:
+            # NFKC folded, so full-width or decomposed names match the melondy and Spotify names
+            self.albums[-1][self._field] = normalize_text("".join(self._field_text))
+            self._field = None
+        self._block_depth -= 1
+
+    def handle_data(self, data):
+        if self._block_depth:
+            self.block_texts[-1].append(data)
+            if self._field is not None:
+                self._field_text.append(data)
+
+
+def parse_album_blocks(page_html: str) -> tuple[str, list[dict[str, str | None]]]:
+    """
+        Parses an index page's .albumBlock entries in one streaming pass, without building a tree of the page.
+
+        Returns:
+            The text of the first album block, what crawl records as a page's "html" with the .albumBlock
+            selector, and the artist, album, rating, album page and cover URL of every album block.
+    """
+    parser = _AlbumBlockParser()
+    parser.feed(page_html)
+    parser.close()
+    return ("".join(parser.block_texts[0]) if parser.block_texts else ""), parser.albums
+
+
+def crawl_paginated(
+    config: Config, max_workers: int = DEFAULT_MAX_WORKERS, requests_per_second: float | None = DEFAULT_REQUESTS_PER_SECOND
+) -> list[dict]:
+    """
+        Fetches the first index page, reads the last page number off its pagination and fetches every other
+        index page concurrently.
+
+        Args:
+            config: the crawler config. config.url must be an index page URL ending in /reviews/<n>/, and at
+                most config.max_pages_to_crawl pages are fetched.
+            max_workers: the number of pages fetched at once.
+            requests_per_second: the maximum request rate across all workers, unlimited if None (only for a local
+                fixture server).
+
+        Returns:
+            One {"url", "html", "albums"} record per page, in page order, with "html" being the text of the
+            page's first album block, as crawl records it, and "albums" the parsed album blocks.
+    """
+    page_number_match = _INDEX_PAGE_NUMBER.search(config.url)
+    if page_number_match is None:
+        raise ValueError(f"{config.url} is not a paginated review index URL.")
+    local = threading.local()
+    rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+
+    def fetch_page(url: str) -> tuple[dict, str]:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            # ensures cookie name and value are set if login is required for scraping
+            if config.cookie:
+                local.session.cookies.set(config.cookie['name'], config.cookie['value'], domain=config.url)
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        with span("fetch"):
+            response = local.session.get(url, timeout=30)
+        response.raise_for_status()
+        with span("parse"):
+            html, albums = parse_album_blocks(response.text)
+        return {"url": url, "html": html, "albums": albums}, response.text
+
+    first_page, first_page_html = fetch_page(config.url)
+    first_page_number = int(page_number_match.group(1))
+    last_page = min(find_last_page(first_page_html), first_page_number + config.max_pages_to_crawl - 1)
+    print(f"Crawler: Fetching index pages {first_page_number} to {last_page}")
+    urls = [index_page_url(config.url, page_number) for page_number in range(first_page_number + 1, last_page + 1)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages = [page for page, _ in executor.map(fetch_page, urls)]
+    return [first_page] + pages
+
+
+def main(
+    config: Config,
+    paginated: bool = True,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    requests_per_second: float | None = DEFAULT_REQUESTS_PER_SECOND,
+):
 
     output_dir = os.path.dirname(config.output_file_name)
     os.makedirs(output_dir, exist_ok=True)
     
-    results = crawl(config)
+    with span("aoty_scraper.crawl"):
+        if paginated:
+            results = crawl_paginated(config, max_workers=max_workers, requests_per_second=requests_per_second)
+        else:
+            results = crawl(config)
     with open(config.output_file_name, 'w') as f:
         json.dump(results, f, indent=2)
 
 
 if __name__ == "__main__":
+    import FantAIno
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bfs", action="store_true", help="discover the index pages by following links")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--requests-per-second", type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help="the maximum request rate of the paginated crawl, across all workers")
+    args = parser.parse_args()
 
     root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
     current_crawler_config = Config(
@@ -81,5 +248,5 @@ if __name__ == "__main__":
         max_pages_to_crawl=100_000,
         output_file_name=os.path.join(root_dir, "data", "raw", "aoty_reviews.json")
     )
-    main(current_crawler_config)
+    main(current_crawler_config, paginated=not args.bfs, max_workers=args.max_workers, requests_per_second=args.requests_per_second)
 
@@ -11,6 +11,12 @@ class Config(BaseModel):
         output_file_name: str, name of the file to save output to
         cookie: dict[str, str] | None = None, the necessary cookies needed to access pages to crawl
         on_visit_page: Callable[[str], None] | None = None
+        num_workers: int = 1, the number of worker processes of a distributed crawl (scraper/distributed_crawl.py)
+        frontier_file_name: str | None = None, the distributed crawl's SQLite frontier, next to the output if None
+        frontier_on_shared_disk: bool = False, whether the frontier is on a network filesystem shared by several
+            machines, where SQLite's WAL mode doesn't work
+        requests_per_second_per_host: float | None = None, the request rate per host across all workers,
+            unlimited if None
     """
     url: str
     match: str
@@ -19,3 +25,7 @@ class Config(BaseModel):
     output_file_name: str
     cookie: dict[str, str] | None = None
     on_visit_page: Callable[[str], None] | None = None
+    num_workers: int = 1
+    frontier_file_name: str | None = None
+    frontier_on_shared_disk: bool = False
+    requests_per_second_per_host: float | None = None
@@ -0,0 +1,365 @@
+"""
+Coordinator/worker crawl mode. The frontier (every discovered URL and whether it's pending, being fetched or
+done) lives in one SQLite file that all workers share, so the same Config crawls as one process
+(num_workers=1) or as num_workers processes, on this machine or on several. With workers on several machines, the
+frontier has to be on a shared disk whose file locking works, and config.frontier_on_shared_disk (--shared-disk)
+set: SQLite's WAL mode doesn't work over a network filesystem, so the frontier uses a rollback journal instead.
+
+    URLs are hash partitioned: worker i only fetches the URLs whose hash is i modulo num_workers, and links
+    discovered by any worker are added to the frontier, deduplicated by the URL primary key.
+    Per-host politeness is global: every request reserves the host's next free slot in the frontier, so
+    requests_per_second_per_host holds across all workers combined.
+    Each worker streams its pages to its own crawl archive (utils/crawl_archive.py). The coordinator merges
+    them into config.output_file_name once every worker is done, and only if every worker succeeded.
+    Only the coordinator puts the URLs an interrupted crawl was fetching back to pending, before it starts its
+    workers. Workers started on their own (--worker) leave them alone, since other workers may be fetching them:
+    after an interrupted crawl with such workers, run --reset once before starting them again.
+
+A page is captured (its config.selector text archived) when its URL matches config.match, and links are only
+followed on config.url's host.
+
+Usage (from the repository root):
+    python -m scraper.distributed_crawl fantano --num-workers 8                 # coordinator with 8 local workers
+    python -m scraper.distributed_crawl fantano --num-workers 8 --worker 3 \
+        --frontier /mnt/crawl/frontier.sqlite --shared-disk                     # one worker on another node
+    python -m scraper.distributed_crawl fantano --num-workers 8 --reset         # after an interrupted crawl
+    python -m scraper.distributed_crawl fantano --num-workers 8 --merge         # merge the workers' archives
+"""
+
+import argparse
+import fnmatch
+import multiprocessing
+import multiprocessing.connection
+import os
+import requests
+import shutil
+import sqlite3
+import time
+import zlib
+
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from scraper.crawler_config import Config
+from scraper.page_parser import extract_page
+from utils.crawl_archive import CrawlArchive, CrawlArchiveWriter
+from utils.profiling import span
+
+PENDING, IN_PROGRESS, DONE, FAILED = range(4)
+_CLAIM_BATCH_SIZE = 8
+_IDLE_WAIT_IN_S = 0.05
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    url_hash INTEGER NOT NULL,
+    partition INTEGER NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    captured INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS frontier_by_partition ON frontier (partition, state);
+CREATE INDEX IF NOT EXISTS frontier_by_state ON frontier (state);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    next_request_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def url_hash(url: str) -> int:
+    # stable across processes and machines, unlike hash()
+    return zlib.crc32(url.encode("utf-8"))
+
+
+class Frontier:
+    """
+        The shared crawl frontier in a SQLite file. Every method is one short transaction, so any number of
+        worker processes can use the same file.
+
+        Args:
+            file_name: the SQLite file.
+            num_workers: the number of partitions.
+            shared_disk: whether the file is on a network filesystem, where a rollback journal is used instead of WAL.
+    """
+
+    def __init__(self, file_name: str, num_workers: int, shared_disk: bool = False):
+        self.file_name = file_name
+        self.num_workers = num_workers
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        # autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(file_name, timeout=60, isolation_level=None)
+        self.connection.execute(f"PRAGMA journal_mode={'DELETE' if shared_disk else 'WAL'}")
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if shared_disk else 'NORMAL'}")
+        self.connection.executescript(_SCHEMA)
+
+    def _transaction(self):
+        connection = self.connection
+
+        class Transaction:
+            def __enter__(self):
+                connection.execute("BEGIN IMMEDIATE")
+                return connection
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+                return False
+        return Transaction()
+
+    def initialize(self, seed_urls: list[str], repartition: bool = True):
+        """
+            Adds the seed URLs, and repartitions the frontier if num_workers changed. With repartition=False (a
+            worker joining a running crawl), a frontier partitioned for another number of workers is an error.
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'num_workers'").fetchone()
+            if row is not None and int(row[0]) != self.num_workers and not repartition:
+                raise ValueError(f"The frontier {self.file_name} is partitioned for {row[0]} workers, not {self.num_workers}.")
+            if row is None or int(row[0]) != self.num_workers:
+                connection.execute("UPDATE frontier SET partition = url_hash % ?", (self.num_workers,))
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('num_workers', ?)", (str(self.num_workers),))
+            self._add(connection, seed_urls)
+
+    def reset_in_progress(self) -> int:
+        """
+            Puts the URLs an interrupted crawl was fetching back to pending. Only call this while no worker is
+            running, or their URLs get fetched twice. Returns the number of URLs reset.
+        """
+        with self._transaction() as connection:
+            return connection.execute("UPDATE frontier SET state = ? WHERE state = ?", (PENDING, IN_PROGRESS)).rowcount
+
+    def _add(self, connection: sqlite3.Connection, urls: list[str]):
+        connection.executemany(
+            "INSERT OR IGNORE INTO frontier (url, url_hash, partition) VALUES (?, ?, ?)",
+            [(url, url_hash(url), url_hash(url) % self.num_workers) for url in urls],
+        )
+
+    def claim(self, worker_index: int, batch_size: int = _CLAIM_BATCH_SIZE) -> list[str]:
+        """
+            Marks up to batch_size pending URLs of the worker's partition as being fetched and returns them.
+        """
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "UPDATE frontier SET state = ? WHERE url IN "
+                "(SELECT url FROM frontier WHERE partition = ? AND state = ? LIMIT ?) RETURNING url",
+                (IN_PROGRESS, worker_index, PENDING, batch_size),
+            ).fetchall()
+        return [url for (url,) in rows]
+
+    def complete(self, url: str, discovered_urls: list[str], captured: bool):
+        """
+            Adds the links found on url and marks it done, in one transaction, so a URL is never done before the
+            URLs it led to are in the frontier.
+        """
+        with self._transaction() as connection:
+            self._add(connection, discovered_urls)
+            connection.execute("UPDATE frontier SET state = ?, captured = ? WHERE url = ?", (DONE, int(captured), url))
+
+    def fail(self, url: str):
+        with self._transaction() as connection:
+            connection.execute("UPDATE frontier SET state = ? WHERE url = ?", (FAILED, url))
+
+    def reserve_request_slot(self, host: str, requests_per_second: float) -> float:
+        """
+            Reserves the host's next request slot across all workers. Returns the time.time() to send it at.
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT next_request_at FROM hosts WHERE host = ?", (host,)).fetchone()
+            request_at = max(time.time(), row[0] if row else 0.0)
+            connection.execute(
+                "INSERT OR REPLACE INTO hosts (host, next_request_at) VALUES (?, ?)", (host, request_at + 1 / requests_per_second)
+            )
+        return request_at
+
+    def is_exhausted(self) -> bool:
+        """
+            Whether no URL is pending or being fetched, i.e. no worker can discover more.
+        """
+        row = self.connection.execute("SELECT 1 FROM frontier WHERE state IN (?, ?) LIMIT 1", (PENDING, IN_PROGRESS)).fetchone()
+        return row is None
+
+    def num_captured(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM frontier WHERE captured = 1").fetchone()[0]
+
+    def counts(self) -> dict[str, int]:
+        names = {PENDING: "pending", IN_PROGRESS: "in_progress", DONE: "done", FAILED: "failed"}
+        counts = {name: 0 for name in names.values()}
+        for state, count in self.connection.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"):
+            counts[names[state]] = count
+        counts["captured"] = self.num_captured()
+        return counts
+
+    def close(self):
+        self.connection.close()
+
+
+def frontier_file_name(config: Config) -> str:
+    return config.frontier_file_name or f"{config.output_file_name.rstrip(os.sep)}.frontier.sqlite"
+
+
+def worker_archive_dir(config: Config, worker_index: int) -> str:
+    return os.path.join(f"{config.output_file_name.rstrip(os.sep)}.workers", f"worker-{worker_index:03d}")
+
+
+def _normalize_url(href: str, page_url: str) -> str:
+    # relative links resolve against the page they're on, #fragments point into the same page
+    return urldefrag(urljoin(page_url, href))[0]
+
+
+def run_worker(config: Config, worker_index: int):
+    """
+        Fetches the worker's partition of the frontier until the whole frontier is exhausted or
+        config.max_pages_to_crawl pages are captured (checked per claimed batch, so every worker may capture up to
+        _CLAIM_BATCH_SIZE more). Returns the number of pages this worker captured.
+    """
+    frontier = Frontier(frontier_file_name(config), config.num_workers, shared_disk=config.frontier_on_shared_disk)
+    crawl_host = urlsplit(config.url).netloc
+    num_captured = 0
+    with requests.Session() as session, CrawlArchiveWriter(worker_archive_dir(config, worker_index)) as writer:
+        # ensures cookie name and value are set if login is required for scraping
+        if config.cookie:
+            session.cookies.set(config.cookie['name'], config.cookie['value'], domain=config.url)
+
+        while frontier.num_captured() < config.max_pages_to_crawl:
+            urls = frontier.claim(worker_index)
+            if not urls:
+                # other workers may still add URLs of this partition
+                if frontier.is_exhausted():
+                    break
+                time.sleep(_IDLE_WAIT_IN_S)
+                continue
+            for url in urls:
+                host = urlsplit(url).netloc
+                if config.requests_per_second_per_host:
+                    time.sleep(max(0.0, frontier.reserve_request_slot(host, config.requests_per_second_per_host) - time.time()))
+                try:
+                    with span("fetch"):
+                        response = session.get(url, timeout=30)
+                    response.raise_for_status()
+                    captured = url != config.url and fnmatch.fnmatch(url, config.match)
+                    with span("parse"):
+                        html, hrefs = extract_page(response.text, config, capture_text=captured)
+                except Exception as e:
+                    print(f"Crawler: An error occurred on {url}: {e}")
+                    frontier.fail(url)
+                    continue
+                if captured:
+                    writer.write({'url': url, 'html': html})
+                    num_captured += 1
+                if config.on_visit_page is not None:
+                    config.on_visit_page(url)
+                links = [_normalize_url(href, url) for href in hrefs]
+                frontier.complete(url, [link for link in links if urlsplit(link).netloc == crawl_host], captured)
+    frontier.close()
+    return num_captured
+
+
+def merge_worker_archives(config: Config) -> int:
+    """
+        Streams every worker's archive into config.output_file_name and removes the worker archives. Returns the
+        number of records in the merged archive.
+    """
+    workers_dir = os.path.dirname(worker_archive_dir(config, 0))
+    worker_dirs = sorted(os.path.join(workers_dir, name) for name in os.listdir(workers_dir)) if os.path.isdir(workers_dir) else []
+    with span("distributed_crawl.merge"), CrawlArchiveWriter(config.output_file_name) as writer:
+        for worker_dir in worker_dirs:
+            archive = CrawlArchive(worker_dir)
+            for record in archive.iter_records():
+                writer.write(record)
+            archive.close()
+    shutil.rmtree(workers_dir, ignore_errors=True)
+    merged_archive = CrawlArchive(config.output_file_name)
+    num_records = len(merged_archive)
+    merged_archive.close()
+    return num_records
+
+
+def crawl_distributed(config: Config) -> int:
+    """
+        Crawls with config.num_workers local worker processes (in this process if it's 1) and merges their
+        archives. An interrupted crawl resumes from its frontier. Returns the number of archived pages.
+
+        Raises:
+            RuntimeError: if a worker process failed. The other workers are stopped and the archives are left
+                unmerged. Re-running resumes the crawl.
+    """
+    frontier = Frontier(frontier_file_name(config), config.num_workers, shared_disk=config.frontier_on_shared_disk)
+    frontier.initialize([config.url])
+    # no worker is running yet, so whatever is still being fetched is left over from an interrupted crawl
+    frontier.reset_in_progress()
+    frontier.close()
+    with span("distributed_crawl.crawl"):
+        if config.num_workers == 1:
+            run_worker(config, 0)
+        else:
+            processes = [
+                multiprocessing.Process(target=run_worker, args=(config, worker_index), name=f"crawl-worker-{worker_index}")
+                for worker_index in range(config.num_workers)
+            ]
+            for process in processes:
+                process.start()
+            running = list(processes)
+            while running:
+                multiprocessing.connection.wait([process.sentinel for process in running])
+                running = [process for process in running if process.exitcode is None]
+                if any(process.exitcode for process in processes if process not in running):
+                    # the URLs a failed worker was fetching stay in progress, so the others would wait for them forever
+                    for process in running:
+                        process.terminate()
+                    for process in running:
+                        process.join()
+                    break
+            failed = [f"{process.name} (exit code {process.exitcode})" for process in processes if process.exitcode != 0]
+            if failed:
+                raise RuntimeError(f"Not merging the archives, these workers failed: {', '.join(failed)}.")
+    return merge_worker_archives(config)
+
+
+def main(argv: list[str] | None = None):
+    import FantAIno
+
+    from constants import AOTY_URL_ROOT, FANTANO_WEBSITE_URL_ROOT
+
+    root_dir = os.path.dirname(os.path.abspath(FantAIno.__path__[0]))
+    sites = {
+        "fantano": dict(url=FANTANO_WEBSITE_URL_ROOT, match="*/album-reviews/*", selector=".post_c_in",
+                        output_file_name=os.path.join(root_dir, "data", "raw", "fantano_website_archive")),
+        "aoty": dict(url=AOTY_URL_ROOT, match="*/57-the-needle-drop/reviews/*", selector=".albumBlock",
+                     output_file_name=os.path.join(root_dir, "data", "raw", "aoty_reviews_archive")),
+    }
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("site", choices=list(sites))
+    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--requests-per-second-per-host", type=float, default=None)
+    parser.add_argument("--max-pages", type=int, default=100_000)
+    parser.add_argument("--frontier", default=None, help="the shared frontier file, next to the output by default")
+    parser.add_argument("--shared-disk", action="store_true", help="the frontier is on a network filesystem")
+    parser.add_argument("--worker", type=int, default=None, help="only run this worker")
+    parser.add_argument("--merge", action="store_true", help="only merge the workers' archives")
+    parser.add_argument("--reset", action="store_true", help="only put the URLs an interrupted crawl was fetching back to pending")
+    args = parser.parse_args(argv)
+
+    config = Config(
+        **sites[args.site], max_pages_to_crawl=args.max_pages, num_workers=args.num_workers,
+        frontier_file_name=args.frontier, frontier_on_shared_disk=args.shared_disk,
+        requests_per_second_per_host=args.requests_per_second_per_host,
+    )
+    if args.merge:
+        print(f"Merged {merge_worker_archives(config)} pages into {config.output_file_name}")
+    elif args.reset:
+        frontier = Frontier(frontier_file_name(config), config.num_workers, shared_disk=config.frontier_on_shared_disk)
+        print(f"Put {frontier.reset_in_progress()} URLs back to pending")
+        frontier.close()
+    elif args.worker is not None:
+        frontier = Frontier(frontier_file_name(config), config.num_workers, shared_disk=config.frontier_on_shared_disk)
+        # other workers may be running, so neither repartition nor reset what they are fetching
+        frontier.initialize([config.url], repartition=False)
+        frontier.close()
+        print(f"Worker {args.worker} captured {run_worker(config, args.worker)} pages")
+    else:
+        print(f"Crawled {crawl_distributed(config)} pages into {config.output_file_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,14 @@ Does the same thing as main.py, but uses jsonlines to write to a file.
 import asyncio
 import json
 import jsonlines
-import fnmatch
 from scraper.crawler_config import Config
+from scraper.page_parser import extract_page
+from utils.profiling import span
 import sys
 import os
 import requests
-from urllib.parse import urljoin
 from collections import deque
 
-from bs4 import BeautifulSoup
-
 from constants import FANTANO_WEBSITE_URL_ROOT
 
 async def crawl(config: Config):
@@ -39,26 +37,21 @@ async def crawl(config: Config):
                 if url in visited_pages or not url.startswith("https://theneedledrop.com/"):
                     continue
                 # print(f"Crawler: Crawling {url}")
-                response = session.get(url)
+                with span("fetch"):
+                    response = session.get(url)
                 response.raise_for_status()
                 # with open("test.txt", "a", encoding="utf-8") as f:
                 #     f.write(response.text)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                if url != FANTANO_WEBSITE_URL_ROOT and "/album-reviews" in url:
-                    html = soup.select_one(config.selector).get_text() if soup.select_one(config.selector) else ""
+                with span("parse"):
+                    html, hrefs = extract_page(response.text, config, capture_text=url != FANTANO_WEBSITE_URL_ROOT and "/album-reviews" in url)
+                if html is not None:
                     writer.write({'url': url, 'html': html})
                     total_results += 1
                     # with open(config.output_file_name, 'w') as f:
                     #     json.dump(results, f, indent=2)
 
                 # Extract and enqueue links
-                links = soup.find_all("a")
-                for link in links:
-                    href = link.get("href")
-                    # ensure we only enqueue links that match the pattern in config.match
-                    if href and fnmatch.fnmatch(href, config.match):
-                        new_url = urljoin(response.url, href)
-                        queue.append(href)
+                queue.extend(hrefs)
 
             except Exception as e: # Catch any general exception and store it in 'e'
                 print(f"Crawler: An error occurred: {e}") # Print the error message
@@ -72,7 +65,8 @@ async def main(config: Config):
     output_dir = os.path.dirname(config.output_file_name)
     os.makedirs(output_dir, exist_ok=True)
     
-    total_results = await crawl(config)
+    with span("fantano_website_scraper_jsonlines.crawl"):
+        total_results = await crawl(config)
     print(f"Crawler Note, Total Pages Crawled: {total_results}")
 
 
@@ -0,0 +1,36 @@
+"""
+Page parsing shared by the crawlers: pulls the selected text out of a page and the links worth following.
+"""
+import fnmatch
+
+from bs4 import BeautifulSoup
+
+from scraper.crawler_config import Config
+
+
+def extract_page(page_html: str, config: Config, capture_text: bool = True) -> tuple[str | None, list[str]]:
+    """
+        Parses a crawled page.
+
+        Args:
+            page_html: the raw HTML of the page.
+            config: the crawler config, whose selector picks the text and whose match pattern filters links.
+            capture_text: whether this page's selected text should be extracted.
+
+        Returns:
+            The text under config.selector ("" if the selector is missing, None if capture_text is False)
+            and every href on the page that matches config.match.
+    """
+    soup = BeautifulSoup(page_html, 'html.parser')
+    text = None
+    if capture_text:
+        selected = soup.select_one(config.selector)
+        text = selected.get_text() if selected else ""
+
+    # ensure we only enqueue links that match the pattern in config.match
+    hrefs = []
+    for link in soup.find_all("a"):
+        href = link.get("href")
+        if href and fnmatch.fnmatch(href, config.match):
+            hrefs.append(href)
+    return text, hrefs
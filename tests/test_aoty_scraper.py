@@ -0,0 +1,72 @@
+"""
+The paginated AOTY crawl and its .albumBlock parser against a local fixture server.
+"""
+
+import time
+
+from benchmarks.fixture_server import FixtureServer
+from scraper.aoty_scraper import crawl_paginated, parse_album_blocks
+from scraper.crawler_config import Config
+
+NUM_PAGES = 3
+
+
+def _make_index_page(page_number: int) -> str:
+    blocks = "".join(
+        '<div class="albumBlock">'
+        f'<div class="image"><img class="lazyload" data-src="https://cdn.example/{page_number}-{i}.jpg"></div>'
+        f'<a href="/album/{page_number}{i}.php"><div class="artistTitle">Artist {page_number}-{i}</div>'
+        f'<div class="albumTitle">Album &amp; {page_number}-{i}</div></a>'
+        f'<div class="ratingRowContainer"><div class="ratingBlock"><div class="rating">{10 * (page_number + i)}</div></div></div>'
+        "</div>"
+        for i in range(2)
+    )
+    pages = "".join(f'<a href="/publication/57-the-needle-drop/reviews/{n}/">{n}</a>' for n in sorted({1, page_number, NUM_PAGES}))
+    return f'<html><body><div id="centerContent">{blocks}</div><div class="pageSelectRow">{pages}</div></body></html>'
+
+
+def _page_fn(path: str) -> str | None:
+    page_number = int(path.rstrip("/").rsplit("/", 1)[-1])
+    return _make_index_page(page_number) if 1 <= page_number <= NUM_PAGES else None
+
+
+def _config(server: FixtureServer, max_pages_to_crawl: int = 100) -> Config:
+    return Config(
+        url=f"{server.url}/publication/57-the-needle-drop/reviews/1/",
+        match="*/57-the-needle-drop/reviews/*",
+        selector=".albumBlock",
+        max_pages_to_crawl=max_pages_to_crawl,
+        output_file_name="unused.json",
+    )
+
+
+def test_parse_album_blocks():
+    html, albums = parse_album_blocks(_make_index_page(2))
+    assert html == "Artist 2-0Album & 2-020"
+    assert albums == [
+        {"artist": "Artist 2-0", "album": "Album & 2-0", "rating": "20", "album_url": "/album/20.php",
+         "image_url": "https://cdn.example/2-0.jpg"},
+        {"artist": "Artist 2-1", "album": "Album & 2-1", "rating": "30", "album_url": "/album/21.php",
+         "image_url": "https://cdn.example/2-1.jpg"},
+    ]
+
+
+def test_crawl_paginated_fetches_every_page_once():
+    with FixtureServer(_page_fn, latency_in_s=0.01) as server:
+        pages = crawl_paginated(_config(server), max_workers=4, requests_per_second=None)
+        assert server.num_requests == NUM_PAGES
+    assert [page["url"].rsplit("/reviews/", 1)[-1] for page in pages] == ["1/", "2/", "3/"]
+    assert [album["artist"] for page in pages for album in page["albums"]] == [
+        f"Artist {page_number}-{i}" for page_number in range(1, NUM_PAGES + 1) for i in range(2)
+    ]
+
+
+def test_crawl_paginated_respects_max_pages_and_rate_limit():
+    with FixtureServer(_page_fn) as server:
+        start = time.monotonic()
+        pages = crawl_paginated(_config(server, max_pages_to_crawl=2), max_workers=4, requests_per_second=5)
+        elapsed = time.monotonic() - start
+        assert server.num_requests == 2
+    assert len(pages) == 2
+    # the second request waits for its slot
+    assert elapsed >= 0.2
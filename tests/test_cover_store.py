@@ -0,0 +1,48 @@
+"""
+utils/cover_store.py on small generated covers.
+"""
+
+import io
+
+import numpy as np
+
+from PIL import Image
+
+from utils.cover_store import CoverStore
+
+
+def _png_bytes(color: tuple[int, int, int]) -> bytes:
+    image_bytes = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(image_bytes, "PNG")
+    return image_bytes.getvalue()
+
+
+def _mean_color(image_paths: list[str]) -> np.ndarray:
+    embeddings = []
+    for image_path in image_paths:
+        with Image.open(image_path) as image:
+            embeddings.append(np.asarray(image.convert("RGB"), dtype=np.float32).mean(axis=(0, 1)))
+    return np.stack(embeddings)
+
+
+def test_get_embeddings_reuses_identical_covers_only(tmp_path):
+    store = CoverStore(str(tmp_path))
+    store.add_image("Artist", "Red", _png_bytes((255, 0, 0)), ".png")
+    store.add_image("Artist", "Blue", _png_bytes((0, 0, 255)), ".png")
+    store.add_image("Artist", "Red (Deluxe)", _png_bytes((255, 0, 0)), ".png")
+    keys = [store.album_key("Artist", album_name) for album_name in ("Red", "Blue", "Red (Deluxe)")]
+    # solid covers share a phash, but not their embeddings
+    assert len({store.phash(sha) for sha in store.index["objects"]}) == 1
+
+    embedded = []
+
+    def embed_fn(image_paths: list[str]) -> np.ndarray:
+        embedded.extend(image_paths)
+        return _mean_color(image_paths)
+
+    embeddings = store.get_embeddings(keys, embed_fn, "mean_color")
+    np.testing.assert_array_equal(embeddings, [[255, 0, 0], [0, 0, 255], [255, 0, 0]])
+    assert len(embedded) == 2
+
+    np.testing.assert_array_equal(store.get_embeddings(keys, embed_fn, "mean_color"), embeddings)
+    assert len(embedded) == 2
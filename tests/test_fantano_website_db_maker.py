@@ -0,0 +1,87 @@
+"""
+archived/fantano_website_db_maker.py against a local stub of the OpenAI Responses API.
+"""
+
+import json
+import os
+
+from archived.fantano_website_db_maker import category_score, extract_fantano_ratings
+from benchmarks.fixture_server import FixtureServer
+
+# review text -> the category the stub model answers with
+MODEL_ANSWERS = {
+    "An uneven record that grew on me, somewhere between decent and strong.": "Decent to Strong 6 (Pick Strong 6)",
+    "I could not get into this one at all, the writing is lazy.": "Not Good",
+    "A compilation of demos, nothing to score here.": "N/A",
+}
+REGEX_REVIEW = "Thoughts? I'm feeling a STRONG_7/10 on this one."
+
+
+class ResponsesStub:
+    """
+        Answers POST /responses with a Responses API payload, looking the answer up by the request's input.
+    """
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, path: str, request_body: bytes) -> str | None:
+        if not path.endswith("/responses"):
+            return None
+        review = json.loads(request_body)["input"]
+        self.inputs.append(review)
+        return json.dumps({
+            "id": f"resp_{len(self.inputs)}",
+            "object": "response",
+            "created_at": 0,
+            "model": "gpt-4o-mini",
+            "status": "completed",
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "output": [{
+                "type": "message",
+                "id": f"msg_{len(self.inputs)}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": f'"{MODEL_ANSWERS[review]}"', "annotations": []}],
+            }],
+        })
+
+
+def _serve(stub: ResponsesStub) -> FixtureServer:
+    return FixtureServer(lambda path: None, post_fn=stub, content_type="application/json")
+
+
+def test_category_score():
+    assert category_score("Decent to Strong 6 (Pick Strong 6)") == 6
+    assert category_score("Strong 6 to Light 7 (Pick Light 7)") == 7
+    assert category_score('"Not Good"') == -1
+    assert category_score("A 10") == 10
+    assert category_score("N/A") is None
+
+
+def test_regex_fast_path_sends_no_request(tmp_path):
+    stub = ResponsesStub()
+    with _serve(stub) as server:
+        scores = extract_fantano_ratings(
+            [REGEX_REVIEW], cache_file_path=os.path.join(tmp_path, "cache.json"), base_url=server.url
+        )
+    assert scores == [7]
+    assert server.num_requests == 0
+
+
+def test_identical_reviews_are_sent_once_and_cached(tmp_path):
+    cache_file_path = os.path.join(tmp_path, "cache.json")
+    reviews = list(MODEL_ANSWERS) + [REGEX_REVIEW, next(iter(MODEL_ANSWERS))]
+    stub = ResponsesStub()
+    with _serve(stub) as server:
+        scores = extract_fantano_ratings(reviews, cache_file_path=cache_file_path, base_url=server.url)
+    assert scores == [6, -1, None, 7, 6]
+    assert sorted(stub.inputs) == sorted(MODEL_ANSWERS)
+    assert server.num_requests == len(MODEL_ANSWERS)
+
+    rerun_stub = ResponsesStub()
+    with _serve(rerun_stub) as server:
+        assert extract_fantano_ratings(reviews, cache_file_path=cache_file_path, base_url=server.url) == scores
+    assert server.num_requests == 0
@@ -0,0 +1,114 @@
+"""
+utils/lyrics_utils.py against a local stub of the Genius search API and song pages.
+"""
+
+import gzip
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.fixture_server import FixtureServer
+from utils.lyrics_utils import GeniusClient, compute_lyrics_features, fetch_lyrics, iter_lyrics_store
+
+SONG_LYRICS = {
+    "alpha": "[Verse 1]\nhello world hello",
+    "beta": "[Chorus]\nworld of words",
+    "gamma": "another hello entirely",
+}
+MELONDY_DF = pd.DataFrame({
+    "artist": ["Artist One", "Artist Two", "Artist Three"],
+    "album": ["First", "Second", "Third"],
+    "track_names": ["['Alpha (feat. Someone)', 'Beta']", "['Gamma - 2011 Remaster', 'Unknown']", "['Nothing']"],
+})
+
+
+def _make_genius_stub(base_url: list[str]):
+    """
+        Serves /search?q=<artist> <track> with one song hit per known track, and /songs/<track> pages.
+    """
+    def page_fn(path: str) -> str | None:
+        url = urlsplit(path)
+        if url.path == "/search":
+            query = parse_qs(url.query)["q"][0]
+            artist_name, _, track_name = query.rpartition(" ")
+            hits = []
+            if track_name.lower() in SONG_LYRICS:
+                hits.append({"type": "song", "result": {
+                    "primary_artist": {"name": artist_name}, "url": f"{base_url[0]}/songs/{track_name.lower()}",
+                }})
+            return json.dumps({"response": {"hits": hits}})
+        if url.path.startswith("/songs/"):
+            lyrics = SONG_LYRICS.get(url.path.rsplit("/", 1)[-1])
+            if lyrics is None:
+                return None
+            return f'<html><body><div data-lyrics-container="true">{lyrics}</div></body></html>'
+        return None
+    return page_fn
+
+
+def _fetch(server: FixtureServer, store_file_name: str) -> dict[str, int]:
+    client = GeniusClient(access_token="stub", base_url=server.url)
+    return fetch_lyrics(MELONDY_DF, store_file_name, client=client, max_workers=4, requests_per_second=1000)
+
+
+def test_fetch_lyrics_stores_every_track_once(tmp_path):
+    store_file_name = os.path.join(tmp_path, "lyrics.jsonl.gz")
+    base_url = []
+    with FixtureServer(_make_genius_stub(base_url)) as server:
+        base_url.append(server.url)
+        assert _fetch(server, store_file_name) == {"stored": 0, "fetched": 3, "no_lyrics": 2, "failed": 0}
+        num_requests = server.num_requests
+        # a second run finds everything in the store and makes no requests
+        assert _fetch(server, store_file_name) == {"stored": 5, "fetched": 0, "no_lyrics": 0, "failed": 0}
+        assert server.num_requests == num_requests
+
+    lyrics = {track.track: track.lyrics for track in iter_lyrics_store(store_file_name)}
+    assert lyrics["Alpha (feat. Someone)"] == "hello world hello"
+    assert lyrics["Beta"] == "world of words"
+    assert lyrics["Unknown"] == ""
+
+
+def test_fetch_lyrics_resumes_after_a_truncated_store(tmp_path):
+    store_file_name = os.path.join(tmp_path, "lyrics.jsonl.gz")
+    base_url = []
+    with FixtureServer(_make_genius_stub(base_url)) as server:
+        base_url.append(server.url)
+        _fetch(server, store_file_name)
+        # an interrupted run leaves the last gzip member cut off
+        with open(store_file_name, "rb") as f:
+            compressed = f.read()
+        with open(store_file_name, "wb") as f:
+            f.write(compressed[:len(compressed) - 20])
+        num_intact = len(list(iter_lyrics_store(store_file_name)))
+        assert num_intact < 5
+
+        counts = _fetch(server, store_file_name)
+    assert counts["stored"] == num_intact
+    assert counts["fetched"] + counts["no_lyrics"] == 5 - num_intact
+    with gzip.open(store_file_name, "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+
+def test_compute_lyrics_features_fits_idf_on_training_rows(tmp_path):
+    store_file_name = os.path.join(tmp_path, "lyrics.jsonl.gz")
+    base_url = []
+    with FixtureServer(_make_genius_stub(base_url)) as server:
+        base_url.append(server.url)
+        _fetch(server, store_file_name)
+
+    richness_df, tfidf = compute_lyrics_features(MELONDY_DF, store_file_name, train_index=MELONDY_DF.index[:1], n_features=2 ** 10)
+    assert tfidf.shape == (3, 2 ** 10)
+    assert richness_df["lyrics_num_words"].tolist() == [6, 3, 0]
+    assert richness_df["lyrics_track_coverage"].tolist() == [1.0, 0.5, 0.0]
+
+    # the only training album's words (hello x2, world x2, of, words) all get the same IDF
+    sublinear_tf = np.array([1 + np.log(2), 1 + np.log(2), 1, 1])
+    assert np.allclose(np.sort(tfidf[0].data), np.sort(sublinear_tf / np.linalg.norm(sublinear_tf)))
+
+    # fit on every album, "hello" is shared with the second album and weighs less
+    _, all_rows_tfidf = compute_lyrics_features(MELONDY_DF, store_file_name, train_index=MELONDY_DF.index, n_features=2 ** 10)
+    assert not np.allclose(tfidf[0].toarray(), all_rows_tfidf[0].toarray())
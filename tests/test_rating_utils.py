@@ -0,0 +1,71 @@
+"""
+utils/rating_utils.py on the rating forms its module docstring documents, and on prose that must not count.
+"""
+
+import jsonlines
+import pytest
+
+from utils.rating_utils import NOT_GOOD_RATING, ExtractedRating, extract_rating, extract_ratings_file
+
+
+@pytest.mark.parametrize("review_text, score, label", [
+    ("I'm feeling a 7/10 on this one.", 7, "7/10"),
+    ("I'm feeling a 7 / 10", 7, "7/10"),
+    ("10/10", 10, "10/10"),
+    ("Final verdict: A 10", 10, "10/10"),
+    ("A_10", 10, "10/10"),
+    ("DECENT_TO_STRONG_6", 6, "DECENT_TO_STRONG_6"),
+    ("DECENT-STRONG 7", 7, "DECENT_STRONG_7"),
+    ("Light 7", 7, "LIGHT_7"),
+    ("STRONG 8-LIGHT 9", 8, "STRONG_8_LIGHT_9"),
+    ("STRONG 7 TO LIGHT 8", 7, "STRONG_7_TO_LIGHT_8"),
+    ("Strong 9 to a 10", 9, "STRONG_9_TO_A_10"),
+    ("Strong 6 to Light 7 (Pick Light 7)", 7, "LIGHT_7"),
+    ("Decent to Strong 6 (pick 6)", 6, "6/10"),
+    ("NOT GOOD", NOT_GOOD_RATING, "NOT_GOOD"),
+    ("NOT_GOOD", NOT_GOOD_RATING, "NOT_GOOD"),
+])
+def test_documented_forms(review_text, score, label):
+    assert extract_rating(review_text) == ExtractedRating(score, label, True)
+
+
+@pytest.mark.parametrize("review_text", [
+    "Honestly, it's not good.",
+    "Not Good",
+    "It ends with a 10 minute closer.",
+    "A 10 minute closer ends it.",
+    "The second half is strong 3 songs in a row.",
+    "Each track runs a light 4 minutes, a decent 7 overall.",
+    "17/10 would listen again.",
+    "I'd give it a 7.5/10.",
+])
+def test_prose_is_not_a_rating(review_text):
+    assert extract_rating(review_text) == ExtractedRating(None, None, False)
+
+
+def test_confidence():
+    assert extract_rating("The production is great. STRONG 7").confident
+    # the same rating stated twice doesn't conflict
+    assert extract_rating("Light 7 ... so yeah, 7/10").confident
+    conflicting = extract_rating("LIGHT 6, no wait, STRONG 7")
+    assert (conflicting.score, conflicting.confident) == (7, False)
+    assert not extract_rating("No rating in this one.").confident
+
+
+def test_only_the_tail_is_scanned():
+    review_text = "7/10 " + "x" * 600
+    assert extract_rating(review_text).score is None
+    assert extract_rating(review_text, tail_length=None).score == 7
+
+
+def test_extract_ratings_file(tmp_path):
+    scraped_file_name, output_file_name = tmp_path / "reviews.jsonl", tmp_path / "ratings.jsonl"
+    with jsonlines.open(scraped_file_name, "w") as writer:
+        writer.write_all([
+            {"url": "a", "html": "STRONG 7"},
+            {"url": "b", "html": "LIGHT 6 ... 8/10"},
+            {"url": "c", "html": None},
+        ])
+    assert extract_ratings_file(scraped_file_name, output_file_name) == {"confident": 1, "ambiguous": 1, "missing": 1}
+    with jsonlines.open(output_file_name) as reader:
+        assert [rating["score"] for rating in reader] == [7, 8, None]
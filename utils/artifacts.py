@@ -0,0 +1,162 @@
+"""
+Metric artifacts of the model scripts, and the report stage that renders them.
+
+Training runs only write small artifacts to results/artifacts: a JSON confusion matrix (with the figure it should
+become) and the test predictions as a compressed .npz. Nothing here imports matplotlib or seaborn until figures
+are rendered, so headless training jobs and batch searches never pay for the plotting libraries.
+
+render_reports then draws every figure whose artifact changed, in parallel worker processes on the non-interactive
+Agg backend, each figure on its own Figure object so nothing is shared through pyplot's global state.
+
+Usage (from the repository root):
+    python -m utils.artifacts                     # render the figures of new or changed artifacts
+    python -m utils.artifacts --force             # render every figure
+"""
+
+import argparse
+import json
+import numpy as np
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.profiling import span
+
+ARTIFACT_DIR = os.path.join("results", "artifacts")
+CONFUSION_MATRIX_SUFFIX = ".confusion_matrix.json"
+PREDICTIONS_SUFFIX = ".predictions.npz"
+
+
+def confusion_matrix_file_name(name: str, artifact_dir: str = ARTIFACT_DIR) -> str:
+    return os.path.join(artifact_dir, f"{name}{CONFUSION_MATRIX_SUFFIX}")
+
+
+def predictions_file_name(name: str, artifact_dir: str = ARTIFACT_DIR) -> str:
+    return os.path.join(artifact_dir, f"{name}{PREDICTIONS_SUFFIX}")
+
+
+def save_confusion_matrix(name: str, cm: np.ndarray, labels: list, figure_file_name: str, artifact_dir: str = ARTIFACT_DIR) -> str:
+    """
+        Writes the confusion matrix of a run, to be rendered to figure_file_name by render_reports.
+
+        Args:
+            name: the run, e.g. the script's name.
+            cm: the confusion matrix, actual labels by row and predicted labels by column.
+            labels: the labels of the rows and columns.
+            figure_file_name: where the heatmap goes.
+            artifact_dir: where the artifact goes.
+
+        Returns:
+            The artifact's file name.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    file_name = confusion_matrix_file_name(name, artifact_dir)
+    artifact = {
+        "name": name,
+        "labels": [label.item() if isinstance(label, np.generic) else label for label in labels],
+        "matrix": np.asarray(cm).tolist(),
+        "figure_file_name": figure_file_name,
+    }
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w") as f:
+        json.dump(artifact, f)
+    os.replace(tmp_file_name, file_name)
+    return file_name
+
+
+def save_predictions(name: str, y_true, y_pred, artifact_dir: str = ARTIFACT_DIR) -> str:
+    """
+        Writes the test set ratings and the run's predictions of them. Returns the artifact's file name.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    file_name = predictions_file_name(name, artifact_dir)
+    # np.savez appends .npz to names that don't end in it
+    tmp_file_name = f"{file_name[:-len('.npz')]}.tmp.npz"
+    np.savez_compressed(tmp_file_name, y_true=np.asarray(y_true), y_pred=np.asarray(y_pred))
+    os.replace(tmp_file_name, file_name)
+    return file_name
+
+
+def load_confusion_matrix(file_name: str) -> dict:
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def load_predictions(file_name: str) -> tuple[np.ndarray, np.ndarray]:
+    with np.load(file_name) as predictions:
+        return predictions["y_true"], predictions["y_pred"]
+
+
+def _render_confusion_matrix(file_name: str) -> str:
+    """
+        Draws one confusion matrix heatmap, in a worker process. Returns the figure's file name.
+    """
+    import matplotlib
+
+    # no display, and no GUI event loop, in the report workers
+    matplotlib.use("Agg")
+    import seaborn as sns
+
+    from matplotlib.figure import Figure
+
+    artifact = load_confusion_matrix(file_name)
+    labels = artifact["labels"]
+    figure = Figure()
+    ax = figure.subplots()
+    sns.heatmap(np.asarray(artifact["matrix"]),
+                annot=True,  # Show the numbers in each cell
+                fmt='g',     # Format the numbers as general (non-scientific)
+                xticklabels=labels,  # Set labels for the x-axis (predictions)
+                yticklabels=labels,  # Set labels for the y-axis (actuals)
+                ax=ax)
+    ax.set_ylabel('Actual', fontsize=13)
+    ax.set_title('Confusion Matrix', fontsize=17, pad=20)
+    # the x-axis label and ticks go on top
+    ax.xaxis.set_label_position('top')
+    ax.set_xlabel('Prediction', fontsize=13)
+    ax.xaxis.tick_top()
+    figure.subplots_adjust(bottom=0.2)
+    figure.text(0.5, 0.05, 'Prediction', ha='center', fontsize=13)
+
+    figure_file_name = artifact["figure_file_name"]
+    os.makedirs(os.path.dirname(figure_file_name) or ".", exist_ok=True)
+    figure.savefig(figure_file_name)
+    return figure_file_name
+
+
+def _is_stale(artifact_file_name: str) -> bool:
+    figure_file_name = load_confusion_matrix(artifact_file_name)["figure_file_name"]
+    return not os.path.exists(figure_file_name) or os.path.getmtime(figure_file_name) < os.path.getmtime(artifact_file_name)
+
+
+def render_reports(artifact_dir: str = ARTIFACT_DIR, max_workers: int | None = None, force: bool = False) -> list[str]:
+    """
+        Renders the figure of every confusion matrix artifact that is newer than its figure, or of all of them
+        with force, in a process pool.
+
+        Returns:
+            The rendered figures' file names.
+    """
+    if not os.path.isdir(artifact_dir):
+        return []
+    artifact_file_names = sorted(
+        os.path.join(artifact_dir, name) for name in os.listdir(artifact_dir) if name.endswith(CONFUSION_MATRIX_SUFFIX)
+    )
+    stale_file_names = [file_name for file_name in artifact_file_names if force or _is_stale(file_name)]
+    if not stale_file_names:
+        return []
+    with span("artifacts.render_reports"):
+        if max_workers == 1 or len(stale_file_names) == 1:
+            return [_render_confusion_matrix(file_name) for file_name in stale_file_names]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_render_confusion_matrix, stale_file_names))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifact-dir", default=ARTIFACT_DIR)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="render every figure, not only the stale ones")
+    args = parser.parse_args()
+    for figure_file_name in render_reports(args.artifact_dir, max_workers=args.max_workers, force=args.force):
+        print(f"Rendered {figure_file_name}")
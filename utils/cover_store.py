@@ -0,0 +1,277 @@
+"""
+A content-addressed store for album covers.
+
+Reissues, deluxe editions and "&" collaborations often share the same artwork. Instead of downloading and saving
+every cover once per album, the store
+    downloads each distinct image URL once,
+    saves each distinct image once, as objects/<sha[:2]>/<sha><extension>, where sha is the SHA-256 of its bytes,
+    indexes album -> sha in index.json, along with each stored image's 64-bit DCT perceptual hash (phash),
+    lays the album_ImageFolder out as symlinks (copies where symlinks aren't available) to the stored objects,
+    caches backbone embeddings per stored image, so albums sharing a cover are embedded once,
+    reports near-duplicate covers that ended up on both sides of a train/test split.
+
+Objects and embeddings are only shared by byte-identical images. The phash can't tell apart covers with the same
+layout in different colors, or low-texture covers (every solid color cover hashes to 0x8000000000000000), so it
+is only used by the leakage report.
+
+Usage (from the repository root):
+    python -m utils.cover_store data/processed/melondy.csv data/processed/cover_store
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+import pandas as pd
+import requests
+import shutil
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from scipy.fft import dctn
+from typing import Callable
+
+from utils.profiling import timed
+from utils.text_normalization import sanitize_filename
+
+INDEX_VERSION = 2
+# covers within this many bits are flagged as near-duplicates in the leakage report
+NEAR_DUPLICATE_DISTANCE = 10
+_HASH_IMAGE_SIZE = 32
+_HASH_SIZE = 8
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+        64-bit DCT hash: the low frequency 8x8 corner of the grayscale 32x32 image's DCT, thresholded at its median.
+    """
+    pixels = np.asarray(image.convert("L").resize((_HASH_IMAGE_SIZE, _HASH_IMAGE_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low_frequencies = dctn(pixels, norm="ortho")[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    # the DC term only encodes overall brightness
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(*values.shape, 8), axis=-1).sum(axis=-1)
+
+
+def hamming_distances(hashes: np.ndarray, other_hashes: np.ndarray) -> np.ndarray:
+    """
+        Pairwise number of differing bits between two arrays of uint64 hashes.
+    """
+    return _popcount(np.bitwise_xor(hashes[:, None], other_hashes[None, :]))
+
+
+def _format_hash(phash: int) -> str:
+    return f"{phash:016x}"
+
+
+def train_test_albums(melondy_df: pd.DataFrame, test_size: float = 0.2) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+        The stratified train/test split of the albums, shared by the album_ImageFolder and the cover model.
+    """
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(melondy_df, shuffle=True, random_state=0, test_size=test_size, stratify=melondy_df["rating"])
+
+
+class CoverStore:
+    """
+        Args:
+            root: the store directory, with objects/, embeddings/ and index.json under it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_file_name = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.index = {"version": INDEX_VERSION, "albums": {}, "urls": {}, "objects": {}}
+        if os.path.exists(self.index_file_name):
+            with open(self.index_file_name, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                self.index = index
+            else:
+                # objects used to be keyed by phash, which merged distinct covers, so their albums are fetched again
+                print(f"{self.index_file_name} is from an older version of the store, re-adding every cover.")
+
+    @staticmethod
+    def album_key(artist_name: str, album_name: str) -> str:
+        return f"{artist_name}___{album_name}"
+
+    def object_path(self, sha: str) -> str:
+        return os.path.join(self.root, "objects", sha[:2], f"{sha}{self.index['objects'][sha]['extension']}")
+
+    def save(self):
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            temporary_file_name = f"{self.index_file_name}.tmp"
+            with open(temporary_file_name, "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            os.replace(temporary_file_name, self.index_file_name)
+
+    def phash(self, sha: str) -> str:
+        return self.index["objects"][sha]["phash"]
+
+    def add_image(self, artist_name: str, album_name: str, image_bytes: bytes, extension: str, url: str | None = None) -> str:
+        """
+            Stores an album's cover, unless the same image is already stored. Returns the cover's SHA-256.
+        """
+        sha = hashlib.sha256(image_bytes).hexdigest()
+        with self.lock:
+            is_stored = sha in self.index["objects"]
+        if not is_stored:
+            with Image.open(BytesIO(image_bytes)) as image:
+                phash = _format_hash(perceptual_hash(image))
+        with self.lock:
+            if sha not in self.index["objects"]:
+                self.index["objects"][sha] = {"extension": extension, "num_bytes": len(image_bytes), "phash": phash}
+                object_path = self.object_path(sha)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                with open(object_path, "wb") as f:
+                    f.write(image_bytes)
+            self.index["albums"][self.album_key(artist_name, album_name)] = sha
+            if url is not None:
+                self.index["urls"][url] = sha
+        return sha
+
+    def add_from_url(self, artist_name: str, album_name: str, url: str) -> str | None:
+        """
+            Stores an album's cover from its URL, skipping the download if the URL was downloaded before.
+        """
+        with self.lock:
+            known_sha = self.index["urls"].get(url)
+            if known_sha is not None:
+                self.index["albums"][self.album_key(artist_name, album_name)] = known_sha
+                return known_sha
+        try:
+            response = requests.get(url, timeout=20)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"{artist_name}'s {album_name} had an issue with retrieving album cover.")
+            print(e)
+            return None
+        _, extension = os.path.splitext(url)
+        return self.add_image(artist_name, album_name, response.content, extension or ".jpg", url=url)
+
+    @timed()
+    def add_albums(self, melondy_df: pd.DataFrame, max_workers: int = 8) -> dict[str, int]:
+        """
+            Stores the covers of every album of the dataset that isn't in the store yet.
+
+            Returns:
+                The number of albums, distinct URLs and distinct stored covers.
+        """
+        pending = [
+            (artist_name, album_name, url)
+            for artist_name, album_name, url in zip(melondy_df["artist"], melondy_df["album"], melondy_df["image_url"])
+            if isinstance(url, str) and self.album_key(artist_name, album_name) not in self.index["albums"]
+        ]
+        # the first album with a URL downloads it, the others reuse it
+        first_by_url, reusing = {}, []
+        for album in pending:
+            if album[2] in first_by_url:
+                reusing.append(album)
+            else:
+                first_by_url[album[2]] = album
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda album: self.add_from_url(*album), first_by_url.values()))
+        for album in reusing:
+            self.add_from_url(*album)
+        self.save()
+        return {
+            "albums": len(self.index["albums"]),
+            "urls": len(self.index["urls"]),
+            "covers": len(self.index["objects"]),
+        }
+
+    def materialize_image_folder(self, melondy_df: pd.DataFrame, output_dir: str, train: bool = True) -> int:
+        """
+            Lays the albums' covers out in the torchvision ImageFolder format of process_image, as links into the
+            store. Returns the number of covers linked.
+        """
+        train_folder = "train" if train else "test"
+        num_linked = 0
+        for artist_name, album_name, rating in zip(melondy_df["artist"], melondy_df["album"], melondy_df["rating"]):
+            sha = self.index["albums"].get(self.album_key(artist_name, album_name))
+            if sha is None:
+                continue
+            object_path = self.object_path(sha)
+            _, extension = os.path.splitext(object_path)
+            link_path = os.path.join(
+                output_dir, "album_ImageFolder", train_folder, f"{rating}", sanitize_filename(f"{artist_name}___{album_name}{extension}")
+            )
+            os.makedirs(os.path.dirname(link_path), exist_ok=True)
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            try:
+                os.symlink(os.path.abspath(object_path), link_path)
+            except OSError:
+                # symlinks need extra privileges on Windows
+                shutil.copyfile(object_path, link_path)
+            num_linked += 1
+        return num_linked
+
+    def get_embeddings(self, album_keys: list[str], embed_fn: Callable[[list[str]], np.ndarray], cache_name: str) -> np.ndarray:
+        """
+            Embeddings of the albums' covers, computing embed_fn only once per stored image and caching the
+            result under embeddings/<cache_name>/ (use one cache_name per backbone and image size).
+
+            Args:
+                album_keys: album_key(artist, album) of every album to embed. Every album must be in the store.
+                embed_fn: image paths -> one embedding per row, e.g. FantAInoCoverModel.embed.
+                cache_name: name of the embedding cache.
+        """
+        shas = [self.index["albums"][album_key] for album_key in album_keys]
+        cache_dir = os.path.join(self.root, "embeddings", cache_name)
+        distinct_shas = list(dict.fromkeys(shas))
+        missing = [sha for sha in distinct_shas if not os.path.exists(os.path.join(cache_dir, f"{sha}.npy"))]
+        if missing:
+            os.makedirs(cache_dir, exist_ok=True)
+            for sha, embedding in zip(missing, embed_fn([self.object_path(sha) for sha in missing])):
+                np.save(os.path.join(cache_dir, f"{sha}.npy"), embedding)
+        embeddings = {sha: np.load(os.path.join(cache_dir, f"{sha}.npy")) for sha in distinct_shas}
+        return np.stack([embeddings[sha] for sha in shas]) if shas else np.zeros((0, 0), dtype=np.float32)
+
+    def leakage_report(self, train_df: pd.DataFrame, test_df: pd.DataFrame, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> pd.DataFrame:
+        """
+            Pairs of train and test albums whose covers are within max_distance bits of each other, closest first.
+        """
+        def hashed_albums(melondy_df: pd.DataFrame) -> pd.DataFrame:
+            keys = [self.album_key(artist_name, album_name) for artist_name, album_name in zip(melondy_df["artist"], melondy_df["album"])]
+            shas = [self.index["albums"].get(key) for key in keys]
+            albums_df = pd.DataFrame({"album_key": keys, "phash": [None if sha is None else self.phash(sha) for sha in shas]})
+            return albums_df.dropna().reset_index(drop=True)
+
+        train_albums, test_albums = hashed_albums(train_df), hashed_albums(test_df)
+        train_hashes = np.array([int(phash, 16) for phash in train_albums["phash"]], dtype=np.uint64)
+        test_hashes = np.array([int(phash, 16) for phash in test_albums["phash"]], dtype=np.uint64)
+        train_positions, test_positions = np.nonzero(hamming_distances(train_hashes, test_hashes) <= max_distance)
+        report_df = pd.DataFrame({
+            "train_album": train_albums["album_key"].to_numpy()[train_positions],
+            "test_album": test_albums["album_key"].to_numpy()[test_positions],
+            "distance": _popcount(np.bitwise_xor(train_hashes[train_positions], test_hashes[test_positions])),
+        })
+        return report_df.sort_values("distance", kind="stable").reset_index(drop=True)
+
+    def disk_usage(self) -> dict[str, int]:
+        """
+            Bytes stored, and bytes that saving every album's cover separately would have taken.
+        """
+        stored_bytes = sum(cover["num_bytes"] for cover in self.index["objects"].values())
+        album_bytes = sum(self.index["objects"][sha]["num_bytes"] for sha in self.index["albums"].values())
+        return {"stored_bytes": stored_bytes, "album_bytes": album_bytes}
+
+
+if __name__ == "__main__":
+    from utils.data_utils import read_melondy_csv
+
+    cover_store = CoverStore(sys.argv[2])
+    print(cover_store.add_albums(read_melondy_csv(sys.argv[1])))
+    print(cover_store.disk_usage())
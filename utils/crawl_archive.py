@@ -0,0 +1,244 @@
+"""
+A compressed, sharded store for crawler output ({"url", "html"} records), with random access by URL.
+
+Records are appended to shards (shard-00000.jsonl.gz, ...) in blocks of about block_size_bytes of JSON lines,
+each block compressed on its own as one gzip member (or zstd frame). A shard is therefore still a plain
+.jsonl.gz file that gzip, zcat or jsonlines can read from start to end, while index.sqlite maps every URL to
+(shard, block offset, block length, line within the block), so one record is read by decompressing one block.
+
+Writes stream: only the current block is held in memory, and the index is committed with every block, so an
+interrupted crawl keeps everything up to the last flushed block and a new writer appends to a new shard.
+Parsing stages process the shards in parallel with map_shards.
+
+Usage (from the repository root):
+    python -m utils.crawl_archive data/raw/fantano_website_archive                  # summary
+    python -m utils.crawl_archive data/raw/fantano_website_archive <url>            # one record
+"""
+
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator
+
+INDEX_FILE_NAME = "index.sqlite"
+COMPRESSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+_SHARD_FILE_NAME = re.compile(r"^shard-(\d{5})\.jsonl\.(gz|zst)$")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    url TEXT PRIMARY KEY,
+    shard TEXT NOT NULL,
+    block_offset INTEGER NOT NULL,
+    block_length INTEGER NOT NULL,
+    line INTEGER NOT NULL
+);
+"""
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compression needs the zstandard package, use compression='gzip' otherwise.") from e
+    return zstandard
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data: bytes, shard_name: str) -> bytes:
+    if shard_name.endswith(".zst"):
+        return _zstandard().ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def iter_shard(shard_path: str) -> Iterator[dict]:
+    """
+        Streams the records of one shard, in the order they were written.
+    """
+    if shard_path.endswith(".zst"):
+        with open(shard_path, "rb") as f:
+            lines = _zstandard().ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            for line in _iter_lines(lines):
+                yield json.loads(line)
+        return
+    with gzip.open(shard_path, "rb") as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def _iter_lines(stream) -> Iterator[bytes]:
+    remainder = b""
+    while chunk := stream.read(1 << 20):
+        *lines, remainder = (remainder + chunk).split(b"\n")
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+class CrawlArchiveWriter:
+    """
+        Appends records to a crawl archive. Use as a context manager, or call close(), so the last block is flushed.
+
+        Args:
+            directory: the archive directory, created if needed. An existing archive is appended to.
+            compression: "gzip", or "zstd" (needs the zstandard package).
+            block_size_bytes: uncompressed size of the blocks records are compressed in, the unit of random access.
+            shard_size_bytes: compressed size after which a new shard is started.
+    """
+
+    def __init__(self, directory: str, compression: str = "gzip", block_size_bytes: int = 1 << 20, shard_size_bytes: int = 256 << 20):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}, expected one of {list(COMPRESSIONS)}.")
+        if compression == "zstd":
+            _zstandard()
+        self.directory = directory
+        self.compression = compression
+        self.block_size_bytes = block_size_bytes
+        self.shard_size_bytes = shard_size_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, INDEX_FILE_NAME))
+        self.connection.executescript(_SCHEMA)
+        existing_shards = [int(match.group(1)) for match in map(_SHARD_FILE_NAME.match, os.listdir(directory)) if match]
+        # never append to an existing shard, its last block may be cut off
+        self._next_shard_number = max(existing_shards, default=-1) + 1
+        self._shard_file = None
+        self._shard_name = None
+        self._block_lines = []
+        self._block_urls = []
+        self._block_size = 0
+        self.num_written = 0
+
+    def _open_next_shard(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+        self._shard_name = f"shard-{self._next_shard_number:05d}{COMPRESSIONS[self.compression]}"
+        self._next_shard_number += 1
+        self._shard_file = open(os.path.join(self.directory, self._shard_name), "wb")
+
+    def __contains__(self, url: str) -> bool:
+        if url in self._block_urls:
+            return True
+        return self.connection.execute("SELECT 1 FROM records WHERE url = ?", (url,)).fetchone() is not None
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._block_lines.append(line)
+        self._block_urls.append(record["url"])
+        self._block_size += len(line)
+        self.num_written += 1
+        if self._block_size >= self.block_size_bytes:
+            self.flush()
+
+    def flush(self):
+        """
+            Compresses and writes the current block, then commits its records to the index.
+        """
+        if not self._block_lines:
+            return
+        if self._shard_file is None or self._shard_file.tell() >= self.shard_size_bytes:
+            self._open_next_shard()
+        block = _compress(b"".join(self._block_lines), self.compression)
+        block_offset = self._shard_file.tell()
+        self._shard_file.write(block)
+        self._shard_file.flush()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records (url, shard, block_offset, block_length, line) VALUES (?, ?, ?, ?, ?)",
+                [(url, self._shard_name, block_offset, len(block), line) for line, url in enumerate(self._block_urls)],
+            )
+        self._block_lines, self._block_urls, self._block_size = [], [], 0
+
+    def close(self):
+        self.flush()
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class CrawlArchive:
+    """
+        Reads a crawl archive.
+
+        Args:
+            directory: the archive directory written by CrawlArchiveWriter.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.connection = sqlite3.connect(os.path.join(directory, INDEX_FILE_NAME), check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __contains__(self, url: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM records WHERE url = ?", (url,)).fetchone() is not None
+
+    def get(self, url: str) -> dict | None:
+        """
+            The record of url, decompressing only the block it's in. None if the URL isn't archived.
+        """
+        row = self.connection.execute(
+            "SELECT shard, block_offset, block_length, line FROM records WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        shard_name, block_offset, block_length, line = row
+        with open(os.path.join(self.directory, shard_name), "rb") as f:
+            f.seek(block_offset)
+            block = _decompress(f.read(block_length), shard_name)
+        return json.loads(block.split(b"\n")[line])
+
+    def urls(self) -> Iterator[str]:
+        for (url,) in self.connection.execute("SELECT url FROM records ORDER BY shard, block_offset, line"):
+            yield url
+
+    @property
+    def shard_paths(self) -> list[str]:
+        shard_names = sorted(name for name in os.listdir(self.directory) if _SHARD_FILE_NAME.match(name))
+        return [os.path.join(self.directory, name) for name in shard_names]
+
+    def iter_records(self) -> Iterator[dict]:
+        """
+            Streams every record, shard by shard. A URL crawled twice is yielded twice.
+        """
+        for shard_path in self.shard_paths:
+            yield from iter_shard(shard_path)
+
+    def map_shards(self, fn: Callable[[str], object], max_workers: int | None = None) -> Iterator[object]:
+        """
+            Applies fn to every shard path in worker processes, yielding the results in shard order.
+            fn has to be picklable, i.e. a module-level function.
+        """
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(fn, self.shard_paths)
+
+    def disk_usage(self) -> int:
+        return sum(os.path.getsize(shard_path) for shard_path in self.shard_paths)
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    archive = CrawlArchive(sys.argv[1])
+    if len(sys.argv) > 2:
+        print(json.dumps(archive.get(sys.argv[2]), indent=2, ensure_ascii=False))
+    else:
+        print(f"{len(archive)} records in {len(archive.shard_paths)} shards, {archive.disk_usage() / 1024 ** 2:.1f} MB")
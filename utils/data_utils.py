@@ -2,43 +2,74 @@
 Helper functions for processing any acquired data of Fantano's reviews
 """
 
+import numpy as np
 import os
 import pandas as pd
-import requests
 import sys
 
 from ast import literal_eval
-from io import BytesIO
-from PIL import Image
+from itertools import chain
+from typing import Iterable, Iterator
+
+from utils.profiling import timed
+from utils.text_normalization import sanitize_filename, search_name
 
 package_root_dir = os.path.join(os.getcwd(), "..")
 sys.path.append(package_root_dir)
 
-def process_scraped_data(scraped_data: list) -> list:
+MELONDY_COLUMN_DTYPES = {
+    'artist': 'str',
+    'album': 'str',
+    'image_url': 'str',
+    'rating': 'int64',
+}
+
+def read_melondy_csv(file_name: str) -> pd.DataFrame:
+    """
+        Reads a melondy CSV without turning artist or album names such as "None" or "NaN" into missing values.
+    """
+    return pd.read_csv(file_name, dtype=MELONDY_COLUMN_DTYPES, keep_default_na=False, na_values=[''])
+
+def iter_melondy_csv_chunks(file_name: str, chunksize: int = 10_000, usecols=None) -> Iterator[pd.DataFrame]:
+    """
+        Reads a melondy CSV chunksize rows at a time, with the same parsing as read_melondy_csv,
+        so that only one chunk is in memory at once.
+    """
+    with pd.read_csv(
+        file_name, dtype=MELONDY_COLUMN_DTYPES, keep_default_na=False, na_values=[''], chunksize=chunksize, usecols=usecols
+    ) as reader:
+        yield from reader
+
+@timed()
+def process_scraped_data(scraped_data: Iterable[dict]) -> list:
     """
         An archived function that helped process album reviews straight from theneedledrop.com.
         Given a list of URLs, we only want to scrape the ones that indicated it was one that had the album review
         script and with a numerical score to scrape.
     """
-    processed_data = []
-    for i in range(len(scraped_data)):
-        if scraped_data[i]['url'].endswith("album-review/"):
-            processed_data.append(scraped_data[i])
-    return processed_data
+    return [review for review in scraped_data if review['url'].endswith("album-review/")]
 
-def sanitize_filename(filename: str) -> str:
+def process_scraped_shard(shard_path: str) -> list:
     """
-        Removes any invalid characters from a filename.
+        process_scraped_data over one shard of a crawl archive, for CrawlArchive.map_shards.
     """
-    for banned_char in '<>:"/|?*\\':
-        filename = filename.replace(banned_char, "_")
-    return filename
+    from utils.crawl_archive import iter_shard
+
+    return process_scraped_data(iter_shard(shard_path))
 
-def process_image(artist_name, album_name, original_image_path, rating, train=True):
+@timed()
+def process_image(artist_name, album_name, original_image_path, rating, train=True, output_dir=None):
     """
         Processes an album image from melondy.com to be of the torchvision.datasets.ImageFolder
         format, where ratings are directories and [artist_name]___[album_name].jpg is the filename.
+        The album_ImageFolder is created under output_dir, or the current working directory if None.
     """
+    # only the image pipeline needs these, everything else imports this module without paying for them
+    import requests
+
+    from io import BytesIO
+    from PIL import Image
+
     try:
         if original_image_path is not None:
             train_folder = "train" if train else "test"
@@ -46,7 +77,7 @@ def process_image(artist_name, album_name, original_image_path, rating, train=Tr
             response = requests.get(original_image_path)
             img = Image.open(BytesIO(response.content))
             album_image_filename = sanitize_filename(f"{artist_name}___{album_name}{extension}")
-            new_file = os.path.join(os.getcwd(), "album_ImageFolder", train_folder, f"{rating}", album_image_filename)
+            new_file = os.path.join(output_dir or os.getcwd(), "album_ImageFolder", train_folder, f"{rating}", album_image_filename)
             os.makedirs(os.path.dirname(new_file), exist_ok=True)
             if img.format == 'PNG':
                 # and is not RGBA
@@ -57,34 +88,51 @@ def process_image(artist_name, album_name, original_image_path, rating, train=Tr
         print(f"{artist_name}'s {album_name} had an issue with retrieving album cover.")
         print(e)
 
-def process_image_series(s, train=True):
+def process_image_series(s, train=True, output_dir=None):
     """
         Process all the images in the melondy dataset.
     """
-    return process_image(s["artist"], s["album"], s["image_url"], s["rating"], train=train)
+    return process_image(s["artist"], s["album"], s["image_url"], s["rating"], train=train, output_dir=output_dir)
 
 def clean_name(name: str):
     """
-        Removes any unwanted characters from album names scraped from melondy.com.
+        Removes any unwanted characters from album names scraped from melondy.com, see search_name in
+        utils/text_normalization.py.
     """
-    name = name.replace("’", "'") # remove right side smart apostrophes and replace with single quote
-    name = name.replace('•', '') # remove bullet points as they don't show up on spotify album titles
-    name = name.replace('“', '"') # replace left double quotation mark with regular double quote
-    name = name.replace('”', '"') # replace right double quotation mark with regular double quote
-    name = name.replace("'", "") # remove any single quotes because spotify uses fuzzy search and we don't want to URL encode unnecessarily
-    return name
+    return search_name(name)
 
+def count_genres(genre_lists: pd.Series) -> dict[str, int]:
+    """
+        Counts how many albums carry each genre, given already parsed genre lists.
+    """
+    genre_counts = {}
+    for genre_list in genre_lists:
+        for genre in genre_list:
+            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    return genre_counts
+
+def encode_genre_dummies(genre_lists: pd.Series, genres: list[str]) -> pd.DataFrame:
+    """
+        One-hot encodes already parsed genre lists into is_<genre> columns for the given genres, in one vectorized pass.
+    """
+    genre_lengths = genre_lists.map(len).to_numpy()
+    row_positions = np.repeat(np.arange(len(genre_lists)), genre_lengths)
+    genre_codes = pd.Categorical(list(chain.from_iterable(genre_lists)), categories=genres).codes
+    known = genre_codes >= 0
+    genre_flags = np.zeros((len(genre_lists), len(genres)), dtype=bool)
+    genre_flags[row_positions[known], genre_codes[known]] = True
+    return pd.DataFrame(genre_flags, columns=[f"is_{genre}" for genre in genres], index=genre_lists.index)
+
+@timed()
 def process_melondy_genre(melondy_df: pd.DataFrame, top_K_pct: float = 1.0):
     """
         Takes the raw melondy data extraction and creates genre dummies.
         Keeps only the top K percent of represented genres in the pool.
     """
 
-    # get the genre counts
-    genre_counts = {}
-    for genre_list in melondy_df["genre"]:
-        for genre in literal_eval(genre_list):
-            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    # parse every genre list once, and get the genre counts
+    genre_lists = melondy_df["genre"].map(literal_eval)
+    genre_counts = count_genres(genre_lists)
 
     # create the genre counts dataframe
     genre_counts_df = pd.DataFrame({'count': genre_counts.values()}, index=genre_counts.keys())
@@ -98,8 +146,28 @@ def process_melondy_genre(melondy_df: pd.DataFrame, top_K_pct: float = 1.0):
     filtered_genre_counts_df = genre_counts_df[genre_counts_df["count"] >= min_count].copy(deep=True)
 
     # create the categorical features
-    for genre in filtered_genre_counts_df.index:
-        melondy_df[f"is_{genre}"] = melondy_df["genre"].apply(lambda x: genre in literal_eval(x))
+    genre_dummies = encode_genre_dummies(genre_lists, list(filtered_genre_counts_df.index))
+    melondy_df[list(genre_dummies.columns)] = genre_dummies
     melondy_df.drop(["genre"], axis=1, inplace=True)
 
-    return melondy_df
\ No newline at end of file
+    return melondy_df
+
+def get_genre_columns(melondy_df: pd.DataFrame) -> list[str]:
+    """
+        Returns the genre dummy columns created by process_melondy_genre.
+    """
+    return [column for column in melondy_df.columns if column.startswith("is_")]
+
+def collapse_genre_dummies(melondy_df: pd.DataFrame, separator: str = "|") -> pd.Series:
+    """
+        Collapses the is_<genre> dummy columns back into a single string per album
+        (e.g. "Hip Hop|Jazz Rap"), so models with native categorical support can use the genre list directly.
+    """
+    genre_columns = get_genre_columns(melondy_df)
+    genre_names = [column[len("is_"):] for column in genre_columns]
+    genre_flags = melondy_df[genre_columns].fillna(False).astype(bool).to_numpy()
+    return pd.Series(
+        [separator.join(name for name, flag in zip(genre_names, row) if flag) for row in genre_flags],
+        index=melondy_df.index,
+        name="genres",
+    )
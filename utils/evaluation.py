@@ -0,0 +1,236 @@
+"""
+Repeated-split evaluation of FantAInoFitter models. One train_test_split makes the accuracy of a model swing by
+a few points from run to run, so models are compared over many seeded splits instead: stratified shuffle splits
+or repeated stratified k-fold, with the (model, split) fits run in a process pool.
+
+The dataset is pickled once to cache_dir, keyed by its hash, and every worker process loads it once and slices
+its splits out of it, instead of every task pickling its own train and test frames. Each split also scores the
+majority class baseline (the most common training rating, predicted for every test album).
+
+The report has the mean accuracy and MAE of every model over the splits, with percentile bootstrap confidence
+intervals of the mean, drawn for all models and metrics at once.
+
+Usage (from the repository root):
+    python -m utils.evaluation data/processed/melondy_and_spotify.csv --n-repeats 20
+"""
+
+import argparse
+import copy
+import numpy as np
+import os
+import pandas as pd
+import pickle
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+
+from models.fantaino_base import FantAInoFitter
+from utils.profiling import span
+from utils.results_store import dataset_hash
+
+BASELINE_MODEL_NAME = "majority_baseline"
+METRICS = ("accuracy", "mae")
+_DEFAULT_CACHE_DIR = os.path.join("results", "evaluation_cache")
+# the dataset of each cache file, loaded once per worker process
+_loaded_datasets = {}
+
+
+def repeated_splits(
+    response_data: pd.Series,
+    n_repeats: int = 10,
+    n_splits: int | None = None,
+    test_size: float = 0.25,
+    random_state: int = 0,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+        Seeded stratified (train rows, test rows) splits.
+
+        Args:
+            response_data: the ratings to stratify on.
+            n_repeats: how many times to split.
+            n_splits: with a number of folds, n_repeats stratified k-folds (n_repeats * n_splits splits), otherwise
+                n_repeats stratified shuffle splits.
+            test_size: the test fraction of the shuffle splits.
+            random_state: the seed, so every model is scored on the same splits.
+    """
+    from sklearn.model_selection import RepeatedStratifiedKFold, StratifiedShuffleSplit
+
+    if n_splits is None:
+        splitter = StratifiedShuffleSplit(n_splits=n_repeats, test_size=test_size, random_state=random_state)
+    else:
+        splitter = RepeatedStratifiedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=random_state)
+    y = np.asarray(response_data)
+    return list(splitter.split(np.zeros((len(y), 1)), y))
+
+
+def cache_dataset(input_data: pd.DataFrame, response_data: pd.Series, cache_dir: str = _DEFAULT_CACHE_DIR) -> str:
+    """
+        Pickles the dataset to cache_dir unless it's already there. Returns the cache file.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    file_name = os.path.join(cache_dir, f"{dataset_hash(input_data, response_data)}.pkl")
+    if not os.path.exists(file_name):
+        tmp_file_name = f"{file_name}.tmp"
+        with open(tmp_file_name, "wb") as f:
+            pickle.dump((input_data, pd.Series(np.asarray(response_data), index=input_data.index)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, file_name)
+    return file_name
+
+
+def _load_dataset(file_name: str) -> tuple[pd.DataFrame, pd.Series]:
+    if file_name not in _loaded_datasets:
+        with open(file_name, "rb") as f:
+            _loaded_datasets[file_name] = pickle.load(f)
+    return _loaded_datasets[file_name]
+
+
+def _majority_predictions(y_train: np.ndarray, num_predictions: int) -> np.ndarray:
+    ratings, counts = np.unique(y_train, return_counts=True)
+    return np.full(num_predictions, ratings[np.argmax(counts)])
+
+
+def _scores(y_true: np.ndarray, predictions: np.ndarray) -> dict[str, float]:
+    return {"accuracy": float(np.mean(y_true == predictions)), "mae": float(np.mean(np.abs(y_true - predictions)))}
+
+
+def _evaluate_split(dataset_file_name: str, model_name: str, fitter: FantAInoFitter | None, split: int,
+                    train_rows: np.ndarray, test_rows: np.ndarray, n_threads: int | None) -> dict:
+    """
+        Trains and scores one model on one split, in a worker process. fitter None is the majority baseline.
+    """
+    input_data, response_data = _load_dataset(dataset_file_name)
+    y_train, y_test = response_data.to_numpy()[train_rows], response_data.to_numpy()[test_rows]
+    start = time.perf_counter()
+    if fitter is None:
+        predictions = _majority_predictions(y_train, len(test_rows))
+    else:
+        # the pool's tasks get pickled copies, evaluating in this process must not retrain the caller's fitter
+        fitter = copy.deepcopy(fitter)
+        # every worker gets n_threads BLAS threads, so the pool doesn't oversubscribe the cores
+        with threadpool_limits(limits=n_threads):
+            fitter.train(input_data.iloc[train_rows], response_data.iloc[train_rows])
+            predictions = np.asarray(fitter.predict(input_data.iloc[test_rows]))
+    return {"model": model_name, "split": split, "time_in_s": time.perf_counter() - start, **_scores(y_test, predictions)}
+
+
+def bootstrap_ci(
+    values: np.ndarray,
+    n_bootstrap: int = 10_000,
+    confidence: float = 0.95,
+    random_state: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+        Percentile bootstrap confidence intervals of the mean of every column of values (one row per split),
+        from one (n_bootstrap, n_rows) draw of resampled rows shared by all the columns.
+
+        Returns:
+            The lower and upper bounds, one per column.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[:, None] if values.ndim == 1 else values
+    rng = np.random.default_rng(random_state)
+    resampled_rows = rng.integers(0, values.shape[0], size=(n_bootstrap, values.shape[0]))
+    # (n_bootstrap, n_rows, n_columns) -> the mean of every resample and column
+    resampled_means = values[resampled_rows].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(resampled_means, [alpha, 1 - alpha], axis=0)
+    return lower, upper
+
+
+def summarize(split_results: pd.DataFrame, n_bootstrap: int = 10_000, confidence: float = 0.95, random_state: int = 0) -> pd.DataFrame:
+    """
+        One row per model: the mean, standard deviation and bootstrap confidence interval of every metric over
+        the splits, and the mean time per split.
+    """
+    # every model is scored on the same splits: (split, model x metric), bootstrapped in one draw
+    metric_values = split_results.pivot(index="split", columns="model", values=list(METRICS))
+    lower, upper = bootstrap_ci(metric_values.to_numpy(), n_bootstrap=n_bootstrap, confidence=confidence, random_state=random_state)
+    bounds = {column: (column_lower, column_upper) for column, column_lower, column_upper in zip(metric_values.columns, lower, upper)}
+    rows = []
+    for model_name, model_results in split_results.groupby("model", sort=False):
+        row = {"model": model_name, "n_splits": len(model_results)}
+        for metric in METRICS:
+            values = model_results[metric].to_numpy()
+            metric_lower, metric_upper = bounds[metric, model_name]
+            row.update({metric: values.mean(), f"{metric}_std": values.std(), f"{metric}_ci_low": metric_lower, f"{metric}_ci_high": metric_upper})
+        row["time_in_s"] = model_results["time_in_s"].mean()
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def evaluate_repeated(
+    fitters: dict[str, FantAInoFitter],
+    input_data: pd.DataFrame,
+    response_data: pd.Series,
+    n_repeats: int = 10,
+    n_splits: int | None = None,
+    test_size: float = 0.25,
+    random_state: int = 0,
+    max_workers: int | None = None,
+    n_threads: int | None = 1,
+    cache_dir: str = _DEFAULT_CACHE_DIR,
+    n_bootstrap: int = 10_000,
+    confidence: float = 0.95,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+        Evaluates every fitter, and the majority class baseline, on the same seeded splits in a process pool.
+
+        Args:
+            fitters: model name -> an untrained FantAInoFitter, copied to the workers for every split.
+            input_data: the dataset, as the fitters' train and predict take it.
+            response_data: the ratings.
+            n_repeats, n_splits, test_size, random_state: the splits, see repeated_splits.
+            max_workers: the size of the process pool, None for one per core, 1 to evaluate in this process.
+            n_threads: the BLAS threads of each fit.
+            cache_dir: where the dataset is cached for the workers.
+            n_bootstrap, confidence: the bootstrap confidence intervals, see bootstrap_ci.
+
+        Returns:
+            The summary, one row per model (see summarize), and the per-split scores.
+    """
+    splits = repeated_splits(response_data, n_repeats=n_repeats, n_splits=n_splits, test_size=test_size, random_state=random_state)
+    dataset_file_name = cache_dataset(input_data, response_data, cache_dir=cache_dir)
+    models = {BASELINE_MODEL_NAME: None, **fitters}
+    tasks = [
+        (dataset_file_name, model_name, fitter, split, train_rows, test_rows, n_threads)
+        for model_name, fitter in models.items()
+        for split, (train_rows, test_rows) in enumerate(splits)
+    ]
+    with span("evaluation.evaluate_repeated"):
+        if max_workers == 1:
+            split_results = [_evaluate_split(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                split_results = list(executor.map(_evaluate_split, *zip(*tasks)))
+    split_results = pd.DataFrame(split_results)
+    return summarize(split_results, n_bootstrap=n_bootstrap, confidence=confidence, random_state=random_state), split_results
+
+
+def main(argv: list[str] | None = None):
+    from models.ordinal_logistic_regression import FantAInoOrdinalRegressor
+    from models.streaming_regressor import FantAInoStreamingRegressor
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", help="the processed dataset CSV, with a rating column")
+    parser.add_argument("--n-repeats", type=int, default=10)
+    parser.add_argument("--n-splits", type=int, default=None, help="repeated k-fold with this many folds")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--output", default=os.path.join("results", "evaluation.csv"))
+    args = parser.parse_args(argv)
+
+    dataset = pd.read_csv(args.dataset).dropna()
+    fitters = {
+        "ordinal_logistic_regression": FantAInoOrdinalRegressor(random_state=0),
+        "streaming_ordinal": FantAInoStreamingRegressor(loss="ordinal", random_state=0),
+    }
+    summary, _ = evaluate_repeated(
+        fitters, dataset.drop(columns=["rating"]), dataset["rating"],
+        n_repeats=args.n_repeats, n_splits=args.n_splits, max_workers=args.max_workers,
+    )
+    print(summary.to_string(index=False))
+    summary.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
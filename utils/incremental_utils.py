@@ -0,0 +1,109 @@
+"""
+Append/merge mode for the processed dataset. When a handful of new reviews land, only the albums that aren't
+in the existing processed dataset yet are sent to Spotify. Every other row keeps the Spotify features it
+already has, and the genre dummies come from the (cheap, vectorized) genre encoding of the full melondy
+dataset, so genres that newly pass the top K percent threshold get their column for every row. Albums whose
+Spotify lookup failed on an earlier run (every Spotify feature empty) count as new, so they are looked up again.
+
+The reused Spotify features are read back as the text they were written as, so a reused row is written out
+exactly as a full rebuild would write it (e.g. a release_month of "03" doesn't come back as "3.0").
+"""
+
+import os
+import pandas as pd
+import tempfile
+
+from typing import Callable
+
+from utils.data_utils import MELONDY_COLUMN_DTYPES, read_melondy_csv
+from utils.profiling import timed
+from utils.spotify_utils import SPOTIFY_FEATURE_NAMES, enrich_with_spotify
+
+ALBUM_KEY = ["artist", "album"]
+
+
+def read_processed_csv(file_name: str, enriched_columns: list[str] = SPOTIFY_FEATURE_NAMES) -> pd.DataFrame:
+    """
+        Reads the processed dataset like read_melondy_csv, but with the enriched columns left as strings.
+    """
+    dtypes = {**MELONDY_COLUMN_DTYPES, **{column: "str" for column in enriched_columns}}
+    return pd.read_csv(file_name, dtype=dtypes, keep_default_na=False, na_values=[''])
+
+
+def find_new_albums(melondy_df: pd.DataFrame, processed_df: pd.DataFrame) -> pd.Series:
+    """
+        Returns a boolean mask over melondy_df of the rows whose (artist, album) isn't in processed_df.
+    """
+    known_keys = pd.MultiIndex.from_frame(processed_df[ALBUM_KEY])
+    return pd.Series(~pd.MultiIndex.from_frame(melondy_df[ALBUM_KEY]).isin(known_keys), index=melondy_df.index)
+
+
+@timed()
+def merge_enriched(
+    melondy_df: pd.DataFrame,
+    processed_df: pd.DataFrame,
+    enrich_fn: Callable[[pd.DataFrame], pd.DataFrame] = enrich_with_spotify,
+    enriched_columns: list[str] = SPOTIFY_FEATURE_NAMES,
+) -> tuple[pd.DataFrame, int]:
+    """
+        Enriches melondy_df, reusing the enriched columns of processed_df for albums it already has.
+
+        Args:
+            melondy_df: the genre encoded melondy dataset, with every album that should end up in the result.
+            processed_df: the existing processed dataset, as read by read_processed_csv. Rows whose enriched
+                columns are all empty are enriched again.
+            enrich_fn: adds the enriched_columns to a dataframe of new albums.
+            enriched_columns: the columns enrich_fn adds.
+
+        Returns:
+            The merged dataset, in the row and column order a full rebuild would give, and the number of new albums.
+    """
+    # albums the last run couldn't enrich are retried
+    processed_df = processed_df[processed_df[enriched_columns].notna().any(axis=1)]
+    is_new = find_new_albums(melondy_df, processed_df)
+    known_df = processed_df[ALBUM_KEY + enriched_columns].drop_duplicates(ALBUM_KEY)
+
+    known_rows_df = melondy_df[~is_new]
+    known_rows_df = known_rows_df.merge(known_df, on=ALBUM_KEY, how="left").set_index(known_rows_df.index)
+    merged_df = known_rows_df
+    num_new_albums = int(is_new.sum())
+    if num_new_albums:
+        new_rows_df = enrich_fn(melondy_df[is_new])
+        merged_df = pd.concat([known_rows_df, new_rows_df[known_rows_df.columns]]).loc[melondy_df.index]
+    return merged_df, num_new_albums
+
+
+def write_csv_atomically(df: pd.DataFrame, file_name: str):
+    """
+        Writes df next to file_name first and then swaps it in, so readers never see a half written file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_name))
+    file_descriptor, temporary_file_name = tempfile.mkstemp(suffix=".csv.tmp", dir=directory)
+    try:
+        with os.fdopen(file_descriptor, "w", encoding="utf-8", newline="") as f:
+            df.to_csv(f, index=False)
+        os.replace(temporary_file_name, file_name)
+    except BaseException:
+        os.remove(temporary_file_name)
+        raise
+
+
+def update_processed_dataset(
+    melondy_genres_file_name: str,
+    processed_file_name: str,
+    enrich_fn: Callable[[pd.DataFrame], pd.DataFrame] = enrich_with_spotify,
+) -> int:
+    """
+        Brings processed_file_name up to date with melondy_genres_file_name, only enriching new albums.
+        Does a full enrichment if the processed dataset doesn't exist yet.
+
+        Returns:
+            The number of albums that were enriched.
+    """
+    melondy_df = read_melondy_csv(melondy_genres_file_name)
+    if os.path.exists(processed_file_name):
+        merged_df, num_new_albums = merge_enriched(melondy_df, read_processed_csv(processed_file_name), enrich_fn=enrich_fn)
+    else:
+        merged_df, num_new_albums = enrich_fn(melondy_df), melondy_df.shape[0]
+    write_csv_atomically(merged_df, processed_file_name)
+    return num_new_albums
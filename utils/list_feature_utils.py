@@ -0,0 +1,158 @@
+"""
+Sparse features from the featured_artists and track_names list columns, which the models otherwise drop.
+
+    featured artists are hashed by name into a fixed number of columns, one column per (bucket of) artist,
+    track names are split into words and hashed the same way,
+    the artist collaboration graph (main artist <-> featured artist, from the training albums) gives a few
+    dense statistics per album: how many collaborators the main artist has, how connected the featured artists
+    are, and how large the main artist's collaboration cluster is.
+
+The hashing keeps the number of columns fixed no matter how many distinct artists or words there are, and the
+output is a scipy CSR matrix, which RandomForestRegressor and KNeighborsRegressor take as is.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.utils import murmurhash3_32
+
+from utils.memory_utils import OffsetListColumn
+
+LIST_FEATURE_COLUMNS = ["artist", "featured_artists", "track_names"]
+GRAPH_FEATURE_NAMES = [
+    "collab_main_artist_degree",
+    "collab_mean_featured_degree",
+    "collab_num_featured_reviewed",
+    "collab_component_size",
+]
+
+
+def _normalize_artist(name: str) -> str:
+    return name.strip().casefold()
+
+
+class ListColumnFeaturizer(TransformerMixin, BaseEstimator):
+    """
+        Turns the artist, featured_artists and track_names columns into one sparse matrix.
+
+        Args:
+            n_artist_features: the number of hashed featured artist columns.
+            n_track_name_features: the number of hashed track name word columns.
+            graph_features: whether to append the collaboration graph statistics.
+    """
+
+    def __init__(self, n_artist_features: int = 2 ** 10, n_track_name_features: int = 2 ** 10, graph_features: bool = True):
+        self.n_artist_features = n_artist_features
+        self.n_track_name_features = n_track_name_features
+        self.graph_features = graph_features
+
+    def _hash_featured_artists(self, featured_artists: OffsetListColumn) -> sparse.csr_matrix:
+        # hash every distinct name once, then every row's items are a lookup
+        vocabulary_buckets = np.fromiter(
+            (murmurhash3_32(_normalize_artist(featured_artists.vocabulary[i]), positive=True) % self.n_artist_features
+             for i in range(len(featured_artists.vocabulary))),
+            dtype=np.int32,
+            count=len(featured_artists.vocabulary),
+        )
+        matrix = sparse.csr_matrix(
+            (np.ones(featured_artists.codes.shape[0], dtype=np.float32), vocabulary_buckets[featured_artists.codes], featured_artists.offsets),
+            shape=(len(featured_artists), self.n_artist_features),
+        )
+        # an artist featured on several tracks still counts once
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    def _hash_track_names(self, track_names: pd.Series) -> sparse.csr_matrix:
+        vectorizer = HashingVectorizer(
+            n_features=self.n_track_name_features, alternate_sign=False, norm=None, binary=True, dtype=np.float32
+        )
+        # the literal strings are already one document per album, the quotes and commas tokenize away
+        return vectorizer.transform(track_names.fillna("")).tocsr()
+
+    def _artist_lists(self, X: pd.DataFrame) -> tuple[np.ndarray, OffsetListColumn, list[list[str]]]:
+        main_artists = np.array([_normalize_artist(name) for name in X["artist"].astype(str)], dtype=object)
+        featured_artists = OffsetListColumn.from_literals(X["featured_artists"])
+        featured_lists = [
+            [_normalize_artist(featured_artists.vocabulary[code]) for code in featured_artists.codes[start:end]]
+            for start, end in zip(featured_artists.offsets[:-1], featured_artists.offsets[1:])
+        ]
+        return main_artists, featured_artists, featured_lists
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """
+            Builds the collaboration graph of the training albums.
+        """
+        if not self.graph_features:
+            return self
+        main_artists, _, featured_lists = self._artist_lists(X)
+        artists = pd.Index(pd.unique(np.concatenate([main_artists, [name for names in featured_lists for name in names]])))
+        sources = np.repeat(artists.get_indexer(main_artists), [len(names) for names in featured_lists])
+        targets = artists.get_indexer([name for names in featured_lists for name in names])
+        # the lead artist is usually listed among the track artists too, that's not a collaboration
+        keep = sources != targets
+        adjacency = sparse.coo_matrix(
+            (np.ones(keep.sum(), dtype=np.float32), (sources[keep], targets[keep])), shape=(len(artists), len(artists))
+        ).tocsr()
+        adjacency = ((adjacency + adjacency.T) > 0).astype(np.float32)
+        _, component_labels = connected_components(adjacency, directed=False)
+
+        self.artists_ = artists
+        self.degrees_ = np.diff(adjacency.indptr)
+        self.component_sizes_ = np.bincount(component_labels)[component_labels]
+        self.reviewed_artists_ = set(main_artists)
+        return self
+
+    def _graph_features(self, main_artists: np.ndarray, featured_lists: list[list[str]]) -> np.ndarray:
+        # as in fit, the lead artist listed among the track artists isn't one of the featured artists, otherwise
+        # every training album would count its own (reviewed) artist and unseen test artists wouldn't
+        featured_lists = [[name for name in names if name != main_artist] for main_artist, names in zip(main_artists, featured_lists)]
+        main_positions = self.artists_.get_indexer(main_artists)
+        known_main = main_positions >= 0
+        main_degree = np.where(known_main, self.degrees_[main_positions], 0)
+        component_size = np.where(known_main, self.component_sizes_[main_positions], 1)
+
+        lengths = np.array([len(names) for names in featured_lists])
+        featured_positions = self.artists_.get_indexer([name for names in featured_lists for name in names])
+        featured_degrees = np.where(featured_positions >= 0, self.degrees_[featured_positions], 0)
+        rows = np.repeat(np.arange(len(featured_lists)), lengths)
+        degree_sums = np.bincount(rows, weights=featured_degrees, minlength=len(featured_lists))
+        mean_featured_degree = np.divide(degree_sums, lengths, out=np.zeros(len(featured_lists)), where=lengths > 0)
+        is_reviewed = np.fromiter(
+            (name in self.reviewed_artists_ for names in featured_lists for name in names), dtype=float, count=rows.shape[0]
+        )
+        num_featured_reviewed = np.bincount(rows, weights=is_reviewed, minlength=len(featured_lists))
+        return np.column_stack([main_degree, mean_featured_degree, num_featured_reviewed, component_size]).astype(np.float32)
+
+    def transform(self, X: pd.DataFrame) -> sparse.csr_matrix:
+        main_artists, featured_artists, featured_lists = self._artist_lists(X)
+        blocks = [self._hash_featured_artists(featured_artists), self._hash_track_names(X["track_names"])]
+        if self.graph_features:
+            blocks.append(sparse.csr_matrix(self._graph_features(main_artists, featured_lists)))
+        return sparse.hstack(blocks, format="csr", dtype=np.float32)
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        names = [f"featured_artist_hash_{i}" for i in range(self.n_artist_features)]
+        names += [f"track_name_hash_{i}" for i in range(self.n_track_name_features)]
+        if self.graph_features:
+            names += GRAPH_FEATURE_NAMES
+        return np.array(names, dtype=object)
+
+
+def make_list_feature_transformer(numeric_columns: list[str], **featurizer_kwargs) -> ColumnTransformer:
+    """
+        A ColumnTransformer that passes numeric_columns through and adds the list column features, always
+        returning a sparse matrix so the hashed columns are never densified.
+    """
+    return ColumnTransformer(
+        [
+            ("numeric", "passthrough", numeric_columns),
+            ("lists", ListColumnFeaturizer(**featurizer_kwargs), LIST_FEATURE_COLUMNS),
+        ],
+        sparse_threshold=1.0,
+    )
@@ -0,0 +1,292 @@
+"""
+Lyrics ingestion from Genius and album-level text features for the models.
+
+Fetching: every (artist, album, track) of the processed dataset is searched on the Genius API, and the lyrics are
+scraped from the song page it points to. Tracks are fetched concurrently and rate limited, and every result is
+appended to a gzip-compressed jsonlines store as soon as it arrives. Tracks already in the store are skipped, so an
+interrupted run picks up where it left off and re-running costs nothing. Tracks Genius has no lyrics for are stored
+with empty lyrics so they aren't searched again.
+
+Features: the lyrics of an album's tracks are joined into one document, and all documents are vectorized in one
+batch: hashed TF-IDF (fixed size, no vocabulary kept in memory, IDF weights fit on the training albums only) plus
+vocabulary richness measures read off the same sparse count matrix. models/knn_regressor.py adds them to its
+features with USE_LYRICS_FEATURES.
+
+Set GENIUS_ACCESS_TOKEN in the .env file. To test against a local stub server, pass base_url (and any token);
+the stub serves /search?q=... like the Genius API and the song pages its results link to (see tests/test_lyrics_utils.py).
+
+Usage (from the repository root):
+    python -m utils.lyrics_utils data/processed/melondy_and_spotify.csv data/processed/lyrics.jsonl.gz
+"""
+
+import gzip
+import json
+import numpy as np
+import os
+import pandas as pd
+import re
+import requests
+import sys
+import threading
+import zlib
+
+from ast import literal_eval
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from typing import Iterator, NamedTuple
+
+from utils.profiling import span, timed
+from utils.rate_limiter import RateLimiter
+from utils.text_normalization import normalize_text
+
+GENIUS_API_URL = "https://api.genius.com"
+LYRICS_KEY = ["artist", "album", "track"]
+TOKEN_PATTERN = r"(?u)\b\w[\w']*\b"
+# "Song (feat. Someone)", "Song - 2011 Remaster", "Song [Bonus Track]"
+_TRACK_NAME_SUFFIX = re.compile(r"\s*(?:[(\[](?:feat|ft|with|bonus)[^)\]]*[)\]]|[-–—]\s.*(?:remaster|version|edit|mix).*)$", re.IGNORECASE)
+# section headers like [Chorus] or [Verse 1: Artist]
+_SECTION_HEADER = re.compile(r"^\[[^\]]*\]$", re.MULTILINE)
+
+
+class TrackLyrics(NamedTuple):
+    """
+        artist, album, track: the track as named in the processed dataset.
+        lyrics: the lyrics, "" if Genius has none.
+        url: the Genius song page the lyrics came from, None if no song matched.
+    """
+    artist: str
+    album: str
+    track: str
+    lyrics: str
+    url: str | None
+
+
+def clean_track_name(track_name: str) -> str:
+    """
+        Strips featured artists and remaster/version suffixes, which Genius titles usually don't have.
+    """
+    track_name = normalize_text(track_name)
+    return _TRACK_NAME_SUFFIX.sub("", track_name).strip() or track_name
+
+
+class GeniusClient:
+    """
+        Searches Genius for a track and scrapes its lyrics. Each thread gets its own requests session.
+
+        Args:
+            access_token: Genius API token, read from GENIUS_ACCESS_TOKEN if None.
+            base_url: the API root, e.g. a local stub server.
+            timeout_in_s: timeout of every request.
+    """
+
+    def __init__(self, access_token: str | None = None, base_url: str = GENIUS_API_URL, timeout_in_s: float = 20):
+        load_dotenv()
+        self.access_token = access_token or os.getenv("GENIUS_ACCESS_TOKEN")
+        if self.access_token is None:
+            raise ValueError("Set GENIUS_ACCESS_TOKEN or pass access_token.")
+        self.base_url = base_url.rstrip("/")
+        self.timeout_in_s = timeout_in_s
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["Authorization"] = f"Bearer {self.access_token}"
+        return self._local.session
+
+    def search_song_url(self, artist_name: str, track_name: str) -> str | None:
+        """
+            The URL of the first song hit whose primary artist matches, None if there is none.
+        """
+        response = self.session.get(
+            f"{self.base_url}/search", params={"q": f"{artist_name} {track_name}"}, timeout=self.timeout_in_s
+        )
+        response.raise_for_status()
+        wanted_artist = artist_name.casefold()
+        for hit in response.json()["response"]["hits"]:
+            result = hit.get("result", {})
+            hit_artist = result.get("primary_artist", {}).get("name", "").casefold()
+            # "Silk Sonic" albums can be credited to "Bruno Mars & Anderson .Paak & Silk Sonic" and the other way around
+            if hit.get("type") == "song" and hit_artist and (hit_artist in wanted_artist or wanted_artist in hit_artist):
+                return result["url"]
+        return None
+
+    def fetch_song_lyrics(self, song_url: str) -> str:
+        """
+            Scrapes the lyrics from a Genius song page, without the [Chorus]-style section headers.
+        """
+        response = self.session.get(song_url, timeout=self.timeout_in_s)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+        containers = soup.select('[data-lyrics-container="true"]')
+        lyrics = "\n".join(container.get_text("\n") for container in containers)
+        return _SECTION_HEADER.sub("", lyrics).strip()
+
+    def get_track_lyrics(self, artist_name: str, album_name: str, track_name: str) -> TrackLyrics:
+        song_url = self.search_song_url(artist_name, clean_track_name(track_name))
+        lyrics = self.fetch_song_lyrics(song_url) if song_url is not None else ""
+        return TrackLyrics(artist_name, album_name, track_name, lyrics, song_url)
+
+
+def _read_lyrics_store(store_file_name: str) -> tuple[list[TrackLyrics], bool]:
+    """
+        The tracks in a lyrics store, and whether the store ended cleanly.
+    """
+    tracks = []
+    if not os.path.exists(store_file_name):
+        return tracks, True
+    try:
+        with gzip.open(store_file_name, "rt", encoding="utf-8") as f:
+            for line in f:
+                tracks.append(TrackLyrics(**json.loads(line)))
+    except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError, UnicodeDecodeError):
+        # a run was killed mid-write, everything before that point is still good
+        return tracks, False
+    return tracks, True
+
+
+def iter_lyrics_store(store_file_name: str) -> Iterator[TrackLyrics]:
+    """
+        The tracks in a lyrics store. A record cut off by an interrupted run is left out.
+    """
+    yield from _read_lyrics_store(store_file_name)[0]
+
+
+def _rewrite_lyrics_store(tracks: list[TrackLyrics], store_file_name: str):
+    temporary_file_name = f"{store_file_name}.tmp"
+    with gzip.open(temporary_file_name, "wt", encoding="utf-8") as store:
+        for track_lyrics in tracks:
+            store.write(json.dumps(track_lyrics._asdict(), ensure_ascii=False) + "\n")
+    os.replace(temporary_file_name, store_file_name)
+
+
+def get_album_tracks(melondy_df: pd.DataFrame) -> list[tuple[str, str, str]]:
+    """
+        Every (artist, album, track) of the dataset, from the track_names literal lists.
+    """
+    tracks = []
+    for artist_name, album_name, track_names in zip(melondy_df["artist"], melondy_df["album"], melondy_df["track_names"]):
+        if isinstance(track_names, str):
+            tracks.extend((artist_name, album_name, track_name) for track_name in literal_eval(track_names))
+    return tracks
+
+
+@timed()
+def fetch_lyrics(
+    melondy_df: pd.DataFrame,
+    store_file_name: str,
+    client: GeniusClient | None = None,
+    max_workers: int = 8,
+    requests_per_second: float = 5.0,
+) -> dict[str, int]:
+    """
+        Fetches the lyrics of every track of the dataset that isn't in the store yet, appending them to the store.
+
+        Args:
+            melondy_df: the processed dataset, with artist, album and track_names columns.
+            store_file_name: the gzip-compressed jsonlines store, created if missing.
+            client: the Genius client, a default one if None.
+            max_workers: the number of concurrent requests.
+            requests_per_second: the maximum rate at which tracks are started (each is two requests).
+
+        Returns:
+            Counts of tracks already stored, fetched with lyrics, fetched without lyrics, and failed.
+    """
+    client = client or GeniusClient()
+    stored_tracks, intact = _read_lyrics_store(store_file_name)
+    if not intact:
+        # appending after a truncated gzip member would make the rest of the store unreadable
+        _rewrite_lyrics_store(stored_tracks, store_file_name)
+    stored_keys = {(track.artist, track.album, track.track) for track in stored_tracks}
+    pending = [track for track in dict.fromkeys(get_album_tracks(melondy_df)) if track not in stored_keys]
+    counts = {"stored": len(stored_keys), "fetched": 0, "no_lyrics": 0, "failed": 0}
+    rate_limiter = RateLimiter(requests_per_second)
+
+    def fetch(track: tuple[str, str, str]) -> TrackLyrics:
+        rate_limiter.wait()
+        return client.get_track_lyrics(*track)
+
+    os.makedirs(os.path.dirname(os.path.abspath(store_file_name)), exist_ok=True)
+    # appending adds a gzip member per run, which gzip reads back as one stream
+    with gzip.open(store_file_name, "at", encoding="utf-8") as store, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, track): track for track in pending}
+        for future in as_completed(futures):
+            try:
+                track_lyrics = future.result()
+            except requests.RequestException as e:
+                # not stored, so it is retried on the next run
+                print(f"{futures[future]} failed: {e}")
+                counts["failed"] += 1
+                continue
+            counts["fetched" if track_lyrics.lyrics else "no_lyrics"] += 1
+            store.write(json.dumps(track_lyrics._asdict(), ensure_ascii=False) + "\n")
+            store.flush()
+    return counts
+
+
+def load_album_lyrics(store_file_name: str) -> pd.DataFrame:
+    """
+        One row per album with the lyrics of all its tracks joined, and how many of its tracks have lyrics.
+    """
+    lyrics_df = pd.DataFrame(list(iter_lyrics_store(store_file_name)), columns=list(TrackLyrics._fields))
+    lyrics_df = lyrics_df.drop_duplicates(LYRICS_KEY, keep="last")
+    lyrics_df["has_lyrics"] = lyrics_df["lyrics"] != ""
+    return lyrics_df.groupby(["artist", "album"], sort=False).agg(
+        lyrics=("lyrics", "\n".join), num_tracks=("track", "size"), num_tracks_with_lyrics=("has_lyrics", "sum")
+    ).reset_index()
+
+
+@timed()
+def compute_lyrics_features(
+    melondy_df: pd.DataFrame, store_file_name: str, train_index: pd.Index, n_features: int = 2 ** 18
+) -> tuple[pd.DataFrame, sparse.csr_matrix]:
+    """
+        Album-level lyrics features, row aligned with melondy_df. Albums without stored lyrics get zeros.
+
+        Args:
+            melondy_df: the dataset to compute features for.
+            store_file_name: the lyrics store written by fetch_lyrics.
+            train_index: the labels of melondy_df's training rows. The IDF weights are fit on these rows only and
+                applied to every row, so the held out albums don't leak into them.
+            n_features: the number of hashed TF-IDF columns.
+
+        Returns:
+            The vocabulary richness features (lyrics_num_words, lyrics_num_unique_words, lyrics_type_token_ratio,
+            lyrics_words_per_track, lyrics_track_coverage), and the hashed TF-IDF matrix as a sparse CSR matrix.
+    """
+    with span("lyrics.load"):
+        album_lyrics_df = melondy_df[["artist", "album"]].merge(load_album_lyrics(store_file_name), on=["artist", "album"], how="left")
+    documents = album_lyrics_df["lyrics"].fillna("").str.lower()
+
+    with span("lyrics.vectorize"):
+        # raw counts first, the richness measures come off the same matrix as the TF-IDF
+        vectorizer = HashingVectorizer(n_features=n_features, token_pattern=TOKEN_PATTERN, alternate_sign=False, norm=None)
+        counts = vectorizer.transform(documents).tocsr()
+        is_train = melondy_df.index.isin(train_index)
+        tfidf = TfidfTransformer(sublinear_tf=True).fit(counts[is_train]).transform(counts).tocsr()
+
+    num_words = np.asarray(counts.sum(axis=1)).ravel()
+    # hash collisions make this an undercount of about n^2 / (2 * n_features) words for an album with n distinct
+    # words, around 1% for 5000 distinct words at the default 2^18 buckets (it would be 40% at 2^12)
+    num_unique_words = np.diff(counts.indptr)
+    num_tracks = album_lyrics_df["num_tracks"].fillna(0).to_numpy()
+    num_tracks_with_lyrics = album_lyrics_df["num_tracks_with_lyrics"].fillna(0).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        richness_df = pd.DataFrame({
+            "lyrics_num_words": num_words,
+            "lyrics_num_unique_words": num_unique_words,
+            "lyrics_type_token_ratio": np.where(num_words > 0, num_unique_words / num_words, 0.0),
+            "lyrics_words_per_track": np.where(num_tracks_with_lyrics > 0, num_words / num_tracks_with_lyrics, 0.0),
+            "lyrics_track_coverage": np.where(num_tracks > 0, num_tracks_with_lyrics / num_tracks, 0.0),
+        }, index=melondy_df.index)
+    return richness_df, tfidf
+
+
+if __name__ == "__main__":
+    from utils.data_utils import read_melondy_csv
+
+    print(fetch_lyrics(read_melondy_csv(sys.argv[1]), sys.argv[2]))
@@ -0,0 +1,258 @@
+"""
+A compact in-memory representation of the melondy tables (melondy.csv, melondy_and_spotify.csv).
+
+Loaded straight from CSV, the tables hold every artist and album as its own Python string, small integers such
+as total_tracks as float64, one byte per is_<genre> flag even though almost all of them are False, and every
+genre/featured_artists/track_names list as a Python-literal string. The compact form keeps
+    repeated strings as categoricals,
+    numeric columns downcast to the smallest type that holds them (float32 for fractional values),
+    genre flags bit-packed, eight albums' flags per byte,
+    list columns offset-encoded: one array of codes into a shared vocabulary plus one offset per row, with the
+    vocabulary itself stored as a single UTF-8 buffer plus offsets instead of one Python string per item.
+
+Usage:
+    python -m utils.memory_utils data/processed/melondy_and_spotify.csv
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+
+from ast import literal_eval
+from typing import NamedTuple
+
+from utils.data_utils import get_genre_columns, read_melondy_csv
+from utils.profiling import timed
+
+LIST_COLUMNS = ["genre", "featured_artists", "track_names"]
+# a string column becomes categorical when at most this share of its values are distinct
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+
+class PackedStrings:
+    """
+        Strings stored as one UTF-8 buffer, string i being buffer[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: list[str]) -> "PackedStrings":
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes + self.offsets.nbytes
+
+
+class OffsetListColumn:
+    """
+        A column of string lists. Row i is the vocabulary items at codes[offsets[i]:offsets[i + 1]], or None if missing[i].
+
+        Args:
+            codes: int32 positions into vocabulary, every row's items one after the other.
+            offsets: int64 array of len(rows) + 1 where each row's items start.
+            vocabulary: the distinct items.
+            missing: boolean array marking rows whose list was missing (e.g. albums Spotify couldn't find).
+    """
+
+    def __init__(self, codes: np.ndarray, offsets: np.ndarray, vocabulary: PackedStrings, missing: np.ndarray):
+        self.codes = codes
+        self.offsets = offsets
+        self.vocabulary = vocabulary
+        self.missing = missing
+
+    @classmethod
+    def from_literals(cls, literals: pd.Series) -> "OffsetListColumn":
+        """
+            Builds the column from Python-literal list strings as they are stored in the CSVs.
+        """
+        missing = literals.isna().to_numpy()
+        lists = [[] if is_missing else literal_eval(literal) for literal, is_missing in zip(literals, missing)]
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in lists], out=offsets[1:])
+        items = pd.Categorical([str(item) for items in lists for item in items])
+        return cls(items.codes.astype(np.int32), offsets, PackedStrings.from_strings(list(items.categories)), missing)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> list[str] | None:
+        if self.missing[i]:
+            return None
+        return [self.vocabulary[code] for code in self.codes[self.offsets[i]:self.offsets[i + 1]]]
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def take(self, positions: np.ndarray) -> "OffsetListColumn":
+        """
+            The rows at the given positions, e.g. to follow a .dropna() or a train/test split of the frame.
+        """
+        positions = np.asarray(positions)
+        lengths = self.lengths()[positions]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # position of every kept item in self.codes
+        item_positions = np.repeat(self.offsets[positions] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return OffsetListColumn(self.codes[item_positions], offsets, self.vocabulary, self.missing[positions])
+
+    def to_literals(self) -> pd.Series:
+        """
+            The column back as Python-literal list strings.
+        """
+        return pd.Series([None if self.missing[i] else str(self[i]) for i in range(len(self))], dtype=object)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.offsets.nbytes + self.missing.nbytes + self.vocabulary.nbytes
+
+
+class PackedGenreFlags:
+    """
+        The is_<genre> columns, bit-packed along the rows: packed[j] holds genre j's flag of every album,
+        eight albums per byte.
+    """
+
+    def __init__(self, packed: np.ndarray, genre_columns: list[str], num_rows: int):
+        self.packed = packed
+        self.genre_columns = genre_columns
+        self.num_rows = num_rows
+
+    @classmethod
+    def from_frame(cls, genre_df: pd.DataFrame) -> "PackedGenreFlags":
+        flags = genre_df.to_numpy(dtype=bool).T
+        return cls(np.packbits(flags, axis=1), list(genre_df.columns), genre_df.shape[0])
+
+    def column(self, genre_column: str) -> np.ndarray:
+        j = self.genre_columns.index(genre_column)
+        return np.unpackbits(self.packed[j], count=self.num_rows).astype(bool)
+
+    def to_frame(self, index: pd.Index | None = None) -> pd.DataFrame:
+        """
+            The flags back as bool is_<genre> columns.
+        """
+        flags = np.unpackbits(self.packed, axis=1, count=self.num_rows).astype(bool).T
+        return pd.DataFrame(flags, columns=self.genre_columns, index=index)
+
+    def take(self, positions: np.ndarray) -> "PackedGenreFlags":
+        flags = np.unpackbits(self.packed, axis=1, count=self.num_rows)[:, np.asarray(positions)]
+        return PackedGenreFlags(np.packbits(flags, axis=1), self.genre_columns, flags.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.packed.nbytes
+
+
+class CompactMelondy(NamedTuple):
+    """
+        frame: the scalar columns, with categorical strings and downcast numerics.
+        genre_flags: the bit-packed is_<genre> columns, row aligned with frame.
+        list_columns: the offset-encoded list columns, row aligned with frame.
+    """
+    frame: pd.DataFrame
+    genre_flags: PackedGenreFlags
+    list_columns: dict[str, OffsetListColumn]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            int(self.frame.memory_usage(index=True, deep=True).sum())
+            + self.genre_flags.nbytes
+            + sum(column.nbytes for column in self.list_columns.values())
+        )
+
+    def take(self, positions: np.ndarray) -> "CompactMelondy":
+        return CompactMelondy(
+            self.frame.iloc[positions],
+            self.genre_flags.take(positions),
+            {name: column.take(positions) for name, column in self.list_columns.items()},
+        )
+
+    def to_features(self) -> pd.DataFrame:
+        """
+            The scalar columns joined with the unpacked genre flags, the way the models consume the table.
+        """
+        return pd.concat([self.frame, self.genre_flags.to_frame(self.frame.index)], axis=1)
+
+
+def _compact_column(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return pd.to_numeric(column, downcast="integer")
+    if pd.api.types.is_float_dtype(column.dtype):
+        values = column.dropna()
+        if not column.hasnans and (values == values.round()).all():
+            return pd.to_numeric(column, downcast="integer")
+        # float32 holds integers up to 2**24 exactly, so release years or track counts with gaps are unchanged
+        return column.astype(np.float32)
+    if pd.api.types.is_string_dtype(column.dtype) or column.dtype == object:
+        if column.nunique(dropna=True) <= CATEGORICAL_MAX_UNIQUE_RATIO * len(column):
+            return column.astype("category")
+    return column
+
+
+@timed()
+def compact_melondy_df(melondy_df: pd.DataFrame) -> CompactMelondy:
+    """
+        Converts a melondy table as loaded by read_melondy_csv into its compact form.
+    """
+    genre_columns = get_genre_columns(melondy_df)
+    list_column_names = [name for name in LIST_COLUMNS if name in melondy_df.columns]
+    frame = melondy_df.drop(columns=genre_columns + list_column_names)
+    frame = pd.DataFrame({name: _compact_column(frame[name]) for name in frame.columns}, index=frame.index)
+    list_columns = {name: OffsetListColumn.from_literals(melondy_df[name]) for name in list_column_names}
+    return CompactMelondy(frame, PackedGenreFlags.from_frame(melondy_df[genre_columns]), list_columns)
+
+
+def _column_group(name: str, genre_columns: set[str]) -> str:
+    if name in genre_columns or name.startswith("is_"):
+        return "genre flags"
+    if name in LIST_COLUMNS:
+        return "list columns"
+    return "other columns"
+
+
+def memory_usage_report(melondy_df: pd.DataFrame, compact: CompactMelondy) -> pd.DataFrame:
+    """
+        Bytes used by each group of columns in the loaded and compact representations.
+    """
+    genre_columns = set(get_genre_columns(melondy_df))
+    original = melondy_df.memory_usage(index=False, deep=True)
+    compact_usage = pd.concat([
+        compact.frame.memory_usage(index=False, deep=True),
+        pd.Series({name: column.nbytes for name, column in compact.list_columns.items()}, dtype=np.int64),
+    ])
+    compact_usage[next(iter(genre_columns), "is_")] = compact.genre_flags.nbytes
+    report = pd.DataFrame({
+        "loaded_bytes": original.groupby(lambda name: _column_group(name, genre_columns)).sum(),
+        "compact_bytes": compact_usage.groupby(lambda name: _column_group(name, genre_columns)).sum(),
+    })
+    report.loc["total"] = report.sum()
+    report["ratio"] = (report["loaded_bytes"] / report["compact_bytes"]).round(1)
+    return report
+
+
+def read_melondy_compact(file_name: str, report: bool = False) -> CompactMelondy:
+    """
+        Reads a melondy CSV into its compact form, printing how much memory that saves if report.
+    """
+    melondy_df = read_melondy_csv(file_name)
+    compact = compact_melondy_df(melondy_df)
+    if report:
+        print(memory_usage_report(melondy_df, compact))
+    return compact
+
+
+if __name__ == "__main__":
+    read_melondy_compact(sys.argv[1], report=True)
@@ -0,0 +1,215 @@
+"""
+Lightweight timing spans for the pipeline stages (crawl, Spotify enrichment, genre encoding, training, evaluation).
+
+Profiling is off unless FANTAINO_PROFILE=1 is set or enable() is called. While disabled, span() hands back a
+shared no-op context manager and timed() calls straight through, so instrumented code costs next to nothing.
+
+When enabled, every span records its call count, wall time and the process' peak RSS. Set FANTAINO_PROFILE_MEMORY=1
+to also track the Python heap high-water mark of each span with tracemalloc (slower), and FANTAINO_PROFILE_DIR=<dir>
+to dump a cProfile of each outermost span to <dir>/<span name>.prof. Those are standard pstats files that snakeviz,
+gprof2dot or flameprof turn into call graphs and flamegraphs.
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is then reported as 0
+    resource = None
+
+_enabled = os.getenv("FANTAINO_PROFILE", "") not in ("", "0")
+_track_memory = os.getenv("FANTAINO_PROFILE_MEMORY", "") not in ("", "0")
+_profile_dir = os.getenv("FANTAINO_PROFILE_DIR")
+
+_stats: dict[str, dict[str, float]] = {}
+_stats_lock = threading.Lock()
+_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def enable(track_memory: bool = False, profile_dir: str | None = None):
+    """
+        Turns profiling on for the rest of the process.
+
+        Args:
+            track_memory: whether to track each span's Python heap high-water mark with tracemalloc.
+            profile_dir: if given, a cProfile of each outermost span is dumped there.
+    """
+    global _enabled, _track_memory, _profile_dir
+    _enabled, _track_memory, _profile_dir = True, track_memory, profile_dir
+    if _track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _max_rss_in_mb() -> float:
+    if resource is None:
+        return 0.0
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+class _Span:
+    """
+        An active timing span. Spans nest per thread, and the nested name (e.g. "train/fit") is what gets recorded.
+    """
+
+    __slots__ = ("name", "path", "start", "heap_start", "heap_peak", "profiler")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f"{stack[-1].path}/{self.name}" if stack else self.name
+        self.profiler = None
+        if _profile_dir and not stack:
+            self.profiler = cProfile.Profile()
+        self.heap_start = self.heap_peak = 0
+        if _track_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # fold the parent's peak so far into it before measuring this span from scratch
+                stack[-1].heap_peak = max(stack[-1].heap_peak, peak)
+            tracemalloc.reset_peak()
+            self.heap_start = current
+        stack.append(self)
+        if self.profiler is not None:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another thread's outermost span is already being profiled
+                self.profiler = None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+        stack = _local.stack
+        stack.pop()
+        heap_peak_in_mb = 0.0
+        if _track_memory and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            self.heap_peak = max(self.heap_peak, peak)
+            if stack:
+                stack[-1].heap_peak = max(stack[-1].heap_peak, self.heap_peak)
+            tracemalloc.reset_peak()
+            heap_peak_in_mb = (self.heap_peak - self.heap_start) / 1024 ** 2
+        _record(self.path, elapsed, heap_peak_in_mb)
+        if self.profiler is not None:
+            os.makedirs(_profile_dir, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(_profile_dir, f"{self.path.replace('/', '.')}.prof"))
+        return False
+
+
+def _record(path: str, elapsed: float, heap_peak_in_mb: float):
+    max_rss_in_mb = _max_rss_in_mb()
+    with _stats_lock:
+        stats = _stats.get(path)
+        if stats is None:
+            stats = _stats[path] = {"count": 0, "total_s": 0.0, "max_s": 0.0, "heap_peak_mb": 0.0, "max_rss_mb": 0.0}
+        stats["count"] += 1
+        stats["total_s"] += elapsed
+        stats["max_s"] = max(stats["max_s"], elapsed)
+        stats["heap_peak_mb"] = max(stats["heap_peak_mb"], heap_peak_in_mb)
+        stats["max_rss_mb"] = max(stats["max_rss_mb"], max_rss_in_mb)
+
+
+def span(name: str):
+    """
+        Context manager timing the enclosed block under name. A no-op while profiling is disabled.
+
+            with span("spotify_enrichment"):
+                ...
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name: str | None = None):
+    """
+        Decorator timing every call of the function as a span, named after the function unless name is given.
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_stats() -> dict[str, dict[str, float]]:
+    with _stats_lock:
+        return {path: dict(stats) for path, stats in _stats.items()}
+
+
+def report(file=None):
+    """
+        Prints one line per span, slowest total time first.
+    """
+    stats = get_stats()
+    if not stats:
+        return
+    file = file or sys.stderr
+    print(f"{'span':<60} {'count':>8} {'total s':>10} {'max s':>10} {'heap MB':>9} {'rss MB':>9}", file=file)
+    for path, span_stats in sorted(stats.items(), key=lambda item: -item[1]["total_s"]):
+        print(
+            f"{path:<60} {span_stats['count']:>8} {span_stats['total_s']:>10.3f} {span_stats['max_s']:>10.3f} "
+            f"{span_stats['heap_peak_mb']:>9.1f} {span_stats['max_rss_mb']:>9.1f}",
+            file=file,
+        )
+
+
+def dump_stats(file_name: str):
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(get_stats(), f, indent=2)
+
+
+@atexit.register
+def _report_at_exit():
+    if not _enabled:
+        return
+    report()
+    if _profile_dir:
+        dump_stats(os.path.join(_profile_dir, "spans.json"))
+
+
+if _enabled and _track_memory:
+    tracemalloc.start()
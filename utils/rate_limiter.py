@@ -0,0 +1,24 @@
+"""
+A thread-safe rate limiter shared by the clients that call external APIs from a thread pool.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+        Spaces out request starts across threads so at most requests_per_second are started each second.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
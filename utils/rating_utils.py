@@ -0,0 +1,128 @@
+"""
+Deterministic extraction of Fantano's numeric rating from scraped review text.
+
+Reviews state their rating near the end, in one of a few forms:
+    "7/10", "10/10", "A 10"
+    "DECENT_TO_STRONG_6", "Light 7", "STRONG 8-LIGHT 9", "Strong 9 to a 10", "Strong 6 to Light 7 (Pick Light 7)"
+    "NOT GOOD" / "NOT_GOOD" (-1 on our scale)
+
+The qualifiers only count capitalized ("Strong", "STRONG"), so prose like "the second half is strong 3 songs in
+a row" isn't read as a rating.
+
+A single compiled alternation scans the tail of each review. A review whose tail states exactly one
+rating is confident; reviews with no rating or conflicting ratings are flagged for the slow (LLM) path.
+"""
+
+import re
+import sys
+
+import jsonlines
+
+from typing import Iterator, NamedTuple
+
+NOT_GOOD_RATING = -1
+DEFAULT_TAIL_LENGTH = 500
+
+# case-sensitive, capitalized or in capitals
+_QUALIFIER = r"(?:LIGHT|DECENT|STRONG|Light|Decent|Strong)"
+_SEPARATOR = r"[\s_-]+"
+_SCORE = r"(?:10|\d)"
+_TO = rf"(?i:TO){_SEPARATOR}"
+_RATING_PATTERN = re.compile(
+    # 7/10, not preceded by another digit or decimal point so "17/10" and "7.5/10" don't count
+    rf"(?P<out_of_ten>(?<![\d.])(?P<out_of_ten_score>{_SCORE})\s*/\s*10(?!\d))"
+    # LIGHT 7, DECENT_TO_STRONG_6, DECENT-STRONG 7, STRONG 8-LIGHT 9, STRONG 9 TO A 10
+    rf"|(?P<word>\b{_QUALIFIER}(?:{_SEPARATOR}(?:{_TO})?{_QUALIFIER})?{_SEPARATOR}(?P<word_score>{_SCORE})"
+    rf"(?:{_SEPARATOR}(?:{_TO})?(?:(?:(?i:A){_SEPARATOR})?10|{_QUALIFIER}{_SEPARATOR}{_SCORE}))?)(?![\d/])"
+    # ... followed by which of the two it comes down to, e.g. (Pick Light 7) or (Pick 10)
+    rf"(?:\s*\(\s*(?i:PICK){_SEPARATOR}(?P<pick>(?:{_QUALIFIER}{_SEPARATOR})?(?P<pick_score>{_SCORE}))\s*\))?"
+    # A 10, with a capital A and not followed by a word, so "a 10 minute closer" doesn't count
+    rf"|(?P<a_ten>\bA[\s_]+10(?![\d/])(?![^\S\n]+[a-z]))"
+    # NOT GOOD, only in capitals (or with an underscore) so prose like "it's not good" doesn't count
+    r"|(?P<not_good>\b(?i:NOT[\s_]+GOOD)\b)",
+)
+
+
+class ExtractedRating(NamedTuple):
+    """
+        score: the rating on the -1..10 scale, None if no rating was found.
+        label: the rating as stated in the review, normalized to upper case with underscores.
+        confident: True when the review states exactly one rating.
+    """
+    score: int | None
+    label: str | None
+    confident: bool
+
+
+def _normalize_label(text: str) -> str:
+    return re.sub(r"[\s_-]+", "_", text.strip()).upper()
+
+
+def extract_rating(review_text: str, tail_length: int | None = DEFAULT_TAIL_LENGTH) -> ExtractedRating:
+    """
+        Extracts the rating from the last tail_length characters of a review (the whole review if None).
+        In-between ratings like "STRONG 7 TO LIGHT 8" take the lower score, unless followed by a "(Pick ...)" clause.
+    """
+    if tail_length is not None:
+        review_text = review_text[-tail_length:]
+
+    found: dict[int, str] = {}
+    for match in _RATING_PATTERN.finditer(review_text):
+        if match.group("out_of_ten"):
+            score, label = int(match.group("out_of_ten_score")), re.sub(r"\s+", "", match.group("out_of_ten"))
+        elif match.group("pick"):
+            pick = match.group("pick")
+            score, label = int(match.group("pick_score")), f"{pick}/10" if pick.isdigit() else _normalize_label(pick)
+        elif match.group("word"):
+            score, label = int(match.group("word_score")), _normalize_label(match.group("word"))
+        elif match.group("a_ten"):
+            score, label = 10, "10/10"
+        else:
+            not_good = match.group("not_good")
+            if not (not_good.isupper() or "_" in not_good):
+                continue
+            score, label = NOT_GOOD_RATING, "NOT_GOOD"
+        # the rating closest to the end of the review wins if there are several
+        found.pop(score, None)
+        found[score] = label
+
+    if not found:
+        return ExtractedRating(None, None, False)
+    score, label = next(reversed(found.items()))
+    return ExtractedRating(score, label, len(found) == 1)
+
+
+def iter_review_ratings(scraped_file_name: str, tail_length: int | None = DEFAULT_TAIL_LENGTH) -> Iterator[dict]:
+    """
+        Streams over the crawler's jsonlines output ({'url', 'html'} per line), one review at a time,
+        yielding {'url', 'score', 'label', 'confident'}.
+    """
+    with jsonlines.open(scraped_file_name) as reader:
+        for review in reader:
+            rating = extract_rating(review.get("html") or "", tail_length=tail_length)
+            yield {"url": review["url"], **rating._asdict()}
+
+
+def extract_ratings_file(scraped_file_name: str, output_file_name: str, tail_length: int | None = DEFAULT_TAIL_LENGTH) -> dict[str, int]:
+    """
+        Extracts the rating of every review in scraped_file_name into output_file_name (jsonlines).
+
+        Returns:
+            Counts of confident, ambiguous and missing ratings. Only the latter two need the slow path.
+    """
+    counts = {"confident": 0, "ambiguous": 0, "missing": 0}
+    with jsonlines.open(output_file_name, "w") as writer:
+        for rating in iter_review_ratings(scraped_file_name, tail_length=tail_length):
+            if rating["confident"]:
+                counts["confident"] += 1
+            elif rating["score"] is None:
+                counts["missing"] += 1
+            else:
+                counts["ambiguous"] += 1
+            writer.write(rating)
+    return counts
+
+
+if __name__ == "__main__":
+    # python -m utils.rating_utils <crawler output .jsonl> <ratings output .jsonl>
+    print(extract_ratings_file(sys.argv[1], sys.argv[2]))
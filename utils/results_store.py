@@ -0,0 +1,299 @@
+"""
+A SQLite store for hyperparameter search results, replacing the per-script cv_results CSVs that every run
+overwrote. Each search is a run, recorded with its timing, a hash of the training data, the git commit of the
+code and the machine it ran on. Each evaluated parameter combination is a row of cv_results, indexed by
+(search, dataset hash, parameters), so
+    the best configs, or the fit time/score trade-off, across any number of runs are one indexed query,
+    a rerun of a grid on the same data only evaluates the combinations that aren't in the store yet.
+
+Usage (from the repository root):
+    python -m utils.results_store results/cv_results.sqlite random_forest_regressor_grid
+"""
+
+import json
+import numpy as np
+import os
+import pandas as pd
+import platform
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from datetime import datetime, timezone
+from hashlib import sha1
+from sklearn.base import clone
+from sklearn.model_selection import GridSearchCV, ParameterGrid
+
+from utils.profiling import span
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    search_name TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    duration_s REAL,
+    dataset_hash TEXT NOT NULL,
+    code_version TEXT,
+    hardware TEXT,
+    num_evaluated INTEGER,
+    num_skipped INTEGER
+);
+CREATE TABLE IF NOT EXISTS cv_results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    search_name TEXT NOT NULL,
+    dataset_hash TEXT NOT NULL,
+    cv_key TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    mean_test_score REAL,
+    std_test_score REAL,
+    mean_fit_time REAL,
+    std_fit_time REAL,
+    mean_score_time REAL,
+    split_test_scores TEXT,
+    PRIMARY KEY (search_name, dataset_hash, cv_key, params_key)
+);
+CREATE INDEX IF NOT EXISTS cv_results_by_score ON cv_results (search_name, dataset_hash, mean_test_score);
+CREATE INDEX IF NOT EXISTS cv_results_by_run ON cv_results (run_id);
+"""
+
+
+def params_key(params: dict) -> str:
+    """
+        Canonical JSON of a parameter combination, the same no matter the key order.
+    """
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def dataset_hash(X: pd.DataFrame, y: pd.Series | None = None) -> str:
+    """
+        Hash of the values, column names and row order of a training set.
+    """
+    hasher = sha1()
+    hasher.update(json.dumps([str(column) for column in X.columns]).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    if y is not None:
+        hasher.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def code_version() -> str:
+    """
+        The git commit of the repository, with "-dirty" appended when there are uncommitted changes.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=package_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=package_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if status else commit
+
+
+def hardware_info() -> dict[str, str | int | None]:
+    import sklearn
+
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def _cv_key(scoring, cv) -> str:
+    # the same parameters scored differently, or on other folds, aren't the same result
+    return json.dumps({"scoring": scoring, "cv": cv if cv is None or isinstance(cv, int) else repr(cv)}, default=str)
+
+
+class CVResultsStore:
+    """
+        Args:
+            file_name: the SQLite database, created with its tables if it doesn't exist.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        # several grid scripts can append to the same store at once
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def evaluated_params_keys(self, search_name: str, data_hash: str, cv_key: str) -> set[str]:
+        rows = self.connection.execute(
+            "SELECT params_key FROM cv_results WHERE search_name = ? AND dataset_hash = ? AND cv_key = ?",
+            (search_name, data_hash, cv_key),
+        )
+        return {row[0] for row in rows}
+
+    def add_run(
+        self,
+        search_name: str,
+        cv_results: dict,
+        data_hash: str,
+        cv_key: str,
+        started_at: str,
+        duration_s: float,
+        num_skipped: int = 0,
+    ) -> int:
+        """
+            Appends a search's cv_results_ as one run. Returns the run_id.
+        """
+        num_splits = sum(1 for key in cv_results if key.startswith("split") and key.endswith("_test_score"))
+        rows = []
+        for i, params in enumerate(cv_results["params"]):
+            split_scores = [float(cv_results[f"split{split}_test_score"][i]) for split in range(num_splits)]
+            rows.append((
+                search_name, data_hash, cv_key, params_key(params), json.dumps(params, default=str),
+                float(cv_results["mean_test_score"][i]), float(cv_results["std_test_score"][i]),
+                float(cv_results["mean_fit_time"][i]), float(cv_results["std_fit_time"][i]),
+                float(cv_results["mean_score_time"][i]), json.dumps(split_scores),
+            ))
+        with self.lock, self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (search_name, started_at, duration_s, dataset_hash, code_version, hardware, num_evaluated, num_skipped)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (search_name, started_at, duration_s, data_hash, code_version(), json.dumps(hardware_info()), len(rows), num_skipped),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cv_results (run_id, search_name, dataset_hash, cv_key, params_key, params, mean_test_score,"
+                " std_test_score, mean_fit_time, std_fit_time, mean_score_time, split_test_scores)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in rows],
+            )
+        return run_id
+
+    def results(self, search_name: str, data_hash: str | None = None, cv_key: str | None = None) -> pd.DataFrame:
+        """
+            Every stored result of a search, optionally for one dataset and CV scheme, best score first, with one
+            param_<name> column per parameter.
+        """
+        query = (
+            "SELECT cv_results.*, runs.started_at, runs.code_version FROM cv_results JOIN runs USING (run_id)"
+            " WHERE cv_results.search_name = ?"
+        )
+        arguments = [search_name]
+        if data_hash is not None:
+            query += " AND cv_results.dataset_hash = ?"
+            arguments.append(data_hash)
+        if cv_key is not None:
+            query += " AND cv_results.cv_key = ?"
+            arguments.append(cv_key)
+        query += " ORDER BY mean_test_score DESC"
+        results_df = pd.read_sql_query(query, self.connection, params=arguments)
+        params_df = pd.DataFrame([json.loads(params) for params in results_df["params"]], index=results_df.index)
+        return pd.concat([results_df, params_df.add_prefix("param_")], axis=1)
+
+    def best_params(self, search_name: str, data_hash: str, cv_key: str) -> tuple[dict, float]:
+        row = self.connection.execute(
+            "SELECT params, mean_test_score FROM cv_results WHERE search_name = ? AND dataset_hash = ? AND cv_key = ?"
+            " ORDER BY mean_test_score DESC LIMIT 1",
+            (search_name, data_hash, cv_key),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"There are no results of {search_name} on dataset {data_hash}.")
+        return json.loads(row[0]), row[1]
+
+    def pareto_front(self, search_name: str, data_hash: str | None = None) -> pd.DataFrame:
+        """
+            The results no other result beats on both mean_test_score and mean_fit_time, fastest first.
+        """
+        results_df = self.results(search_name, data_hash).sort_values(["mean_fit_time", "mean_test_score"], ascending=[True, False])
+        best_score_so_far = results_df["mean_test_score"].cummax().shift(fill_value=-np.inf)
+        return results_df[results_df["mean_test_score"] > best_score_so_far].reset_index(drop=True)
+
+
+def run_grid_search(
+    store: CVResultsStore,
+    search_name: str,
+    estimator,
+    param_grid: dict | list[dict],
+    X: pd.DataFrame,
+    y: pd.Series,
+    scoring=None,
+    cv=None,
+    refit: bool = True,
+    search_cls=GridSearchCV,
+    **grid_search_kwargs,
+):
+    """
+        GridSearchCV that skips the parameter combinations already in the store for the same training data,
+        scoring and cv, and appends the new ones as a run.
+
+        Args:
+            store: the results store.
+            search_name: name of the search in the store, e.g. the script name.
+            estimator, param_grid, scoring, cv: as for GridSearchCV. cv must be deterministic (an int, or a
+                splitter without shuffling or with a fixed random_state) for skipping to be sound.
+            X, y: the training data.
+            refit: whether to refit the best combination, over all stored results, on X and y.
+            search_cls: GridSearchCV, or a class with the same constructor and cv_results_, e.g.
+                utils.forest_search.WarmStartForestSearchCV.
+            grid_search_kwargs: passed on to search_cls.
+
+        Returns:
+            The refit estimator (None if refit is False), the best parameters and their mean test score.
+    """
+    data_hash = dataset_hash(X, y)
+    cv_key = _cv_key(scoring, cv)
+    evaluated = store.evaluated_params_keys(search_name, data_hash, cv_key)
+    candidates = list(ParameterGrid(param_grid))
+    pending = [params for params in candidates if params_key(params) not in evaluated]
+    print(f"{search_name}: {len(candidates) - len(pending)} of {len(candidates)} parameter combinations are already in the store.")
+
+    if pending:
+        grid_search_cv = search_cls(
+            estimator=estimator,
+            param_grid=[{name: [value] for name, value in params.items()} for params in pending],
+            scoring=scoring,
+            cv=cv,
+            refit=False,
+            **grid_search_kwargs,
+        )
+        started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        start = time.perf_counter()
+        with span(f"{search_name}.grid_search"):
+            grid_search_cv.fit(X=X, y=y)
+        store.add_run(
+            search_name, grid_search_cv.cv_results_, data_hash, cv_key, started_at,
+            time.perf_counter() - start, num_skipped=len(candidates) - len(pending),
+        )
+
+    # the best combination of this grid, whether it was evaluated now or in an earlier run
+    results_df = store.results(search_name, data_hash, cv_key)
+    candidate_keys = {params_key(params) for params in candidates}
+    best = results_df[results_df["params_key"].isin(candidate_keys)].iloc[0]
+    best_params, best_score = json.loads(best["params"]), float(best["mean_test_score"])
+    if not refit:
+        return None, best_params, best_score
+    with span(f"{search_name}.refit"):
+        best_estimator = clone(estimator).set_params(**best_params).fit(X, y)
+    return best_estimator, best_params, best_score
+
+
+if __name__ == "__main__":
+    with CVResultsStore(sys.argv[1]) as results_store:
+        columns = ["run_id", "params", "mean_test_score", "std_test_score", "mean_fit_time", "code_version"]
+        print(results_store.results(sys.argv[2])[columns].head(20).to_string(index=False))
+        print(results_store.pareto_front(sys.argv[2])[["params", "mean_test_score", "mean_fit_time"]].to_string(index=False))
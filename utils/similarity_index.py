@@ -0,0 +1,357 @@
+"""
+A persistent index of every reviewed album for "albums like this" lookups, the explanation shown next to a
+predicted rating.
+
+Every album is one float32 vector made of three blocks:
+    the KNN models' tabular features, standardized with the means and standard deviations of the first build,
+    the is_<genre> dummies, scaled to unit length so albums with many genres don't dominate,
+    optionally the album's cover embedding (see CoverStore.get_embeddings), scaled to unit length,
+each multiplied by its weight, and the whole vector scaled to unit length, so the dot product of two vectors is
+their cosine similarity.
+
+The vectors live in one raw file, memory-mapped for queries: a top-k query is one matrix-vector product over the
+mapped rows and an argpartition, and nothing is loaded up front. Adding albums appends their rows (or overwrites
+the rows of albums already in the index) without refitting the standardization, so the index is built once and
+kept up to date incrementally. Albums no longer in the dataset are removed. The index is only built again when
+the vector space itself changes: other features, genre columns or weights, or a change to this module's code.
+
+Usage (from the repository root):
+    python -m utils.similarity_index build data/processed/melondy_and_spotify.csv data/processed/similarity_index
+    python -m utils.similarity_index query data/processed/similarity_index "Radiohead" "OK Computer" -k 10
+"""
+
+import argparse
+import hashlib
+import json
+import numpy as np
+import os
+import pandas as pd
+
+from utils.profiling import span
+
+# the standardized feature space of the KNN models
+TABULAR_FEATURES = [
+    "total_tracks",
+    "release_year",
+    "release_month",
+    "album_duration_in_s",
+    "explicit_proportion",
+    "num_features",
+]
+BLOCKS = ("tabular", "genres", "cover")
+VECTORS_FILE_NAME = "vectors.f32"
+ALBUMS_FILE_NAME = "albums.csv"
+META_FILE_NAME = "meta.json"
+# rows scored per matrix product, bounds the memory of a query on a large index
+_QUERY_CHUNK_ROWS = 1 << 16
+
+
+def album_key(artist_name: str, album_name: str) -> str:
+    # the same key as CoverStore.album_key
+    return f"{artist_name}___{album_name}"
+
+
+def _unit_rows(block: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return block / np.where(norms > 0, norms, 1)
+
+
+def code_fingerprint() -> str:
+    """
+        The hash of this module's source, so an index built by other code is rebuilt instead of mixing vector spaces.
+    """
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_params(
+    dataset: pd.DataFrame,
+    cover_embeddings: np.ndarray | None = None,
+    tabular_features: list[str] = TABULAR_FEATURES,
+    weights: dict[str, float] | None = None,
+) -> dict:
+    """
+        What defines an index's vector space, besides the standardization fit on the albums it was built with.
+    """
+    from utils.data_utils import get_genre_columns
+
+    return {
+        "code_fingerprint": code_fingerprint(),
+        "tabular_features": list(tabular_features),
+        "genre_columns": get_genre_columns(dataset),
+        "cover_size": 0 if cover_embeddings is None else int(np.asarray(cover_embeddings).shape[1]),
+        "weights": {block: float((weights or {}).get(block, 1.0)) for block in BLOCKS},
+    }
+
+
+def _write_json(file_name: str, data: dict):
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file_name, file_name)
+
+
+class AlbumSimilarityIndex:
+    """
+        Opens an index written by build.
+
+        Args:
+            directory: the index directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE_NAME)) as f:
+            self.meta = json.load(f)
+        # album names like "NA" or "None" are names, not missing values
+        self.albums = pd.read_csv(
+            os.path.join(directory, ALBUMS_FILE_NAME), dtype={"key": str, "artist": str, "album": str},
+            keep_default_na=False, na_values={"rating": [""]},
+        )
+        self._rows_by_key = dict(zip(self.albums["key"], range(len(self.albums))))
+        self._vectors = None
+
+    @classmethod
+    def build(
+        cls,
+        directory: str,
+        dataset: pd.DataFrame,
+        cover_embeddings: np.ndarray | None = None,
+        tabular_features: list[str] = TABULAR_FEATURES,
+        weights: dict[str, float] | None = None,
+    ) -> "AlbumSimilarityIndex":
+        """
+            Builds a new index over the dataset's albums, replacing any index in directory.
+
+            Args:
+                directory: where the index goes.
+                dataset: the processed dataset, with artist, album, rating, the tabular features and the
+                    is_<genre> dummies.
+                cover_embeddings: one cover embedding per dataset row, or None to leave covers out.
+                tabular_features: the tabular feature columns.
+                weights: block name (see BLOCKS) -> its weight, 1 for blocks left out.
+        """
+        tabular = dataset[tabular_features].to_numpy(dtype=float)
+        stds = tabular.std(axis=0)
+        meta = {
+            **build_params(dataset, cover_embeddings=cover_embeddings, tabular_features=tabular_features, weights=weights),
+            "tabular_means": tabular.mean(axis=0).tolist(),
+            # constant columns carry no similarity, dividing by 1 keeps them at 0
+            "tabular_stds": np.where(stds > 0, stds, 1.0).tolist(),
+            "num_rows": 0,
+        }
+        meta["size"] = len(meta["tabular_features"]) + len(meta["genre_columns"]) + meta["cover_size"]
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, VECTORS_FILE_NAME), "wb").close()
+        pd.DataFrame(columns=["key", "artist", "album", "rating"]).to_csv(os.path.join(directory, ALBUMS_FILE_NAME), index=False)
+        _write_json(os.path.join(directory, META_FILE_NAME), meta)
+
+        index = cls(directory)
+        with span("similarity_index.build"):
+            index.add(dataset, cover_embeddings=cover_embeddings)
+        return index
+
+    def __len__(self) -> int:
+        return self.meta["num_rows"]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows_by_key
+
+    def has_params(self, params: dict) -> bool:
+        """
+            Whether the index was built with these build_params, i.e. new albums can be added to it as is.
+        """
+        return all(self.meta.get(name) == value for name, value in params.items())
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+            The (albums, size) vectors, memory-mapped read-only.
+        """
+        if self._vectors is None:
+            if len(self) == 0:
+                return np.zeros((0, self.meta["size"]), dtype=np.float32)
+            self._vectors = np.memmap(
+                os.path.join(self.directory, VECTORS_FILE_NAME), dtype=np.float32, mode="r", shape=(len(self), self.meta["size"])
+            )
+        return self._vectors
+
+    def vectorize(self, dataset: pd.DataFrame, cover_embeddings: np.ndarray | None = None) -> np.ndarray:
+        """
+            The unit vectors of the dataset's albums in the index's space. Genres the index wasn't built with
+            are ignored, and albums without a cover embedding get an empty cover block.
+        """
+        weights = self.meta["weights"]
+        tabular = (dataset[self.meta["tabular_features"]].to_numpy(dtype=float) - self.meta["tabular_means"]) / self.meta["tabular_stds"]
+        # every block has about the same length before weighting
+        blocks = [weights["tabular"] * tabular / np.sqrt(max(tabular.shape[1], 1))]
+        genres = dataset.reindex(columns=self.meta["genre_columns"]).fillna(False).astype(float).to_numpy()
+        blocks.append(weights["genres"] * _unit_rows(genres))
+        if self.meta["cover_size"]:
+            covers = np.zeros((len(dataset), self.meta["cover_size"])) if cover_embeddings is None else np.asarray(cover_embeddings, dtype=float)
+            blocks.append(weights["cover"] * _unit_rows(covers))
+        return _unit_rows(np.hstack(blocks)).astype(np.float32)
+
+    def add(self, dataset: pd.DataFrame, cover_embeddings: np.ndarray | None = None) -> int:
+        """
+            Adds the dataset's albums, overwriting the vectors and ratings of albums already in the index.
+            Returns the number of new albums.
+        """
+        vectors = self.vectorize(dataset, cover_embeddings=cover_embeddings)
+        keys = [album_key(artist, album) for artist, album in zip(dataset["artist"], dataset["album"])]
+        ratings = dataset["rating"].to_numpy() if "rating" in dataset.columns else np.full(len(dataset), np.nan)
+        # the last row of an album listed twice wins
+        latest_rows = {key: row for row, key in enumerate(keys)}
+        existing = [(self._rows_by_key[key], row) for key, row in latest_rows.items() if key in self._rows_by_key]
+        new = [(key, row) for key, row in latest_rows.items() if key not in self._rows_by_key]
+
+        self._vectors = None
+        vectors_file_name = os.path.join(self.directory, VECTORS_FILE_NAME)
+        row_size = self.meta["size"] * np.dtype(np.float32).itemsize
+        if existing:
+            mapped = np.memmap(vectors_file_name, dtype=np.float32, mode="r+", shape=(len(self), self.meta["size"]))
+            index_rows, dataset_rows = map(list, zip(*existing))
+            mapped[index_rows] = vectors[dataset_rows]
+            mapped.flush()
+            del mapped
+            self.albums.loc[index_rows, "rating"] = ratings[dataset_rows]
+        if new:
+            with open(vectors_file_name, "r+b") as f:
+                # rows past num_rows are left over from an interrupted add
+                f.truncate(len(self) * row_size)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(vectors[[row for _, row in new]]).tobytes())
+            new_albums = pd.DataFrame({
+                "key": [key for key, _ in new],
+                "artist": dataset["artist"].to_numpy()[[row for _, row in new]],
+                "album": dataset["album"].to_numpy()[[row for _, row in new]],
+                "rating": ratings[[row for _, row in new]],
+            })
+            self.albums = pd.concat([self.albums, new_albums], ignore_index=True) if len(self.albums) else new_albums
+            self._rows_by_key.update({key: len(self) + i for i, (key, _) in enumerate(new)})
+            self.meta["num_rows"] = len(self.albums)
+
+        albums_file_name = os.path.join(self.directory, ALBUMS_FILE_NAME)
+        self.albums.to_csv(f"{albums_file_name}.tmp", index=False)
+        os.replace(f"{albums_file_name}.tmp", albums_file_name)
+        # the vectors are only counted once they're written
+        _write_json(os.path.join(self.directory, META_FILE_NAME), self.meta)
+        return len(new)
+
+    def remove(self, keys: list[str]) -> int:
+        """
+            Removes albums from the index, rewriting the vectors of the remaining ones. Returns the number removed.
+        """
+        removed = {key for key in keys if key in self._rows_by_key}
+        if not removed:
+            return 0
+        keep_rows = np.array([row for key, row in self._rows_by_key.items() if key not in removed], dtype=np.int64)
+        keep_rows.sort()
+        vectors_file_name = os.path.join(self.directory, VECTORS_FILE_NAME)
+        with open(f"{vectors_file_name}.tmp", "wb") as f:
+            for start in range(0, keep_rows.shape[0], _QUERY_CHUNK_ROWS):
+                f.write(np.ascontiguousarray(self.vectors[keep_rows[start:start + _QUERY_CHUNK_ROWS]]).tobytes())
+        self._vectors = None
+        os.replace(f"{vectors_file_name}.tmp", vectors_file_name)
+
+        self.albums = self.albums.iloc[keep_rows].reset_index(drop=True)
+        self._rows_by_key = dict(zip(self.albums["key"], range(len(self.albums))))
+        self.meta["num_rows"] = len(self.albums)
+        albums_file_name = os.path.join(self.directory, ALBUMS_FILE_NAME)
+        self.albums.to_csv(f"{albums_file_name}.tmp", index=False)
+        os.replace(f"{albums_file_name}.tmp", albums_file_name)
+        _write_json(os.path.join(self.directory, META_FILE_NAME), self.meta)
+        return len(removed)
+
+    def query(self, query_vectors: np.ndarray, k: int = 10, exclude_rows: list[int | None] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+            The k most similar albums of every query vector.
+
+            Args:
+                query_vectors: (queries, size) unit vectors, e.g. from vectorize.
+                k: the number of albums per query.
+                exclude_rows: an index row per query to leave out of its results (the album itself), or None.
+
+            Returns:
+                The (queries, k) index rows and cosine similarities, most similar first.
+        """
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        vectors = self.vectors
+        similarities = np.empty((query_vectors.shape[0], vectors.shape[0]), dtype=np.float32)
+        for start in range(0, vectors.shape[0], _QUERY_CHUNK_ROWS):
+            chunk = vectors[start:start + _QUERY_CHUNK_ROWS]
+            similarities[:, start:start + chunk.shape[0]] = query_vectors @ chunk.T
+        for query, row in enumerate(exclude_rows or []):
+            if row is not None:
+                similarities[query, row] = -np.inf
+        k = min(k, vectors.shape[0] - any(row is not None for row in exclude_rows or []))
+        top_rows = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(similarities, top_rows, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        return np.take_along_axis(top_rows, order, axis=1), np.take_along_axis(top_similarities, order, axis=1)
+
+    def similar_albums(self, dataset: pd.DataFrame, k: int = 10, cover_embeddings: np.ndarray | None = None) -> pd.DataFrame:
+        """
+            The k reviewed albums most similar to every album of the dataset, leaving out the album itself, as
+            one row per (query album, neighbor) with the neighbor's rating and similarity.
+        """
+        query_keys = [album_key(artist, album) for artist, album in zip(dataset["artist"], dataset["album"])]
+        rows, similarities = self.query(
+            self.vectorize(dataset, cover_embeddings=cover_embeddings), k=k, exclude_rows=[self._rows_by_key.get(key) for key in query_keys]
+        )
+        neighbors = self.albums.iloc[rows.ravel()][["artist", "album", "rating"]].reset_index(drop=True)
+        return pd.concat([
+            pd.DataFrame({
+                "query_artist": np.repeat(dataset["artist"].to_numpy(), rows.shape[1]),
+                "query_album": np.repeat(dataset["album"].to_numpy(), rows.shape[1]),
+                "rank": np.tile(np.arange(1, rows.shape[1] + 1), rows.shape[0]),
+            }),
+            neighbors,
+            pd.DataFrame({"similarity": similarities.ravel()}),
+        ], axis=1)
+
+    def similar_to(self, artist_name: str, album_name: str, k: int = 10) -> pd.DataFrame:
+        """
+            The k albums most similar to an album already in the index, from its stored vector.
+        """
+        row = self._rows_by_key[album_key(artist_name, album_name)]
+        rows, similarities = self.query(self.vectors[row], k=k, exclude_rows=[row])
+        neighbors = self.albums.iloc[rows[0]][["artist", "album", "rating"]].reset_index(drop=True)
+        return neighbors.assign(similarity=similarities[0])
+
+
+def update_similarity_index(dataset_file_name: str, directory: str) -> int:
+    """
+        Brings the index of the processed dataset up to date: adds its new and changed albums to an existing index
+        and removes the albums no longer in it, or builds the index again if it doesn't exist or was built with
+        other build_params. Returns the number of albums in the index.
+    """
+    dataset = pd.read_csv(dataset_file_name).dropna()
+    if os.path.exists(os.path.join(directory, META_FILE_NAME)):
+        index = AlbumSimilarityIndex(directory)
+        if index.has_params(build_params(dataset)):
+            dataset_keys = {album_key(artist, album) for artist, album in zip(dataset["artist"], dataset["album"])}
+            with span("similarity_index.add"):
+                index.remove([key for key in index.albums["key"] if key not in dataset_keys])
+                index.add(dataset)
+            return len(index)
+    return len(AlbumSimilarityIndex.build(directory, dataset))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build the index, or update an existing one")
+    build_parser.add_argument("dataset")
+    build_parser.add_argument("directory")
+    query_parser = subparsers.add_parser("query", help="the albums most similar to an indexed album")
+    query_parser.add_argument("directory")
+    query_parser.add_argument("artist")
+    query_parser.add_argument("album")
+    query_parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"{update_similarity_index(args.dataset, args.directory)} albums in {args.directory}")
+    else:
+        print(AlbumSimilarityIndex(args.directory).similar_to(args.artist, args.album, k=args.k).to_string(index=False))
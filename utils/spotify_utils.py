@@ -1,24 +1,62 @@
 import numpy as np
 import os
-import spotipy
+import pandas as pd
+import threading
 import time
 from typing import Any
 
-from dotenv import load_dotenv
-from spotipy.oauth2 import SpotifyClientCredentials
-
 from constants import MELONDY_TO_SPOTIFY
 from utils.data_utils import clean_name
+from utils.profiling import timed
+from utils.text_normalization import match_key, split_artists
+
+SPOTIFY_FEATURE_NAMES = [
+    "total_tracks",
+    "num_available_markets",
+    "release_year",
+    "release_month",
+    "release_day",
+    "album_duration_in_s",
+    "explicit_proportion",
+    "featured_artists",
+    "num_features",
+    "track_names",
+    "artist_popularity",
+]
+
+# created on the first API call, so importing this module needs neither spotipy's import time nor credentials
+_spotify = None
+_spotify_lock = threading.Lock()
+# the manual melondy -> Spotify renames, keyed by search name like every name they're looked up with
+_SPOTIFY_NAMES = {
+    kind: {clean_name(melondy_name): spotify_name for melondy_name, spotify_name in names.items()}
+    for kind, names in MELONDY_TO_SPOTIFY.items()
+}
+
+
+def get_spotify_client():
+    """
+        The shared spotipy client, created on first use from the SPOTIPY_CLIENT_ID/SPOTIPY_CLIENT_SECRET
+        environment variables (or the .env file).
+    """
+    global _spotify
+    if _spotify is None:
+        with _spotify_lock:
+            if _spotify is None:
+                import spotipy
 
-# Load environment variables from .env file
-load_dotenv()
+                from dotenv import load_dotenv
+                from spotipy.oauth2 import SpotifyClientCredentials
 
-_spotify = spotipy.Spotify(
-    auth_manager=SpotifyClientCredentials(),
-    requests_timeout=20,
-    retries=5,
-    status_retries=5
-)
+                # Load environment variables from .env file
+                load_dotenv()
+                _spotify = spotipy.Spotify(
+                    auth_manager=SpotifyClientCredentials(),
+                    requests_timeout=20,
+                    retries=5,
+                    status_retries=5
+                )
+    return _spotify
 
 def get_album_features(track_items: dict) -> list[str]:
     artists = []
@@ -30,6 +68,7 @@ def get_album_features(track_items: dict) -> list[str]:
                 artists.append(artist['name'])
     return artists
 
+@timed()
 def get_album_data_from_items(items: list[dict], target_album_name: str) -> dict[str, Any] | None:
     """
     Helper function to find a matching album in a list of Spotify album items.
@@ -37,14 +76,14 @@ def get_album_data_from_items(items: list[dict], target_album_name: str) -> dict
     If no specific match, it returns the first album in the list if available.
     """
     for album in items:
-        # Clean the Spotify album name for comparison, converting to lowercase
-        spotify_album_name_cleaned = clean_name(album["name"]).lower()
-        
+        # Normalize both names for comparison, see match_key
+        spotify_album_key = match_key(album["name"])
+        target_album_key = match_key(target_album_name)
+
         # Check if the target album name matches exactly or is contained within the Spotify album name
-        if target_album_name.lower() == spotify_album_name_cleaned or \
-            target_album_name.lower() in spotify_album_name_cleaned:
+        if target_album_key == spotify_album_key or target_album_key in spotify_album_key:
             # If a match is found, retrieve all tracks for this album
-            tracks = _spotify.album_tracks(album_id=album["id"])
+            tracks = get_spotify_client().album_tracks(album_id=album["id"])
             track_items = tracks['items']
             # Return the album details and its tracks
             return {"album": album, "tracks": track_items}
@@ -53,13 +92,14 @@ def get_album_data_from_items(items: list[dict], target_album_name: str) -> dict
     # and if there are any albums in the list, return the very first one.
     if len(items) > 0:
         album = items[0]
-        tracks = _spotify.album_tracks(album_id=album["id"])
+        tracks = get_spotify_client().album_tracks(album_id=album["id"])
         track_items = tracks['items']
         return {"album": album, "tracks": track_items}
     
     # If no albums were found at all in the list, return None
     return None
 
+@timed()
 def get_spotify_artist_popularity(artist_name: str):
 
     cleaned_artist_name = clean_name(artist_name)
@@ -67,10 +107,10 @@ def get_spotify_artist_popularity(artist_name: str):
     artist = get_spotify_artist(cleaned_artist_name)
     if not artist:
         # if you fail, try splitting the ampersan
-        if "&" in artist_name:
-            artists = artist_name.split("&")
+        artists = split_artists(artist_name)
+        if len(artists) > 1:
             for artist in artists:
-                solo_artist = get_spotify_artist(artist.strip())
+                solo_artist = get_spotify_artist(artist)
                 if solo_artist:
                     artist = solo_artist
                     break
@@ -79,28 +119,28 @@ def get_spotify_artist_popularity(artist_name: str):
         spotify_popularity = artist['popularity']
         return spotify_popularity
 
+@timed()
 def get_spotify_artist(artist_name: str):
 
     cleaned_artist_name = clean_name(artist_name)
-    results = _spotify.search(q=f'artist:{cleaned_artist_name}', type='artist', market=None)
+    results = get_spotify_client().search(q=f'artist:{cleaned_artist_name}', type='artist', market=None)
     artist_items = results['artists']['items'] 
+    renamed_artist = _SPOTIFY_NAMES['artist_name'].get(cleaned_artist_name, cleaned_artist_name)
     for artist in artist_items:
-        if artist['name'].lower() == cleaned_artist_name.lower():
-            return artist
-        renamed_artist = MELONDY_TO_SPOTIFY['artist_name'].get(cleaned_artist_name, cleaned_artist_name)
-        if artist['name'].lower() == renamed_artist.lower():
+        if match_key(artist['name']) in (match_key(cleaned_artist_name), match_key(renamed_artist)):
             return artist
     return {}
 
+@timed()
 def get_spotify_album(artist_name: str, album_name: str) -> dict[str, Any]:
     
     cleaned_album_name = clean_name(album_name)
     cleaned_artist_name = clean_name(artist_name)
 
-    if "&" in cleaned_artist_name:
-        artists = cleaned_artist_name.split("&")
+    artists = split_artists(cleaned_artist_name)
+    if len(artists) > 1:
         for artist in artists:
-            solo_artist_attempt_results = get_spotify_album(artist.strip(), cleaned_album_name)
+            solo_artist_attempt_results = get_spotify_album(artist, cleaned_album_name)
             if solo_artist_attempt_results:
                 return solo_artist_attempt_results
             # don't overwhelm spotify API rate limit
@@ -109,21 +149,21 @@ def get_spotify_album(artist_name: str, album_name: str) -> dict[str, Any]:
     # When the artist and album name are the same or even share the same word,
     # Spotify search doesn't like it, so we need to extract the album matching the
     # name or matching word in the name.
-    if cleaned_artist_name.lower() == cleaned_album_name.lower() or \
+    if match_key(cleaned_artist_name) == match_key(cleaned_album_name) or \
        (any(x in cleaned_album_name for x in cleaned_artist_name.split(" "))):
-        albums_with_artist_name = _spotify.search(q=f'album:{cleaned_album_name}', type='album', market=None)
+        albums_with_artist_name = get_spotify_client().search(q=f'album:{cleaned_album_name}', type='album', market=None)
         album_items = albums_with_artist_name['albums']['items']
         for album in album_items:
             if (len(album['artists']) > 0 and
-                album['name'].lower() == cleaned_album_name.lower() or
-                cleaned_artist_name in album['name'].lower()
+                match_key(album['name']) == match_key(cleaned_album_name) or
+                match_key(cleaned_artist_name) in match_key(album['name'])
             ):
-                tracks = _spotify.album_tracks(album_id=album["id"])
+                tracks = get_spotify_client().album_tracks(album_id=album["id"])
                 track_items = tracks['items']
                 artist_popularity = get_spotify_artist_popularity(cleaned_artist_name)
                 return {"album": album, "tracks": track_items, "artist_popularity": artist_popularity}
 
-    results = _spotify.search(q=f'artist:{cleaned_artist_name} album:{cleaned_album_name}', type='album', market=None)
+    results = get_spotify_client().search(q=f'artist:{cleaned_artist_name} album:{cleaned_album_name}', type='album', market=None)
     album_items = results['albums']['items']
 
     # Try to find the album using the initial search results.
@@ -135,9 +175,9 @@ def get_spotify_album(artist_name: str, album_name: str) -> dict[str, Any]:
 
     # If the album wasn't found, it might be due to different naming conventions.
     # We check our manual translation dictionary (MELONDY_TO_SPOTIFY).
-    cleaned_artist_name = MELONDY_TO_SPOTIFY['artist_name'].get(cleaned_artist_name, cleaned_artist_name)
-    cleaned_album_name = MELONDY_TO_SPOTIFY['album_name'].get(cleaned_album_name, cleaned_album_name)
-    results = _spotify.search(q=f'artist:{cleaned_artist_name} album:{cleaned_album_name}', type='album', market=None)
+    cleaned_artist_name = _SPOTIFY_NAMES['artist_name'].get(cleaned_artist_name, cleaned_artist_name)
+    cleaned_album_name = _SPOTIFY_NAMES['album_name'].get(cleaned_album_name, cleaned_album_name)
+    results = get_spotify_client().search(q=f'artist:{cleaned_artist_name} album:{cleaned_album_name}', type='album', market=None)
     album_items = results['albums']['items']
     found_album_data = get_album_data_from_items(album_items, cleaned_album_name)
     if found_album_data:
@@ -154,6 +194,7 @@ def get_spotify_album(artist_name: str, album_name: str) -> dict[str, Any]:
         print(f'An unexpected error occurred: {e}')
     return {}
 
+@timed()
 def process_spotify_album_data(album_dict: dict[str, dict]) -> list[list[Any]]:
     """
         Given a spotify response about an album, we process it further to create a tabular dataset.
@@ -204,4 +245,22 @@ def process_spotify_album_data(album_dict: dict[str, dict]) -> list[list[Any]]:
             artist_popularity
         )
     else:
-        return (None,) * 11
\ No newline at end of file
+        return (None,) * 11
+
+@timed()
+def enrich_with_spotify(melondy_df: pd.DataFrame, sleep_in_s: float = 0.1) -> pd.DataFrame:
+    """
+        Looks up every album of the melondy dataset on Spotify and appends the SPOTIFY_FEATURE_NAMES columns
+        (what scratch/spotify_etl.ipynb used to do). Albums that can't be found get empty features.
+    """
+    new_columns = []
+    for _, row in melondy_df.iterrows():
+        spotify_data = get_spotify_album(row["artist"], row["album"])
+        new_columns.append(process_spotify_album_data(spotify_data))
+        # don't overwhelm spotify API rate limit
+        time.sleep(sleep_in_s)
+
+    new_data_df = pd.DataFrame(new_columns, columns=SPOTIFY_FEATURE_NAMES, index=melondy_df.index)
+    enriched_df = melondy_df.copy()
+    enriched_df[SPOTIFY_FEATURE_NAMES] = new_data_df
+    return enriched_df
@@ -0,0 +1,130 @@
+"""
+One place where artist, album and track names are normalized, for scraping, Spotify matching and file names.
+
+Every normalization is a single str.translate over a table built once at import (instead of chained replace
+calls), on top of Unicode NFKC folding, which maps full-width letters, ligatures and compatibility forms such as
+"ﬁ" or "Ｈｅｌｌｏ" onto their plain forms. The public functions are memoized with bounded LRU caches, since the
+same artist names come up over and over in a dataset and in every Spotify lookup for it; they build on uncached
+helpers, so a miss goes through one cache, not a chain of them.
+
+    normalize_text    NFKC, no zero-width characters, collapsed whitespace. What the scrapers store.
+    search_name       normalize_text with typographic quotes folded and the characters Spotify titles don't have
+                      (bullets, apostrophes) removed. What goes into Spotify queries, clean_name in data_utils.
+    match_key         search_name, case folded and optionally transliterated to ASCII. Two names refer to the
+                      same thing when their match keys are equal.
+    split_artists     the artists of an "&"-joined collaboration.
+    sanitize_filename a name with the characters that aren't allowed in file names replaced by "_".
+
+Transliteration ("Mahōgakkō" -> "Mahogakko") strips accents with the standard library. With the optional
+unidecode package installed, transliterate="unidecode" also romanizes other scripts.
+
+Usage (from the repository root):
+    python -m utils.text_normalization "“Twin Fantasy” • (Face to Face)" "Ｍａｈōｇａｋｋō"
+"""
+
+import sys
+import unicodedata
+
+from functools import lru_cache
+
+_CACHE_SIZE = 1 << 16
+# zero-width spaces, joiners and byte order marks never show up in a title on purpose
+_INVISIBLE_TABLE = str.maketrans({character: None for character in "\u200b\u200c\u200d\u2060\ufeff\u00ad"})
+# typographic quotes and dashes -> their ASCII forms
+_TYPOGRAPHIC_FORMS = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+}
+# bullets don't show up in Spotify titles, and Spotify's fuzzy search works better without apostrophes, which
+# would otherwise be URL encoded
+_SEARCH_REMOVED = "•'"
+# folding and removing in one pass: a typographic apostrophe is removed like an ASCII one
+_SEARCH_TABLE = str.maketrans({
+    **{character: None if form in _SEARCH_REMOVED else form for character, form in _TYPOGRAPHIC_FORMS.items()},
+    **{character: None for character in _SEARCH_REMOVED},
+})
+_FILENAME_TABLE = str.maketrans({character: "_" for character in '<>:"/|?*\\'})
+
+
+def _normalize(text: str) -> str:
+    if text.isascii():
+        # NFKC leaves ASCII as it is, only the whitespace can change
+        return " ".join(text.split())
+    return " ".join(unicodedata.normalize("NFKC", text).translate(_INVISIBLE_TABLE).split())
+
+
+def _search_name(name: str) -> str:
+    # a removed bullet leaves the spaces around it behind
+    return " ".join(_normalize(name).translate(_SEARCH_TABLE).split())
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """
+        NFKC folded text without invisible characters, with runs of whitespace collapsed to one space.
+    """
+    return _normalize(text)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def search_name(name: str) -> str:
+    """
+        The form of a name that goes into Spotify searches and is compared with Spotify's names.
+    """
+    return _search_name(name)
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return unicodedata.normalize("NFKC", "".join(character for character in decomposed if not unicodedata.combining(character)))
+
+
+def _unidecode():
+    try:
+        from unidecode import unidecode
+    except ImportError as e:
+        raise ImportError("transliterate='unidecode' needs the unidecode package, use transliterate='accents' otherwise.") from e
+    return unidecode
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def match_key(name: str, transliterate: str | None = None) -> str:
+    """
+        The key two names are compared by: search_name case folded, with accents stripped when transliterate is
+        "accents", or romanized with unidecode when it is "unidecode".
+    """
+    key = _search_name(name).casefold()
+    if transliterate == "accents":
+        key = _strip_accents(key)
+    elif transliterate == "unidecode":
+        key = _unidecode()(key).casefold()
+    elif transliterate is not None:
+        raise ValueError(f"Unknown transliteration {transliterate}, expected None, 'accents' or 'unidecode'.")
+    return key
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def split_artists(artist_name: str) -> tuple[str, ...]:
+    """
+        The artists of an "&"-joined collaboration, in order, as search names. A solo artist is a 1-tuple.
+    """
+    return tuple(artist for artist in (_search_name(part) for part in artist_name.split("&")) if artist)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def sanitize_filename(filename: str) -> str:
+    """
+        Replaces the characters that aren't allowed in file names with "_".
+    """
+    return filename.translate(_FILENAME_TABLE)
+
+
+def cache_info() -> dict[str, tuple]:
+    return {fn.__name__: fn.cache_info() for fn in (normalize_text, search_name, match_key, split_artists, sanitize_filename)}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:]:
+        print(f"{name!r}: normalize_text={normalize_text(name)!r} search_name={search_name(name)!r} "
+              f"match_key={match_key(name, transliterate='accents')!r} split_artists={split_artists(name)!r}")